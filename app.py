@@ -1,33 +1,189 @@
-from flask import Flask, jsonify, request, abort
+from flask import Flask, Response, jsonify, request, abort, stream_with_context
 from flask_sqlalchemy import SQLAlchemy
 from flask_cors import CORS
-from flask_migrate import Migrate
-from flask_jwt_extended import JWTManager, create_access_token, jwt_required, get_jwt, get_jwt_identity
+from flask_jwt_extended import JWTManager, create_access_token, jwt_required, get_jwt, get_jwt_identity, verify_jwt_in_request
+import base64
+import binascii
 import bcrypt
 import os
-from flasgger import Swagger
+from datetime import datetime, timedelta
 from dotenv import load_dotenv
-from models import db, User, Charity, Donation, Beneficiary, Admin, UnapprovedCharity
+from sqlalchemy.orm import joinedload
+from models import (
+    db, User, Charity, Donation, DonationArchive, ArchivedTotal, Beneficiary, Admin, UnapprovedCharity,
+    RecurringPledge, Job, donation_totals, charity_dicts, beneficiary_dicts, unapproved_charity_dicts,
+)
+import archive
+from audit import AccessLog, AuditLog
+from auth import (
+    admin_required, create_account, current_user_id, is_owner_or_admin, is_revoked, issue_tokens,
+    refresh_access_token, revoke_token,
+)
+from cache import LRUCache
+from compression import Compression
+from donation_queue import WriteBehindQueue
+from duplicates import DuplicateFinder
+from events import LiveTotals
+from exports import CONTENT_TYPES, FORMATTERS, donation_rows
+from idempotency import Idempotency
+from jobs import JobRunner
+from json_provider import FastJSONProvider
+from metrics import REGISTRY
+from pledges import PledgeScheduler
+from profiling import RequestProfiler
+from ratelimit import RateLimiter
+from replicas import ReplicaRouter, replica_binds
+from slowlog import SlowQueryLog
+from startup import LazyMigrateGroup, LazySwagger, log_startup_timings, timed
 
 load_dotenv()
 app = Flask(__name__)
+app.json = FastJSONProvider(app)
 app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv('DATABASE_URI')
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+# Optional comma-separated read replicas; GET requests are spread across them
+app.config['SQLALCHEMY_REPLICA_URIS'] = [uri for uri in os.getenv('DATABASE_REPLICA_URIS', '').split(',') if uri]
+app.config['SQLALCHEMY_BINDS'] = replica_binds(app.config['SQLALCHEMY_REPLICA_URIS'])
+app.config['REPLICA_STICKY_SECONDS'] = float(os.getenv('REPLICA_STICKY_SECONDS', 5))
 app.config['JWT_SECRET_KEY'] = os.getenv('JWT_SECRET_KEY')
+app.config['JWT_ACCESS_TOKEN_EXPIRES'] = timedelta(minutes=int(os.getenv('JWT_ACCESS_TOKEN_MINUTES', 15)))
+app.config['JWT_REFRESH_TOKEN_EXPIRES'] = timedelta(days=int(os.getenv('JWT_REFRESH_TOKEN_DAYS', 7)))
+# Statements slower than this many ms are logged and EXPLAINed; "off" removes the hooks
+slow_query_ms = os.getenv('SLOW_QUERY_MS', '200')
+app.config['SLOW_QUERY_MS'] = None if slow_query_ms.lower() in ('', 'off') else float(slow_query_ms)
+app.config['OVERVIEW_MAX_DONATIONS'] = int(os.getenv('OVERVIEW_MAX_DONATIONS', 50))
+app.config['DONOR_HISTORY_MAX_PAGE'] = int(os.getenv('DONOR_HISTORY_MAX_PAGE', 100))
+app.config['ADMIN_SUMMARY_TTL'] = float(os.getenv('ADMIN_SUMMARY_TTL', 30))
+app.config['BATCH_MAX_IDS'] = int(os.getenv('BATCH_MAX_IDS', 100))
+app.config['CHARITY_DELETE_BATCH_SIZE'] = int(os.getenv('CHARITY_DELETE_BATCH_SIZE', 1000))
+app.config['COMPRESS_MIN_SIZE'] = int(os.getenv('COMPRESS_MIN_SIZE', 500))
+app.config['COMPRESS_LEVEL'] = int(os.getenv('COMPRESS_LEVEL', 6))
+app.config['SSE_COALESCE_INTERVAL'] = float(os.getenv('SSE_COALESCE_INTERVAL', 1))
+# Shared SQLite file that fans live totals out to every worker; in-process when unset
+app.config['SSE_BROKER_PATH'] = os.getenv('SSE_BROKER_PATH')
+# Shared SQLite file for rate-limit buckets; per-process memory when unset
+app.config['RATELIMIT_STORAGE_PATH'] = os.getenv('RATELIMIT_STORAGE_PATH')
+app.config['DONATION_WRITE_BEHIND'] = os.getenv('DONATION_WRITE_BEHIND', '').lower() in ('1', 'true', 'yes')
+app.config['DONATION_JOURNAL_DIR'] = os.getenv('DONATION_JOURNAL_DIR', os.path.join(app.instance_path, 'donation-journal'))
+# Request profiling: a fraction of requests, plus any request sending `X-Profile: <PROFILE_TOKEN>`
+app.config['PROFILE_SAMPLE_RATE'] = float(os.getenv('PROFILE_SAMPLE_RATE', 0))
+app.config['PROFILE_TOKEN'] = os.getenv('PROFILE_TOKEN')
+app.config['PROFILE_MODE'] = os.getenv('PROFILE_MODE', 'sample')
+# JSON access log file; stderr when unset
+app.config['ACCESS_LOG_PATH'] = os.getenv('ACCESS_LOG_PATH')
+app.config['AUDIT_FLUSH_INTERVAL'] = float(os.getenv('AUDIT_FLUSH_INTERVAL', 1))
+# Whole months of donations kept in the hot table; older ones go to donations_archive
+app.config['DONATION_HOT_MONTHS'] = int(os.getenv('DONATION_HOT_MONTHS', 3))
+# Run the recurring-pledge scheduler in this process (otherwise use `flask run-pledges` from cron)
+app.config['PLEDGE_SCHEDULER_ENABLED'] = os.getenv('PLEDGE_SCHEDULER_ENABLED', '').lower() in ('1', 'true', 'yes')
+# Name similarity (0-1) at which a submitted charity is flagged as a likely duplicate
+app.config['DUPLICATE_THRESHOLD'] = float(os.getenv('DUPLICATE_THRESHOLD', 0.5))
 
 # Initialize extensions
-db.init_app(app)
-migrate = Migrate(app, db)
-jwt = JWTManager(app)
-CORS(app)
-swagger = Swagger(app)  # Initialize Swagger
+with timed('flask_sqlalchemy'):
+    db.init_app(app)
+    replicas = ReplicaRouter(app, db)
+    slowlog = SlowQueryLog(app, db)
+with timed('flask_jwt_extended'):
+    jwt = JWTManager(app)
+with timed('flask_cors'):
+    CORS(app)
+with timed('logging'):
+    access_log = AccessLog(app)
+    audit = AuditLog(app)
+with timed('profiler'):
+    profiler = RequestProfiler(app)
+with timed('compression'):
+    compression = Compression(app)
+with timed('ratelimit'):
+    limiter = RateLimiter(app)
+with timed('idempotency'):
+    idempotency = Idempotency(app)
+with timed('live_totals'):
+    live_totals = LiveTotals(app)
+with timed('donation_queue'):
+    donation_queue = WriteBehindQueue(app)
+    donation_queue.listeners.append(live_totals.mark_dirty)
+with timed('archive'):
+    archive.init_app(app)
+with timed('jobs'):
+    jobs = JobRunner(app)
+with timed('pledges'):
+    pledges = PledgeScheduler(app)
+    pledges.listeners.append(live_totals.mark_dirty)
+with timed('duplicates'):
+    duplicates = DuplicateFinder(app)
+# Flask-Migrate and Swagger are loaded on first use of `flask db` / the docs URLs
+app.cli.add_command(LazyMigrateGroup(app, db))
+app.wsgi_app = LazySwagger(app)
 
-BLACKLIST = set()
+if os.getenv('PROFILE_STARTUP'):
+    log_startup_timings(app)
+
+def parse_fields(model):
+    """Fields requested with ?fields=a,b,c, or the model's summary projection.
+
+    Returns (fields, unknown) where unknown lists any names the model does not expose.
+    """
+    raw = request.args.get('fields')
+    if not raw:
+        return model.SUMMARY_FIELDS, []
+    fields = tuple(dict.fromkeys(name.strip() for name in raw.split(',') if name.strip()))
+    return fields, [name for name in fields if name not in model.FIELDS]
+
+def parse_ids():
+    """Ids from ?ids=1,2,3 in request order, or None when the parameter is absent.
+
+    Returns (ids, error) where error is a ready 400 response.
+    """
+    raw = request.args.get('ids')
+    if raw is None:
+        return None, None
+    try:
+        ids = list(dict.fromkeys(int(part) for part in raw.split(',') if part.strip()))
+    except ValueError:
+        return None, (jsonify({'msg': 'ids must be a comma-separated list of integers'}), 400)
+    if not ids:
+        return None, (jsonify({'msg': 'ids must not be empty'}), 400)
+    if len(ids) > app.config['BATCH_MAX_IDS']:
+        return None, (jsonify({'msg': f"At most {app.config['BATCH_MAX_IDS']} ids per request"}), 400)
+    return ids, None
+
+def batch_response(key, ids, rows):
+    """Order (id, item) rows as requested and report the ids that were not found."""
+    found = dict(rows)
+    return jsonify({
+        key: [found[id] for id in ids if id in found],
+        'missing': [id for id in ids if id not in found],
+    })
+
+def is_integer(value):
+    return isinstance(value, int) and not isinstance(value, bool)
+
+def is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+def job_accepted(job, msg):
+    response = jsonify({'msg': msg, 'job_id': job.id})
+    response.headers['Location'] = f'/jobs/{job.id}'
+    return response, 202
 
 @jwt.token_in_blocklist_loader
 def check_if_token_in_blacklist(jwt_header, jwt_payload):
-    jti = jwt_payload['jti']
-    return jti in BLACKLIST
+    return is_revoked(jwt_payload['jti'])
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """
+    Process metrics in the Prometheus text format
+    ---
+    produces:
+      - text/plain
+    responses:
+      200:
+        description: Counters and gauges of this worker
+    """
+    return Response(REGISTRY.render(), mimetype='text/plain; version=0.0.4')
 
 @app.route('/')
 def home():
@@ -50,6 +206,7 @@ def home():
 
 # User Routes
 @app.route('/users/register', methods=['POST'])
+@limiter.limit
 def register_user():
     """
     Register a new user
@@ -89,24 +246,37 @@ def register_user():
                   type: string
                   example: john@example.com
       400:
-        description: Bad request, email already in use
+        description: Username or email already in use
+        content:
+          application/json:
+            schema:
+              type: object
+              properties:
+                msg:
+                  type: string
+                  example: 'Email already in use'
+                errors:
+                  type: object
+                  description: Message per conflicting field
+                  example: {"email": "Email already in use"}
+      429:
+        description: Too many attempts from this IP or for this email
     """
     data = request.get_json()
-    if User.query.filter_by(email=data['email']).first():
-        return jsonify({'msg': 'Email already in use'}), 400
-
     hashed_password = bcrypt.hashpw(data['password'].encode('utf-8'), bcrypt.gensalt())
 
-    new_user = User(
+    new_user, errors = create_account(
+        User,
         username=data['username'],
         email=data['email'],
-        password=hashed_password.decode('utf-8')
+        password=hashed_password.decode('utf-8'),
     )
-    db.session.add(new_user)
-    db.session.commit()
+    if errors:
+        return jsonify({'msg': next(iter(errors.values())), 'errors': errors}), 400
     return jsonify(new_user.to_dict()), 201
 
 @app.route('/users/login', methods=['POST'])
+@limiter.limit
 def login_user():
     """
     Login a user
@@ -136,17 +306,164 @@ def login_user():
                 message:
                   type: string
                   example: 'Login successful'
+                access_token:
+                  type: string
+                  description: 'Short-lived; send as "Authorization: Bearer <token>"'
+                refresh_token:
+                  type: string
+                  description: Exchange for a new access token at /token/refresh
+                role:
+                  type: string
+                  example: user
       401:
         description: Invalid email or password
+      429:
+        description: Too many attempts from this IP or for this email
     """
     data = request.get_json()
     user = User.query.filter_by(email=data['email']).first()
     
     if user and bcrypt.checkpw(data['password'].encode('utf-8'), user.password.encode('utf-8')):
-        return jsonify({'message': 'Login successful'}), 200
+        return jsonify({'message': 'Login successful', **issue_tokens('user', user)}), 200
     
     return jsonify({'msg': 'Invalid email or password'}), 401
 
+@app.route('/token/refresh', methods=['POST'])
+@jwt_required(refresh=True)
+def refresh_token():
+    """
+    Exchange a refresh token for a new access token
+    ---
+    parameters:
+      - name: Authorization
+        in: header
+        description: Bearer <refresh_token>
+        required: true
+        schema:
+          type: string
+    responses:
+      200:
+        description: A new access token with the same role claims
+      401:
+        description: Missing, expired or revoked refresh token
+    """
+    return jsonify({'access_token': refresh_access_token()}), 200
+
+
+def encode_cursor(donation):
+    raw = f'{donation.donation_date.isoformat()}|{donation.id}'
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+def decode_cursor(cursor):
+    """(donation_date, id) of the last row on the previous page; raises ValueError if malformed."""
+    try:
+        date, id = base64.urlsafe_b64decode(cursor.encode()).decode().split('|')
+        return datetime.fromisoformat(date), int(id)
+    except (TypeError, UnicodeDecodeError, binascii.Error) as e:
+        raise ValueError(cursor) from e
+
+@app.route('/users/<int:user_id>/donations', methods=['GET'])
+@jwt_required()
+def list_user_donations(user_id):
+    """
+    A donor's donation history, newest first (the donor themselves or an admin)
+    ---
+    parameters:
+      - name: user_id
+        in: path
+        required: true
+        schema:
+          type: integer
+      - name: limit
+        in: query
+        description: Page size (default 20, at most DONOR_HISTORY_MAX_PAGE)
+        required: false
+        schema:
+          type: integer
+      - name: cursor
+        in: query
+        description: next_cursor from the previous page
+        required: false
+        schema:
+          type: string
+    responses:
+      200:
+        description: One page of donations plus the donor's lifetime totals
+        content:
+          application/json:
+            schema:
+              type: object
+              properties:
+                user_id:
+                  type: integer
+                  example: 1
+                lifetime_total:
+                  type: number
+                  example: 350.0
+                donation_count:
+                  type: integer
+                  example: 4
+                donations:
+                  type: array
+                  items:
+                    type: object
+                next_cursor:
+                  type: string
+                  description: Absent on the last page
+      400:
+        description: Invalid cursor
+      401:
+        description: Missing or invalid token
+      403:
+        description: Another donor's history
+      404:
+        description: User not found
+    """
+    # The history includes anonymous donations, so only their donor may see it
+    if not is_owner_or_admin(user_id):
+        return jsonify({'msg': 'Not your donation history'}), 403
+    db.get_or_404(User, user_id)
+    limit = max(1, min(request.args.get('limit', 20, type=int), app.config['DONOR_HISTORY_MAX_PAGE']))
+    cursor = request.args.get('cursor')
+    try:
+        last = decode_cursor(cursor) if cursor else None
+    except ValueError:
+        return jsonify({'msg': 'Invalid cursor'}), 400
+
+    def page(model, size):
+        # Only the to_dict() columns, so PostgreSQL answers from the covering index alone
+        query = (
+            db.select(*(getattr(model, field) for field in Donation.FIELDS))
+            .where(model.user_id == user_id)
+            .order_by(model.donation_date.desc(), model.id.desc())
+            .limit(size)
+        )
+        if last:
+            query = query.where(db.tuple_(model.donation_date, model.id) < db.tuple_(*last))
+        return db.session.execute(query).all()
+
+    # Archived donations are all older than live ones, so the archive only
+    # continues a page that the live table could not fill
+    donations = page(Donation, limit + 1)
+    if len(donations) <= limit:
+        donations += page(DonationArchive, limit + 1 - len(donations))
+    totals = db.union_all(
+        db.select(Donation.amount).where(Donation.user_id == user_id),
+        db.select(DonationArchive.amount).where(DonationArchive.user_id == user_id),
+    ).subquery()
+    total, count = db.session.execute(
+        db.select(db.func.coalesce(db.func.sum(totals.c.amount), 0), db.func.count())
+    ).one()
+
+    result = {
+        'user_id': user_id,
+        'lifetime_total': total,
+        'donation_count': count,
+        'donations': [dict(donation._mapping) for donation in donations[:limit]],
+    }
+    if len(donations) > limit:
+        result['next_cursor'] = encode_cursor(donations[limit - 1])
+    return jsonify(result), 200
 
 # @app.route('/users/protected', methods=['GET'])
 # @jwt_required()
@@ -204,6 +521,27 @@ def list_charities():
     """
     List all approved charities
     ---
+    parameters:
+      - name: fields
+        in: query
+        description: >
+          Comma-separated fields to return. Defaults to the card summary
+          (id, name, image_url, total_donations); description and website
+          are only loaded when asked for.
+        required: false
+        schema:
+          type: string
+          example: id,name,description
+      - name: ids
+        in: query
+        description: >
+          Comma-separated charity ids to fetch in one request (at most
+          BATCH_MAX_IDS). The response is then an object with the charities
+          in the requested order and the ids that were not found.
+        required: false
+        schema:
+          type: string
+          example: 3,1,2
     responses:
       200:
         description: List of approved charities
@@ -229,11 +567,26 @@ def list_charities():
                   image_url:
                     type: string
                     example: http://charitya.org/image.jpg
+                  total_donations:
+                    type: number
+                    example: 150.0
+      400:
+        description: Unknown field requested, or invalid or too many ids
     """
-    charities = Charity.query.all()  # Fetch all charities
-    return jsonify([charity.to_dict() for charity in charities]), 200
+    fields, unknown = parse_fields(Charity)
+    if unknown:
+        return jsonify({'msg': f"Unknown field(s): {', '.join(unknown)}"}), 400
+    ids, error = parse_ids()
+    if error:
+        return error
+    # Plain rows, not Charity objects: only the requested columns are selected
+    items = charity_dicts(fields, ids)
+    if ids is not None:
+        return batch_response('charities', ids, items), 200
+    return jsonify([item for _, item in items]), 200
 
 @app.route('/charities', methods=['POST'])
+@admin_required
 def create_charity():
     """
     Create a new charity
@@ -281,6 +634,10 @@ def create_charity():
                 image_url:
                   type: string
                   example: http://charityb.org/image.jpg
+      401:
+        description: Missing, expired or revoked access token
+      403:
+        description: Admins only
     """
     data = request.get_json()
     new_charity = Charity(
@@ -331,10 +688,162 @@ def get_charity(charity_id):
       404:
         description: Charity not found
     """
-    charity = Charity.query.get_or_404(charity_id)
+    charity = Charity.query.filter_by(id=charity_id, deleted_at=None).first_or_404()
     return jsonify(charity.to_dict()), 200
 
+@app.route('/charities/<int:charity_id>/overview', methods=['GET'])
+def get_charity_overview(charity_id):
+    """
+    Charity page data in one request
+    ---
+    parameters:
+      - name: charity_id
+        in: path
+        required: true
+        schema:
+          type: integer
+      - name: limit
+        in: query
+        description: Number of recent non-anonymous donations (default 10, at most OVERVIEW_MAX_DONATIONS)
+        required: false
+        schema:
+          type: integer
+          example: 10
+    responses:
+      200:
+        description: The charity, its beneficiaries, donation totals and recent donations
+        content:
+          application/json:
+            schema:
+              type: object
+              properties:
+                charity:
+                  type: object
+                beneficiaries:
+                  type: array
+                  items:
+                    type: object
+                totals:
+                  type: object
+                  properties:
+                    total_donations:
+                      type: number
+                      example: 150.0
+                    donation_count:
+                      type: integer
+                      example: 2
+                recent_donations:
+                  type: array
+                  items:
+                    type: object
+                    properties:
+                      id:
+                        type: integer
+                      amount:
+                        type: number
+                      donation_date:
+                        type: string
+                      donor:
+                        type: object
+      404:
+        description: Charity not found
+    """
+    limit = min(request.args.get('limit', 10, type=int), app.config['OVERVIEW_MAX_DONATIONS'])
+    # 1: the charity and its beneficiaries
+    charity = db.first_or_404(
+        db.select(Charity).options(joinedload(Charity.beneficiaries)).filter_by(id=charity_id, deleted_at=None)
+    )
+    # 2: aggregates, live plus archived months
+    def archived(column):
+        return (
+            db.select(db.func.coalesce(db.func.sum(column), 0))
+            .where(ArchivedTotal.charity_id == charity_id)
+            .scalar_subquery()
+        )
+
+    total, count = db.session.execute(
+        db.select(
+            db.func.coalesce(db.func.sum(Donation.amount), 0) + archived(ArchivedTotal.total),
+            db.func.count(Donation.id) + archived(ArchivedTotal.donation_count),
+        )
+        .where(Donation.charity_id == charity_id)
+    ).one()
+    # 3: the newest non-anonymous donations, bounded by limit
+    recent = db.session.scalars(
+        db.select(Donation)
+        .options(joinedload(Donation.donor).load_only(User.id, User.username))
+        .where(Donation.charity_id == charity_id, Donation.anonymous.isnot(True))
+        .order_by(Donation.donation_date.desc(), Donation.id.desc())
+        .limit(max(limit, 0))
+    )
+    return jsonify({
+        'charity': charity.to_dict(total_donations=total),
+        'beneficiaries': [
+            beneficiary.to_dict(('id', 'name', 'story', 'image_url')) for beneficiary in charity.beneficiaries
+        ],
+        'totals': {'total_donations': total, 'donation_count': count},
+        'recent_donations': [{
+            'id': donation.id,
+            'amount': donation.amount,
+            'donation_date': donation.donation_date,
+            'donor': {'id': donation.donor.id, 'username': donation.donor.username} if donation.donor else None,
+        } for donation in recent],
+    }), 200
+
+def event_stream(client, snapshot):
+    return Response(
+        live_totals.stream(client, snapshot),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'},
+    )
+
+@app.route('/charities/stream', methods=['GET'])
+def stream_charity_totals():
+    """
+    Live donation totals for all charities (Server-Sent Events)
+    ---
+    produces:
+      - text/event-stream
+    responses:
+      200:
+        description: >
+          A "totals" event with every charity's total, then one event per
+          update interval with the totals that changed, e.g. {"1": 150.0}
+    """
+    totals = donation_totals()
+    ids = db.session.scalars(db.select(Charity.id).where(Charity.deleted_at.is_(None)))
+    snapshot = {str(charity_id): totals.get(charity_id, 0) for charity_id in ids}
+    db.session.remove()  # don't hold a connection for the life of the stream
+    return event_stream(live_totals.connect(), snapshot)
+
+@app.route('/charities/<int:charity_id>/stream', methods=['GET'])
+def stream_charity_total(charity_id):
+    """
+    Live donation total for one charity (Server-Sent Events)
+    ---
+    produces:
+      - text/event-stream
+    parameters:
+      - name: charity_id
+        in: path
+        required: true
+        schema:
+          type: integer
+    responses:
+      200:
+        description: >
+          A "totals" event with the current total, then one per change,
+          e.g. {"1": 150.0}
+      404:
+        description: Charity not found
+    """
+    db.first_or_404(db.select(Charity.id).filter_by(id=charity_id, deleted_at=None))
+    snapshot = {str(charity_id): donation_totals([charity_id]).get(charity_id, 0)}
+    db.session.remove()
+    return event_stream(live_totals.connect(charity_id), snapshot)
+
 @app.route('/charities/<int:charity_id>', methods=['PATCH'])
+@admin_required
 def update_charity(charity_id):
     """
     Update a charity
@@ -390,8 +899,12 @@ def update_charity(charity_id):
                   example: http://charitya-updated.org/image.jpg
       404:
         description: Charity not found
+      401:
+        description: Missing, expired or revoked access token
+      403:
+        description: Admins only
     """
-    charity = Charity.query.get_or_404(charity_id)
+    charity = Charity.query.filter_by(id=charity_id, deleted_at=None).first_or_404()
     data = request.get_json()
     if 'name' in data:
         charity.name = data['name']
@@ -405,10 +918,18 @@ def update_charity(charity_id):
     return jsonify(charity.to_dict()), 200
 
 @app.route('/charities/<int:charity_id>', methods=['DELETE'])
+@admin_required
 def delete_charity(charity_id):
     """
     Delete a charity
     ---
+    description: >
+      The charity is hidden at once and its pledges stop. A background job
+      then detaches its donations, beneficiaries and pledges in batches of
+      CHARITY_DELETE_BATCH_SIZE rows, one short transaction each, and finally
+      deletes the charity row; poll
+      /jobs/{job_id} for progress. Repeating the request for a charity that is
+      still being deleted queues another (harmless) pass.
     parameters:
       - name: charity_id
         in: path
@@ -417,20 +938,73 @@ def delete_charity(charity_id):
         schema:
           type: integer
     responses:
-      204:
-        description: Charity deleted successfully
+      202:
+        description: Charity hidden and deletion queued
+        content:
+          application/json:
+            schema:
+              type: object
+              properties:
+                msg:
+                  type: string
+                  example: Charity deletion queued
+                job_id:
+                  type: integer
+                  example: 1
       404:
         description: Charity not found
+      401:
+        description: Missing, expired or revoked access token
+      403:
+        description: Admins only
     """
-    charity = Charity.query.get(charity_id)
-    if not charity:
+    charity = db.session.get(Charity, charity_id)
+    if charity is None:
         return jsonify({'msg': 'Charity not found'}), 404
-    db.session.delete(charity)
+    if charity.deleted_at is None:
+        charity.deleted_at = datetime.utcnow()
+        RecurringPledge.query.filter_by(charity_id=charity_id).update({'active': False})
+        db.session.commit()
+    job = jobs.enqueue('delete_charity', charity_id=charity_id)
+    audit.record('charity.delete', 'charity', charity_id, job_id=job.id)
+    return job_accepted(job, 'Charity deletion queued')
+
+@jobs.task('delete_charity')
+def delete_charity_job(job, charity_id):
+    batch_size = app.config['CHARITY_DELETE_BATCH_SIZE']
+    # Pledges are kept, already inactive, so their donations keep pledge_id
+    dependents = {
+        'donations': Donation, 'archived_donations': DonationArchive, 'beneficiaries': Beneficiary,
+        'pledges': RecurringPledge,
+    }
+    detached = dict.fromkeys(dependents, 0)
+    total = sum(model.query.filter_by(charity_id=charity_id).count() for model in dependents.values())
+    job.progress(0, total=total)
+    for name, model in dependents.items():
+        # Bounded batches keep each UPDATE's locks short so donation inserts are not held up
+        while True:
+            ids = db.session.scalars(
+                db.select(model.id).where(model.charity_id == charity_id).limit(batch_size)
+            ).all()
+            if not ids:
+                break
+            db.session.execute(
+                db.update(model).where(model.id.in_(ids)).values(charity_id=None),
+                execution_options={'synchronize_session': False},
+            )
+            detached[name] += len(ids)
+            job.progress(sum(detached.values()))  # commits the batch
+    db.session.execute(
+        db.update(ArchivedTotal).where(ArchivedTotal.charity_id == charity_id).values(charity_id=None)
+    )
+    deleted = db.session.execute(db.delete(Charity).where(Charity.id == charity_id)).rowcount
     db.session.commit()
-    return '', 204
+    live_totals.mark_dirty(charity_id)
+    return {'deleted': bool(deleted), 'detached': detached}
 
 # Unapproved charities
 @app.route('/unapproved-charities', methods=['GET'])
+@admin_required
 def get_unapproved_charities():
     """
     Get a list of unapproved charities
@@ -462,11 +1036,13 @@ def get_unapproved_charities():
                     example: "https://www.example.com/image.jpg"
       500:
         description: Server error
+      401:
+        description: Missing, expired or revoked access token
+      403:
+        description: Admins only
     """
     try:
-        unapproved_charities = UnapprovedCharity.query.all()
-        result = [charity.to_dict() for charity in unapproved_charities]
-        return jsonify(result), 200
+        return jsonify(unapproved_charity_dicts()), 200
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -517,6 +1093,25 @@ def create_unapproved_charity():
                 image_url:
                   type: string
                   example: "https://www.example.com/image.jpg"
+                possible_duplicates:
+                  type: array
+                  description: Existing or pending charities with similar names, best match first
+                  items:
+                    type: object
+                    properties:
+                      type:
+                        type: string
+                        enum: [charity, unapproved_charity]
+                      id:
+                        type: integer
+                        example: 7
+                      name:
+                        type: string
+                        example: "Save the Girls"
+                      score:
+                        type: number
+                        description: Trigram similarity, 1.0 for the same words
+                        example: 0.714
       400:
         description: Invalid input data
       500:
@@ -527,6 +1122,8 @@ def create_unapproved_charity():
         if not data or not all(key in data for key in ('name', 'description')):
             return jsonify({'error': 'Invalid input data'}), 400
 
+        # Looked up before the insert so the submission does not match itself
+        possible_duplicates = duplicates.find(data['name'])
         new_charity = UnapprovedCharity(
             name=data.get('name'),
             description=data.get('description'),
@@ -536,11 +1133,12 @@ def create_unapproved_charity():
         db.session.add(new_charity)
         db.session.commit()
 
-        return jsonify(new_charity.to_dict()), 201
+        return jsonify({**new_charity.to_dict(), 'possible_duplicates': possible_duplicates}), 201
     except Exception as e:
         return jsonify({'error': str(e)}), 500
     
 @app.route('/unapproved-charities/<int:id>', methods=['PATCH'])
+@admin_required
 def update_unapproved_charity_status(id):
     """
     Approve or reject an unapproved charity
@@ -587,6 +1185,10 @@ def update_unapproved_charity_status(id):
         description: Charity not found
       500:
         description: Server error
+      401:
+        description: Missing, expired or revoked access token
+      403:
+        description: Admins only
     """
     try:
         data = request.get_json()
@@ -607,11 +1209,14 @@ def update_unapproved_charity_status(id):
             db.session.add(new_charity)
             db.session.delete(unapproved_charity)
             db.session.commit()
+            audit.record('charity.approve', 'charity', new_charity.id, application_id=id, name=new_charity.name)
             return jsonify(new_charity.to_dict()), 200
 
         elif data['status'] == 'Rejected':
+            name = unapproved_charity.name
             db.session.delete(unapproved_charity)
             db.session.commit()
+            audit.record('charity.reject', 'unapproved_charity', id, name=name)
             return jsonify({'message': 'Application has been rejected!'}), 200
 
         else:
@@ -621,77 +1226,255 @@ def update_unapproved_charity_status(id):
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
     
-def move_unapproved_charities():
-    try:
-        # Retrieve all unapproved charities
-        unapproved_charities = UnapprovedCharity.query.all()
-        
-        # Iterate through each unapproved charity
-        for unapproved in unapproved_charities:
-            # Create a new Charity instance
-            new_charity = Charity(
-                name=unapproved.name,
-                description=unapproved.description,
-                website=unapproved.website,
-                image_url=unapproved.image_url
-            )
-            
-            # Add the new charity to the database session
-            db.session.add(new_charity)
-            
-            # Delete the unapproved charity from the UnapprovedCharity model
-            db.session.delete(unapproved)
-        
-        # Commit the changes to the database
-        db.session.commit()
-        
-        return jsonify({"message": "Charities have been approved successfully"}), 200
-    
-    except Exception as e:
-        # Handle any exceptions and rollback changes if necessary
-        db.session.rollback()
-        return jsonify({"error": str(e)}), 500
-    
+@jobs.task('approve_charities')
+def move_unapproved_charities(job):
+    # Retrieve all unapproved charities
+    unapproved_charities = UnapprovedCharity.query.all()
+    job.progress(0, total=len(unapproved_charities))
+
+    # Iterate through each unapproved charity
+    for unapproved in unapproved_charities:
+        # Create a new Charity instance
+        new_charity = Charity(
+            name=unapproved.name,
+            description=unapproved.description,
+            website=unapproved.website,
+            image_url=unapproved.image_url
+        )
+
+        # Add the new charity to the database session
+        db.session.add(new_charity)
+
+        # Delete the unapproved charity from the UnapprovedCharity model
+        db.session.delete(unapproved)
+
+    # Commit the changes to the database; a failure rolls everything back and fails the job
+    db.session.commit()
+    job.progress(len(unapproved_charities))
+    return {'approved': len(unapproved_charities)}
+
 #Moves data from Unapproaved model to Charities model    
 @app.route('/move-unapproved-charities', methods=['POST'])
+@admin_required
 def move_charities():
     """
     Move unapproved charities to the approved charities list
     ---
+    description: Runs as a background job; poll /jobs/{job_id} for the result.
     responses:
-      200:
-        description: Unapproved charities moved successfully
+      202:
+        description: Approval queued
         content:
           application/json:
             schema:
               type: object
               properties:
-                message:
+                msg:
                   type: string
-                  example: "Charities have been approved successfully"
-      500:
-        description: Server error
+                  example: Charity approval queued
+                job_id:
+                  type: integer
+                  example: 1
+      401:
+        description: Missing, expired or revoked access token
+      403:
+        description: Admins only
     """
-    return move_unapproved_charities()
+    job = jobs.enqueue('approve_charities')
+    audit.record('charity.approve_all', 'job', job.id)
+    return job_accepted(job, 'Charity approval queued')
 
 # Donation Routes
 @app.route('/donations', methods=['POST'])
+@idempotency.protect
 def create_donation():
+    """
+    Create a donation, credited to the donor whose token is sent (guests may donate without one)
+    ---
+    parameters:
+      - name: Idempotency-Key
+        in: header
+        description: Client-generated key; retries with the same key replay the first response
+        required: false
+        schema:
+          type: string
+      - name: body
+        in: body
+        required: true
+        schema:
+          type: object
+          properties:
+            charity_id:
+              type: integer
+              example: 1
+            amount:
+              type: number
+              example: 50.0
+            anonymous:
+              type: boolean
+              example: false
+    responses:
+      201:
+        description: Donation created
+      202:
+        description: Donation journalled (write-behind mode); it is saved shortly
+        content:
+          application/json:
+            schema:
+              type: object
+              properties:
+                msg:
+                  type: string
+                  example: Donation accepted
+                pending_id:
+                  type: string
+                  example: 9f1c2b0d4e6a4f0e8a3b5c7d9e1f2a3b
+      400:
+        description: Missing required fields, a non-numeric amount or a non-integer charity_id
+      404:
+        description: Charity not found
+      409:
+        description: A request with the same Idempotency-Key is still being processed
+      422:
+        description: The Idempotency-Key was already used with a different body
+    """
     data = request.get_json()
     charity_id = data.get('charity_id')
     amount = data.get('amount')
 
+    # Guests may donate; a donor's token attributes the donation to them
+    verify_jwt_in_request(optional=True)
+    user_id = current_user_id()
+    anonymous = bool(data.get('anonymous', False))
+
     if not charity_id or not amount:
         return jsonify({'msg': 'Missing required fields'}), 400
+    # Checked up front: in write-behind mode the client is answered before the insert
+    if not is_number(amount) or amount <= 0:
+        return jsonify({'msg': 'amount must be a positive number'}), 400
+    if not is_integer(charity_id):
+        return jsonify({'msg': 'charity_id must be an integer'}), 400
+    live = db.select(Charity.id).where(Charity.id == charity_id, Charity.deleted_at.is_(None))
+    if db.session.execute(live).first() is None:
+        return jsonify({'msg': 'Charity not found'}), 404
 
-    # Create and save the donation without user_id
-    donation = Donation(charity_id=charity_id, amount=amount)
+    if donation_queue.enabled:
+        pending_id = donation_queue.submit(
+            amount=amount, charity_id=charity_id, user_id=user_id, anonymous=anonymous
+        )
+        return jsonify({'msg': 'Donation accepted', 'pending_id': pending_id}), 202
+
+    donation = Donation(charity_id=charity_id, amount=amount, user_id=user_id, anonymous=anonymous)
     db.session.add(donation)
     db.session.commit()
+    live_totals.mark_dirty(charity_id)
 
     return jsonify({'msg': 'Donation created successfully'}), 201
 
 
+def parse_datetime_arg(name):
+    """ISO-8601 date or datetime from the query string; raises ValueError if malformed."""
+    value = request.args.get(name)
+    return datetime.fromisoformat(value) if value else None
+
+@app.route('/donations/export', methods=['GET'])
+@admin_required
+def export_donations():
+    """
+    Export donations as CSV or NDJSON
+    ---
+    parameters:
+      - name: from
+        in: query
+        description: Earliest donation_date to include (ISO-8601, inclusive)
+        required: false
+        schema:
+          type: string
+          example: '2024-07-01'
+      - name: to
+        in: query
+        description: Donation_date to stop at (ISO-8601, exclusive)
+        required: false
+        schema:
+          type: string
+          example: '2024-08-01'
+      - name: charity_id
+        in: query
+        required: false
+        schema:
+          type: integer
+      - name: format
+        in: query
+        description: csv (default) or ndjson
+        required: false
+        schema:
+          type: string
+    responses:
+      200:
+        description: >
+          Streamed rows of id, amount, anonymous, donation_date, user_id and
+          charity_id; archived donations first, then live ones, each ordered by
+          id. user_id is empty for anonymous donations.
+      400:
+        description: Invalid format, date or charity_id
+      401:
+        description: Missing, expired or revoked access token
+      403:
+        description: Admins only
+    """
+    export_format = request.args.get('format', 'csv')
+    if export_format not in FORMATTERS:
+        return jsonify({'msg': 'format must be csv or ndjson'}), 400
+    try:
+        start, end = parse_datetime_arg('from'), parse_datetime_arg('to')
+    except ValueError:
+        return jsonify({'msg': 'from and to must be ISO-8601 dates'}), 400
+    charity_id = request.args.get('charity_id')
+    if charity_id is not None:
+        try:
+            charity_id = int(charity_id)
+        except ValueError:
+            return jsonify({'msg': 'charity_id must be an integer'}), 400
+    rows = donation_rows(start, end, charity_id)
+    return Response(
+        stream_with_context(FORMATTERS[export_format](rows)),
+        mimetype=CONTENT_TYPES[export_format],
+        headers={'Content-Disposition': f'attachment; filename=donations.{export_format}'},
+    )
+
+@app.route('/donations/pending/<pending_id>', methods=['GET'])
+def get_pending_donation(pending_id):
+    """
+    Look up a donation accepted in write-behind mode
+    ---
+    parameters:
+      - name: pending_id
+        in: path
+        required: true
+        schema:
+          type: string
+    responses:
+      200:
+        description: The donation has been saved
+      202:
+        description: The donation is still waiting in the journal
+      404:
+        description: Unknown pending id
+      410:
+        description: The database rejected the donation; it was not saved
+    """
+    donation = Donation.query.filter_by(journal_id=pending_id).first()
+    if donation:
+        return jsonify(donation.to_dict()), 200
+    if donation_queue.enabled:
+        if donation_queue.is_pending(pending_id):
+            return jsonify({'msg': 'Donation pending', 'pending_id': pending_id}), 202
+        rejection = donation_queue.rejection(pending_id)
+        if rejection:
+            return jsonify({'msg': 'Donation rejected', 'pending_id': pending_id,
+                            'reason': rejection['error'], 'rejected_at': rejection['rejected_at']}), 410
+    return jsonify({'msg': 'Donation not found'}), 404
+
 @app.route('/donations/<int:donation_id>', methods=['GET'])
 def get_donation(donation_id):
     """
@@ -731,10 +1514,13 @@ def get_donation(donation_id):
       404:
         description: Donation not found
     """
-    donation = Donation.query.get_or_404(donation_id)
+    donation = db.session.get(Donation, donation_id) or DonationArchive.query.filter_by(id=donation_id).first()
+    if donation is None:
+        abort(404)
     return jsonify(donation.to_dict()), 200
 
 @app.route('/donations/<int:donation_id>', methods=['DELETE'])
+@admin_required
 def delete_donation(donation_id):
     """
     Delete a donation
@@ -751,12 +1537,154 @@ def delete_donation(donation_id):
         description: Donation deleted successfully
       404:
         description: Donation not found
+      401:
+        description: Missing, expired or revoked access token
+      403:
+        description: Admins only
     """
     donation = Donation.query.get(donation_id)
     if not donation:
         return jsonify({'msg': 'Donation not found'}), 404
+    charity_id, amount = donation.charity_id, donation.amount
     db.session.delete(donation)
     db.session.commit()
+    audit.record('donation.delete', 'donation', donation_id, amount=amount, charity_id=charity_id)
+    live_totals.mark_dirty(charity_id)
+    return '', 204
+
+@app.route('/pledges', methods=['POST'])
+@jwt_required()
+def create_pledge():
+    """
+    Create a recurring pledge for the logged-in donor
+    ---
+    parameters:
+      - name: body
+        in: body
+        required: true
+        schema:
+          type: object
+          properties:
+            charity_id:
+              type: integer
+              example: 1
+            amount:
+              type: number
+              example: 20.0
+            interval:
+              type: string
+              enum: [daily, weekly, monthly]
+              example: monthly
+            start_date:
+              type: string
+              format: date-time
+              description: First run (defaults to now); monthly pledges keep its day of the month
+              example: '2024-07-31T09:00:00'
+            anonymous:
+              type: boolean
+              example: false
+    responses:
+      201:
+        description: Pledge created
+      400:
+        description: Missing or invalid fields
+      401:
+        description: Missing, expired or revoked access token
+      403:
+        description: Only donors can pledge
+      404:
+        description: Charity or user not found
+    """
+    data = request.get_json()
+    charity_id = data.get('charity_id')
+    amount = data.get('amount')
+    interval = data.get('interval')
+
+    if not charity_id or not amount or not interval:
+        return jsonify({'msg': 'Missing required fields'}), 400
+    # Every run copies the amount into a donation, so bad values must not get in
+    if not is_number(amount) or amount <= 0:
+        return jsonify({'msg': 'amount must be a positive number'}), 400
+    if not is_integer(charity_id):
+        return jsonify({'msg': 'charity_id must be an integer'}), 400
+    if interval not in RecurringPledge.INTERVALS:
+        return jsonify({'msg': f"interval must be one of {', '.join(RecurringPledge.INTERVALS)}"}), 400
+    try:
+        start_date = datetime.fromisoformat(data['start_date']) if data.get('start_date') else datetime.utcnow()
+    except (TypeError, ValueError):
+        return jsonify({'msg': 'start_date must be an ISO-8601 date or datetime'}), 400
+    if not Charity.query.filter_by(id=charity_id, deleted_at=None).count():
+        return jsonify({'msg': 'Charity not found'}), 404
+    user_id = current_user_id()
+    if user_id is None:
+        return jsonify({'msg': 'Only donors can pledge'}), 403
+    if db.session.get(User, user_id) is None:
+        return jsonify({'msg': 'User not found'}), 404
+
+    pledge = RecurringPledge(
+        charity_id=charity_id, amount=amount, interval=interval, start_date=start_date, next_run=start_date,
+        user_id=user_id, anonymous=bool(data.get('anonymous', False))
+    )
+    db.session.add(pledge)
+    db.session.commit()
+    return jsonify(pledge.to_dict()), 201
+
+@app.route('/pledges/<int:pledge_id>', methods=['GET'])
+@jwt_required()
+def get_pledge(pledge_id):
+    """
+    Get a recurring pledge
+    ---
+    parameters:
+      - name: pledge_id
+        in: path
+        required: true
+        schema:
+          type: integer
+    responses:
+      200:
+        description: The pledge, including its next run
+      401:
+        description: Missing, expired or revoked access token
+      403:
+        description: The pledge belongs to another donor
+      404:
+        description: Pledge not found
+    """
+    pledge = db.get_or_404(RecurringPledge, pledge_id)
+    if not is_owner_or_admin(pledge.user_id):
+        return jsonify({'msg': 'Not your pledge'}), 403
+    return jsonify(pledge.to_dict()), 200
+
+@app.route('/pledges/<int:pledge_id>', methods=['DELETE'])
+@jwt_required()
+def cancel_pledge(pledge_id):
+    """
+    Cancel a recurring pledge
+    ---
+    parameters:
+      - name: pledge_id
+        in: path
+        required: true
+        schema:
+          type: integer
+    responses:
+      204:
+        description: Pledge cancelled; donations it already made are kept
+      401:
+        description: Missing, expired or revoked access token
+      403:
+        description: The pledge belongs to another donor
+      404:
+        description: Pledge not found
+    """
+    pledge = db.session.get(RecurringPledge, pledge_id)
+    if not pledge:
+        return jsonify({'msg': 'Pledge not found'}), 404
+    if not is_owner_or_admin(pledge.user_id):
+        return jsonify({'msg': 'Not your pledge'}), 403
+    pledge.active = False
+    db.session.commit()
     return '', 204
 
 # Beneficiary Routes
@@ -766,6 +1694,26 @@ def list_beneficiaries():
     """
     List all beneficiaries
     ---
+    parameters:
+      - name: fields
+        in: query
+        description: >
+          Comma-separated fields to return. Defaults to the card summary
+          (id, name, image_url, charity); story is only loaded when asked for.
+        required: false
+        schema:
+          type: string
+          example: id,name,story
+      - name: ids
+        in: query
+        description: >
+          Comma-separated beneficiary ids to fetch in one request (at most
+          BATCH_MAX_IDS). The response is then an object with the
+          beneficiaries in the requested order and the ids that were not found.
+        required: false
+        schema:
+          type: string
+          example: 3,1,2
     responses:
       200:
         description: List of all beneficiaries
@@ -788,14 +1736,31 @@ def list_beneficiaries():
                   image_url:
                     type: string
                     example: https://example.com/image.jpg
-                  charity_id:
-                    type: integer
-                    example: 1
+                  charity:
+                    type: object
+                    properties:
+                      id:
+                        type: integer
+                        example: 1
+                      name:
+                        type: string
+                        example: Charity A
+      400:
+        description: Unknown field requested, or invalid or too many ids
     """
-    beneficiaries = Beneficiary.query.all()
-    return jsonify([beneficiary.to_dict() for beneficiary in beneficiaries]), 200
+    fields, unknown = parse_fields(Beneficiary)
+    if unknown:
+        return jsonify({'msg': f"Unknown field(s): {', '.join(unknown)}"}), 400
+    ids, error = parse_ids()
+    if error:
+        return error
+    items = beneficiary_dicts(fields, ids)
+    if ids is not None:
+        return batch_response('beneficiaries', ids, items), 200
+    return jsonify([item for _, item in items]), 200
 
 @app.route('/beneficiaries', methods=['POST'])
+@admin_required
 def create_beneficiary():
     """
     Create a new beneficiary
@@ -843,6 +1808,10 @@ def create_beneficiary():
                 charity_id:
                   type: integer
                   example: 1
+      401:
+        description: Missing, expired or revoked access token
+      403:
+        description: Admins only
     """
     data = request.get_json()
     new_beneficiary = Beneficiary(
@@ -897,6 +1866,7 @@ def get_beneficiary(beneficiary_id):
     return jsonify(beneficiary.to_dict()), 200
 
 @app.route('/beneficiaries/<int:beneficiary_id>', methods=['PATCH'])
+@admin_required
 def update_beneficiary(beneficiary_id):
     """
     Update a beneficiary
@@ -949,6 +1919,10 @@ def update_beneficiary(beneficiary_id):
                   example: 1
       404:
         description: Beneficiary not found
+      401:
+        description: Missing, expired or revoked access token
+      403:
+        description: Admins only
     """
     beneficiary = Beneficiary.query.get_or_404(beneficiary_id)
     data = request.get_json()
@@ -962,6 +1936,7 @@ def update_beneficiary(beneficiary_id):
     return jsonify(beneficiary.to_dict()), 200
 
 @app.route('/beneficiaries/<int:beneficiary_id>', methods=['DELETE'])
+@admin_required
 def delete_beneficiary(beneficiary_id):
     """
     Delete a beneficiary
@@ -978,16 +1953,185 @@ def delete_beneficiary(beneficiary_id):
         description: Beneficiary deleted successfully
       404:
         description: Beneficiary not found
+      401:
+        description: Missing, expired or revoked access token
+      403:
+        description: Admins only
     """
     beneficiary = Beneficiary.query.get(beneficiary_id)
     if not beneficiary:
         return jsonify({'msg': 'Beneficiary not found'}), 404
+    name = beneficiary.name
     db.session.delete(beneficiary)
     db.session.commit()
+    audit.record('beneficiary.delete', 'beneficiary', beneficiary_id, name=name)
     return '', 204
 
+admin_summary_cache = LRUCache(1, ttl=app.config['ADMIN_SUMMARY_TTL'])
+
+def compute_admin_summary():
+    """All admin dashboard figures from a single SELECT."""
+    now = datetime.utcnow()
+
+    def count(model):
+        return db.select(db.func.count()).select_from(model).scalar_subquery()
+
+    def volume_since(since):
+        return db.func.coalesce(db.func.sum(db.case((Donation.donation_date >= since, Donation.amount), else_=0)), 0)
+
+    def archived(column):
+        return db.select(db.func.coalesce(db.func.sum(column), 0)).scalar_subquery()
+
+    # One pass over the live donations for all volume figures; archived
+    # months only add to the lifetime figures
+    donations = db.select(
+        (db.func.count(Donation.id) + archived(ArchivedTotal.donation_count)).label('donations'),
+        (db.func.coalesce(db.func.sum(Donation.amount), 0) + archived(ArchivedTotal.total)).label('total_volume'),
+        volume_since(now - timedelta(hours=24)).label('volume_24h'),
+        volume_since(now - timedelta(days=7)).label('volume_7d'),
+    ).subquery()
+    # Both subqueries are single rows, joined unconditionally
+    pending = db.select(
+        db.func.count(UnapprovedCharity.id).label('pending_applications'),
+        db.func.min(UnapprovedCharity.date_submitted).label('oldest_pending_submitted'),
+    ).subquery()
+    row = db.session.execute(db.select(
+        count(User).label('users'),
+        count(Admin).label('admins'),
+        db.select(db.func.count(Charity.id)).where(Charity.deleted_at.is_(None)).scalar_subquery().label('charities'),
+        count(Beneficiary).label('beneficiaries'),
+        donations,
+        pending,
+    ).select_from(donations.join(pending, db.true()))).one()
+    summary = dict(row._mapping)
+    summary['generated_at'] = now
+    return summary
+
+@app.route('/admin/summary', methods=['GET'])
+@admin_required
+def admin_summary():
+    """
+    Dashboard figures for the admin overview
+    ---
+    responses:
+      200:
+        description: >
+          Table counts, donation volume and pending applications. Cached for
+          ADMIN_SUMMARY_TTL seconds; generated_at says when it was computed.
+        content:
+          application/json:
+            schema:
+              type: object
+              properties:
+                users:
+                  type: integer
+                admins:
+                  type: integer
+                charities:
+                  type: integer
+                beneficiaries:
+                  type: integer
+                donations:
+                  type: integer
+                total_volume:
+                  type: number
+                volume_24h:
+                  type: number
+                volume_7d:
+                  type: number
+                pending_applications:
+                  type: integer
+                oldest_pending_submitted:
+                  type: string
+                generated_at:
+                  type: string
+      401:
+        description: Missing, expired or revoked access token
+      403:
+        description: Admins only
+    """
+    summary = admin_summary_cache.get('summary')
+    if summary is None:
+        summary = compute_admin_summary()
+        admin_summary_cache.set('summary', summary)
+    return jsonify(summary), 200
+
+@app.route('/admin/slow-queries', methods=['GET'])
+@admin_required
+def list_slow_queries():
+    """
+    Slowest statement fingerprints seen by this worker
+    ---
+    responses:
+      200:
+        description: >
+          Statements slower than SLOW_QUERY_MS, grouped by fingerprint, slowest
+          first, with execution count, total and max time, issuing endpoints,
+          parameter types and the EXPLAIN plan once it has been captured.
+      401:
+        description: Missing, expired or revoked access token
+      403:
+        description: Admins only
+    """
+    return jsonify({
+        'threshold_ms': app.config['SLOW_QUERY_MS'],
+        'queries': slowlog.top(),
+    }), 200
+
+@app.route('/jobs', methods=['GET'])
+@admin_required
+def list_jobs():
+    """
+    List recent background jobs
+    ---
+    parameters:
+      - name: status
+        in: query
+        required: false
+        schema:
+          type: string
+          enum: [queued, running, succeeded, failed]
+    responses:
+      200:
+        description: The 50 most recent jobs, newest first
+      401:
+        description: Missing, expired or revoked access token
+      403:
+        description: Admins only
+    """
+    query = Job.query.order_by(Job.id.desc())
+    if request.args.get('status'):
+        query = query.filter(Job.status == request.args['status'])
+    return jsonify([job.to_dict() for job in query.limit(50)]), 200
+
+@app.route('/jobs/<int:job_id>', methods=['GET'])
+@admin_required
+def get_job(job_id):
+    """
+    Get the status and progress of a background job
+    ---
+    parameters:
+      - name: job_id
+        in: path
+        required: true
+        schema:
+          type: integer
+    responses:
+      200:
+        description: The job, with progress/total while it runs and result or error once finished
+      404:
+        description: Job not found
+      401:
+        description: Missing, expired or revoked access token
+      403:
+        description: Admins only
+    """
+    job = db.get_or_404(Job, job_id)
+    return jsonify(job.to_dict()), 200
+
 # Admin login route
 @app.route('/admin/login', methods=['POST'])
+@limiter.limit
 def admin_login():
     """
     Admin login
@@ -1019,6 +2163,15 @@ def admin_login():
                 message:
                   type: string
                   example: 'Login successful'
+                access_token:
+                  type: string
+                  description: 'Short-lived; send as "Authorization: Bearer <token>"'
+                refresh_token:
+                  type: string
+                  description: Exchange for a new access token at /token/refresh
+                role:
+                  type: string
+                  example: admin
       401:
         description: Invalid email or password
         content:
@@ -1029,6 +2182,8 @@ def admin_login():
                 msg:
                   type: string
                   example: 'Invalid email or password'
+      429:
+        description: Too many attempts from this IP or for this email
     """
     data = request.get_json()
     email = data.get('email')
@@ -1038,12 +2193,13 @@ def admin_login():
     admin = Admin.query.filter_by(email=email).first()
 
     if admin and bcrypt.checkpw(password.encode('utf-8'), admin.password.encode('utf-8')):
-        return jsonify({'message': 'Login successful'}), 200
+        return jsonify({'message': 'Login successful', **issue_tokens('admin', admin)}), 200
 
     return jsonify({'msg': 'Invalid email or password'}), 401
 
 # Admin register route
 @app.route('/admin/register', methods=['POST'])
+@limiter.limit
 def admin_register():
     """
     Admin registration
@@ -1079,7 +2235,7 @@ def admin_register():
                   type: string
                   example: 'Admin successfully registered'
       400:
-        description: Email already exists
+        description: Username or email already in use
         content:
           application/json:
             schema:
@@ -1087,35 +2243,48 @@ def admin_register():
               properties:
                 msg:
                   type: string
-                  example: 'Email already exists'
+                  example: 'Email already in use'
+                errors:
+                  type: object
+                  description: Message per conflicting field
+                  example: {"email": "Email already in use"}
+      401:
+        description: Missing or invalid access token (once an admin exists)
+      403:
+        description: Only admins can register further admins
+      429:
+        description: Too many attempts from this IP or for this email
     """
+    # Anyone may create the first admin; after that only admins can add admins
+    if db.session.query(Admin.id).first() is not None:
+        verify_jwt_in_request()
+        if get_jwt().get('role') != 'admin':
+            return jsonify({'msg': 'Admins only'}), 403
+
     data = request.get_json()
     username = data.get('username')
     email = data.get('email')
     password = data.get('password')
 
-    # Check if the email is already registered
-    if Admin.query.filter_by(email=email).first():
-        return jsonify({'msg': 'Email already exists'}), 400
-
     # Hash the password
     hashed_password = bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
 
-    # Create a new admin instance
-    new_admin = Admin(username=username, email=email, password=hashed_password)
-
-    # Add the new admin to the database
-    db.session.add(new_admin)
-    db.session.commit()
+    # Insert the admin; the unique constraints reject a taken username or email
+    new_admin, errors = create_account(Admin, username=username, email=email, password=hashed_password)
+    if errors:
+        return jsonify({'msg': next(iter(errors.values())), 'errors': errors}), 400
+    audit.record('admin.register', 'admin', new_admin.id, username=username, email=email)
 
     return jsonify({'message': 'Admin successfully registered'}), 201
 
 # Admin logout route
 @app.route('/admin/logout', methods=['POST'])
+@jwt_required(verify_type=False)
 def admin_logout():
     """
     Logout an admin
     ---
+    description: Revokes the access or refresh token sent with the request.
     responses:
       200:
         description: Logout successful
@@ -1127,7 +2296,10 @@ def admin_logout():
                 message:
                   type: string
                   example: 'Logout successful'
+      401:
+        description: Missing or invalid token
     """
+    revoke_token()
     return jsonify({'message': 'Logout successful'}), 200
 
 if __name__ == '__main__':
@@ -0,0 +1,107 @@
+"""Hot/cold split of donations.
+
+``donations`` holds the hot data: the current month and the
+``DONATION_HOT_MONTHS - 1`` months before it. ``flask archive-donations``
+moves each closed month older than that into ``donations_archive``. On
+PostgreSQL that table is range-partitioned by month, with one partition per
+archived month; elsewhere (SQLite in development and tests) it is a plain
+table. In the same transaction as each batch move, the per-charity monthly
+sums in ``archived_totals`` are updated, so ``donation_totals`` never
+reports a wrong total mid-archive.
+
+Recent reads (charity overview, the admin summary's 24h/7d volume) only
+query ``donations``. Lifetime figures, donor history and exports also
+read the archive.
+"""
+from collections import defaultdict
+from datetime import date, datetime
+
+import click
+
+from models import db, ArchivedTotal, Donation, DonationArchive
+
+ARCHIVE_COLUMNS = ('id', 'amount', 'anonymous', 'donation_date', 'user_id', 'charity_id', 'pledge_id', 'scheduled_for')
+
+
+def month_start(value):
+    return date(value.year, value.month, 1)
+
+
+def add_months(period, months):
+    year, month = divmod(period.month - 1 + months, 12)
+    return date(period.year + year, month + 1, 1)
+
+
+def archive_cutoff(now, hot_months):
+    """First instant that stays hot; every donation before it is in a closed, archivable month."""
+    if hot_months < 2:
+        # The admin summary reads the last 7 days from the hot table only
+        raise ValueError('DONATION_HOT_MONTHS must be at least 2')
+    start = add_months(month_start(now), 1 - hot_months)
+    return datetime(start.year, start.month, 1)
+
+
+def ensure_partitions(periods):
+    """Create the monthly archive partitions for ``periods`` (PostgreSQL only)."""
+    if db.session.get_bind().dialect.name != 'postgresql':
+        return
+    for period in sorted(periods):
+        db.session.execute(db.text(
+            f'CREATE TABLE IF NOT EXISTS donations_archive_{period:%Y_%m} PARTITION OF donations_archive '
+            f"FOR VALUES FROM ('{period.isoformat()}') TO ('{add_months(period, 1).isoformat()}')"
+        ))
+
+
+def _add_to_archived_totals(rows):
+    sums = defaultdict(lambda: [0.0, 0])
+    for row in rows:
+        key = (row['charity_id'], month_start(row['donation_date']))
+        sums[key][0] += row['amount']
+        sums[key][1] += 1
+    for (charity_id, period), (total, count) in sums.items():
+        updated = db.session.execute(
+            db.update(ArchivedTotal)
+            .where(ArchivedTotal.charity_id.is_not_distinct_from(charity_id), ArchivedTotal.period == period)
+            .values(total=ArchivedTotal.total + total, donation_count=ArchivedTotal.donation_count + count)
+        ).rowcount
+        if not updated:
+            db.session.add(ArchivedTotal(charity_id=charity_id, period=period, total=total, donation_count=count))
+
+
+def archive_donations(cutoff, batch_size=5000):
+    """Move donations dated before ``cutoff`` into the archive; returns how many moved.
+
+    Each batch is one transaction: copy to the archive, add to the monthly
+    totals, delete from ``donations``. An interrupted run loses nothing and can
+    simply be repeated.
+    """
+    moved = 0
+    columns = [getattr(Donation, column) for column in ARCHIVE_COLUMNS]
+    while True:
+        rows = [dict(row._mapping) for row in db.session.execute(
+            db.select(*columns).where(Donation.donation_date < cutoff).order_by(Donation.id).limit(batch_size)
+        )]
+        if not rows:
+            return moved
+        ensure_partitions({month_start(row['donation_date']) for row in rows})
+        db.session.execute(db.insert(DonationArchive), rows)
+        _add_to_archived_totals(rows)
+        db.session.execute(
+            db.delete(Donation).where(Donation.id.in_([row['id'] for row in rows])),
+            execution_options={'synchronize_session': False},
+        )
+        db.session.commit()
+        moved += len(rows)
+
+
+def init_app(app):
+    app.config.setdefault('DONATION_HOT_MONTHS', 3)
+    app.config.setdefault('DONATION_ARCHIVE_BATCH_SIZE', 5000)
+
+    @app.cli.command('archive-donations')
+    @click.option('--hot-months', type=int, default=None, help='Months kept in donations (DONATION_HOT_MONTHS).')
+    def archive_donations_command(hot_months):
+        """Move donations from closed months into the archive."""
+        cutoff = archive_cutoff(datetime.utcnow(), hot_months or app.config['DONATION_HOT_MONTHS'])
+        moved = archive_donations(cutoff, app.config['DONATION_ARCHIVE_BATCH_SIZE'])
+        click.echo(f'Archived {moved} donations dated before {cutoff:%Y-%m-%d}')
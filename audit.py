@@ -0,0 +1,242 @@
+"""Structured access logs and an admin audit trail, kept off the request path.
+
+Access log: each request is logged as one JSON line on the ``access`` logger.
+A ``QueueHandler`` hands each record to a ``QueueListener`` thread, and that
+thread does the actual write to ``ACCESS_LOG_PATH`` (stderr when unset). The
+queue holds at most ``ACCESS_LOG_QUEUE_SIZE`` records. When it is full, new
+records are dropped instead of blocking, and each drop is counted in
+``log_records_dropped_total``.
+
+Audit log: ``audit.record(action, target_type, target_id, **details)`` queues
+an ``audit_log`` row. A background thread inserts the queued rows in batches,
+either every ``AUDIT_FLUSH_INTERVAL`` seconds or once ``AUDIT_BATCH_SIZE`` are
+waiting. At most ``AUDIT_QUEUE_SIZE`` rows are buffered. If an insert fails
+because the database is unavailable, the batch goes back to the front of
+the buffer and is retried on the next flush. Rows are dropped only when the
+buffer is full, or when the database refuses the row itself; drops are
+counted in ``audit_events_total{outcome="dropped"}``. Both the count and the
+queue depth are on ``/metrics``.
+"""
+import atexit
+import json
+import logging
+import queue
+import sys
+import threading
+import time
+from datetime import datetime
+from logging.handlers import QueueHandler, QueueListener
+
+from flask import g, has_request_context, request
+from flask_jwt_extended import get_jwt_identity, verify_jwt_in_request
+from sqlalchemy.exc import DBAPIError
+
+from donation_queue import refused
+from metrics import REGISTRY
+from models import db, AuditEntry
+
+logger = logging.getLogger(__name__)
+
+DROPPED_LOG_RECORDS = REGISTRY.counter(
+    'log_records_dropped_total', 'Log records dropped because the log queue was full', labels=('logger',)
+)
+AUDIT_EVENTS = REGISTRY.counter('audit_events_total', 'Audit events by outcome', labels=('outcome',))
+AUDIT_QUEUE_DEPTH = REGISTRY.gauge('audit_queue_depth', 'Audit events waiting to be written')
+
+
+class JSONFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {'time': datetime.utcfromtimestamp(record.created).isoformat(), 'level': record.levelname,
+                 'logger': record.name, 'message': record.getMessage()}
+        entry.update(getattr(record, 'fields', {}))
+        if record.exc_info:
+            entry['exc_info'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str, separators=(',', ':'))
+
+
+class DroppingQueueHandler(QueueHandler):
+    """QueueHandler that drops (and counts) records instead of blocking on a full queue."""
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            DROPPED_LOG_RECORDS.inc(logger=record.name)
+
+
+def current_actor():
+    """JWT identity of the caller, if the request carries a valid token."""
+    try:
+        verify_jwt_in_request(optional=True)
+        identity = get_jwt_identity()
+    except Exception:
+        return None
+    return str(identity) if identity is not None else None
+
+
+class AccessLog:
+    def __init__(self, app=None):
+        self.listener = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('ACCESS_LOG_ENABLED', True)
+        app.config.setdefault('ACCESS_LOG_PATH', None)
+        app.config.setdefault('ACCESS_LOG_QUEUE_SIZE', 10000)
+        app.extensions['access_log'] = self
+        if not app.config['ACCESS_LOG_ENABLED']:
+            return
+        path = app.config['ACCESS_LOG_PATH']
+        target = logging.FileHandler(path, encoding='utf-8') if path else logging.StreamHandler(sys.stderr)
+        target.setFormatter(JSONFormatter())
+        self.queue = queue.Queue(app.config['ACCESS_LOG_QUEUE_SIZE'])
+        self.listener = QueueListener(self.queue, target)
+        self.logger = logging.getLogger('access')
+        self.logger.setLevel(logging.INFO)
+        self.logger.propagate = False
+        self.logger.addHandler(DroppingQueueHandler(self.queue))
+        self.listener.start()
+        atexit.register(self.listener.stop)
+        app.before_request(self.before_request)
+        app.after_request(self.after_request)
+
+    @staticmethod
+    def before_request():
+        g.request_started = time.perf_counter()
+
+    def after_request(self, response):
+        started = g.get('request_started')
+        self.logger.info('%s %s %s', request.method, request.path, response.status_code, extra={'fields': {
+            'method': request.method,
+            'path': request.path,
+            'query': request.query_string.decode('latin-1') or None,
+            'endpoint': request.endpoint,
+            'status': response.status_code,
+            'duration_ms': round((time.perf_counter() - started) * 1000, 3) if started else None,
+            'remote_addr': request.remote_addr,
+            'user_agent': request.user_agent.string or None,
+            'response_bytes': response.content_length,
+        }})
+        return response
+
+
+class AuditLog:
+    def __init__(self, app=None):
+        self.app = None
+        self.pending = []
+        self._cond = threading.Condition()
+        self._thread = None
+        # Set while the database is failing, so the writer waits a full interval between attempts
+        self._retrying = False
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('AUDIT_QUEUE_SIZE', 10000)
+        app.config.setdefault('AUDIT_BATCH_SIZE', 100)
+        app.config.setdefault('AUDIT_FLUSH_INTERVAL', 1.0)
+        app.extensions['audit'] = self
+        self.app = app
+        atexit.register(self.flush)
+
+    def record(self, action, target_type=None, target_id=None, **details):
+        """Queue an audit row; never blocks and never raises."""
+        row = {
+            'created_at': datetime.utcnow(),
+            'action': action,
+            'target_type': target_type,
+            'target_id': None if target_id is None else str(target_id),
+            'details': details or None,
+            'actor': current_actor() if has_request_context() else None,
+            'remote_addr': request.remote_addr if has_request_context() else None,
+        }
+        with self._cond:
+            if len(self.pending) >= self.app.config['AUDIT_QUEUE_SIZE']:
+                AUDIT_EVENTS.inc(outcome='dropped')
+                return False
+            self.pending.append(row)
+            AUDIT_QUEUE_DEPTH.set(len(self.pending))
+            if len(self.pending) >= self.app.config['AUDIT_BATCH_SIZE']:
+                self._cond.notify()
+        self._ensure_thread()
+        return True
+
+    def _ensure_thread(self):
+        if self._thread is None:
+            with self._cond:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name='audit-writer', daemon=True)
+                    self._thread.start()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                if self._retrying or len(self.pending) < self.app.config['AUDIT_BATCH_SIZE']:
+                    self._cond.wait(self.app.config['AUDIT_FLUSH_INTERVAL'])
+            try:
+                self.flush()
+            except Exception:
+                logger.exception('Writing audit events failed')
+
+    def flush(self):
+        """Insert everything queued, in batches of AUDIT_BATCH_SIZE; returns rows written.
+
+        Stops at the first batch the database is unavailable for and keeps it queued.
+        """
+        written = 0
+        while True:
+            with self._cond:
+                batch = self.pending[:self.app.config['AUDIT_BATCH_SIZE']]
+                del self.pending[:len(batch)]
+                AUDIT_QUEUE_DEPTH.set(len(self.pending))
+            if not batch:
+                self._retrying = False
+                return written
+            with self.app.app_context():
+                try:
+                    db.session.execute(db.insert(AuditEntry), batch)
+                    db.session.commit()
+                except DBAPIError as e:
+                    db.session.rollback()
+                    if not refused(e):
+                        self._requeue(batch)
+                        return written
+                    written += self._write_rows(batch)
+                    continue
+                except Exception:
+                    db.session.rollback()
+                    self._requeue(batch)
+                    return written
+                finally:
+                    db.session.remove()
+            AUDIT_EVENTS.inc(len(batch), outcome='written')
+            written += len(batch)
+
+    def _requeue(self, batch):
+        """Put a batch back in front of the buffer, dropping the newest rows that no longer fit."""
+        logger.exception('Writing audit events failed; %d kept for the next flush', len(batch))
+        self._retrying = True
+        with self._cond:
+            self.pending[:0] = batch
+            overflow = len(self.pending) - self.app.config['AUDIT_QUEUE_SIZE']
+            if overflow > 0:
+                del self.pending[-overflow:]
+                AUDIT_EVENTS.inc(overflow, outcome='dropped')
+            AUDIT_QUEUE_DEPTH.set(len(self.pending))
+
+    def _write_rows(self, batch):
+        """Insert a refused batch row by row, dropping only the rows refused on their own."""
+        written = 0
+        for row in batch:
+            try:
+                db.session.execute(db.insert(AuditEntry), [row])
+                db.session.commit()
+            except DBAPIError:
+                db.session.rollback()
+                AUDIT_EVENTS.inc(outcome='dropped')
+                logger.exception('Dropping audit event %s', row['action'])
+                continue
+            AUDIT_EVENTS.inc(outcome='written')
+            written += 1
+        return written
@@ -0,0 +1,135 @@
+"""JWT issuing and role checks.
+
+Logins return a short-lived access token (``JWT_ACCESS_TOKEN_EXPIRES``) and a
+refresh token (``JWT_REFRESH_TOKEN_EXPIRES``). Both carry the account id and a
+``role`` claim (``user`` or ``admin``). The identity is ``"<role>:<id>"``
+because users and admins live in separate tables with overlapping ids.
+
+``admin_required`` authorises a request from the token's claims alone, so it
+does not query ``users`` or ``admins``. A role change therefore takes effect
+when the holder's refresh token expires. Revoked tokens are recorded by
+``jti`` in ``token_blacklist``, so a logout holds across restarts and every
+worker; each row is purged once the token it names has expired anyway.
+
+``create_account`` registers a user or admin with one
+``INSERT ... ON CONFLICT DO NOTHING RETURNING`` and lets the ``username`` and
+``email`` unique constraints decide; the table is only read again when the
+insert was refused, to say which field is taken.
+"""
+from datetime import datetime
+from functools import wraps
+
+from flask import jsonify
+from flask_jwt_extended import create_access_token, create_refresh_token, get_jwt, verify_jwt_in_request
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import IntegrityError
+
+from models import db, TokenBlacklist
+
+UPSERT_INSERTS = {'postgresql': postgresql.insert, 'sqlite': sqlite.insert}
+UNIQUE_FIELDS = {'username': 'Username already taken', 'email': 'Email already in use'}
+
+
+def token_claims(role, account):
+    return {'role': role, 'uid': account.id, 'username': account.username}
+
+
+def issue_tokens(role, account):
+    """Access and refresh tokens for a user or admin that just logged in."""
+    identity = f'{role}:{account.id}'
+    claims = token_claims(role, account)
+    return {
+        'access_token': create_access_token(identity=identity, additional_claims=claims),
+        'refresh_token': create_refresh_token(identity=identity, additional_claims=claims),
+        'role': role,
+    }
+
+
+def refresh_access_token():
+    """A new access token with the claims of the current (verified) refresh token."""
+    jwt = get_jwt()
+    claims = {name: jwt[name] for name in ('role', 'uid', 'username')}
+    return create_access_token(identity=jwt['sub'], additional_claims=claims)
+
+
+def current_user_id():
+    """Donor id from the verified token, or None for admins and callers without one."""
+    claims = get_jwt()
+    return claims.get('uid') if claims.get('role') == 'user' else None
+
+
+def is_owner_or_admin(user_id):
+    """Whether the verified caller is the donor ``user_id`` or an admin."""
+    claims = get_jwt()
+    return claims.get('role') == 'admin' or (user_id is not None and current_user_id() == user_id)
+
+
+def revoke_token():
+    """Blocklist the current (verified) token until it expires, purging rows that already have."""
+    jwt = get_jwt()
+    now = datetime.utcnow()
+    expires_at = datetime.utcfromtimestamp(jwt['exp']) if 'exp' in jwt else None
+    db.session.execute(db.delete(TokenBlacklist).where(TokenBlacklist.expires_at < now))
+    db.session.add(TokenBlacklist(token=jwt['jti'], expires_at=expires_at))
+    try:
+        db.session.commit()
+    except IntegrityError:
+        # A concurrent logout with the same token already recorded it
+        db.session.rollback()
+
+
+def is_revoked(jti):
+    return db.session.execute(
+        db.select(TokenBlacklist.id).where(TokenBlacklist.token == jti)
+    ).first() is not None
+
+
+def admin_required(view):
+    """Reject the request unless it carries a valid access token with the admin role."""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        verify_jwt_in_request()
+        if get_jwt().get('role') != 'admin':
+            return jsonify({'msg': 'Admins only'}), 403
+        return view(*args, **kwargs)
+    return wrapper
+
+
+def taken_fields(model, values):
+    """Per-field messages for the unique ``values`` some existing row already has."""
+    existing = db.session.execute(
+        db.select(model.username, model.email)
+        .where(db.or_(model.username == values['username'], model.email == values['email']))
+    ).all()
+    return {field: message for field, message in UNIQUE_FIELDS.items()
+            if any(getattr(row, field) == values[field] for row in existing)}
+
+
+def create_account(model, **values):
+    """Insert a ``User`` or ``Admin``; returns ``(account, None)`` or ``(None, errors)``.
+
+    ``errors`` maps each conflicting field to a message. Concurrent
+    registrations of the same username or email are settled by the database:
+    exactly one insert wins and the rest get errors.
+    """
+    insert = UPSERT_INSERTS.get(db.session.get_bind().dialect.name)
+    if insert is not None:
+        account = db.session.execute(
+            insert(model).values(**values).on_conflict_do_nothing().returning(model)
+        ).scalar()
+        if account is not None:
+            # Keep the RETURNING values instead of reloading them after the commit
+            db.session.expunge(account)
+        db.session.commit()
+    else:
+        account = model(**values)
+        db.session.add(account)
+        try:
+            db.session.commit()
+        except IntegrityError:
+            db.session.rollback()
+            account = None
+    if account is not None:
+        return account, None
+    # The conflicting row can vanish before we look; report the pair generically then
+    return None, taken_fields(model, values) or {'email': UNIQUE_FIELDS['email']}
@@ -0,0 +1,64 @@
+"""Near-duplicate lookups against 100k charity names.
+
+Builds the in-process trigram index from the database (the work of one
+background rebuild), then reports the median lookup time through
+``DuplicateFinder.find`` (index search plus the re-read of the matches) and
+through ``NameIndex.search`` alone.
+"""
+import random
+import string
+import time
+
+from benchmarks.common import app, measure, report
+from models import db, Charity, UnapprovedCharity
+
+COMMON = (
+    'the of for and foundation trust fund children kids hope save relief aid international society '
+    'association care health water education'
+).split()
+
+
+def names(count, rng):
+    """Distinct names of 1-3 made-up words and 1-2 common ones."""
+    vocabulary = [
+        ''.join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(4, 9))) for _ in range(20000)
+    ]
+    seen = set()
+    while len(seen) < count:
+        words = [rng.choice(vocabulary) for _ in range(rng.randint(1, 3))]
+        words += [rng.choice(COMMON) for _ in range(rng.randint(1, 2))]
+        rng.shuffle(words)
+        seen.add(' '.join(words).title())
+    return list(seen)
+
+
+def main():
+    rng = random.Random(42)
+    finder = app.extensions['duplicates']
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        charity_names = names(100_000, rng)
+        db.session.execute(db.insert(Charity), [{'name': name, 'description': ''} for name in charity_names])
+        db.session.execute(db.insert(UnapprovedCharity), [
+            {'name': f'{name} Pending', 'description': ''} for name in charity_names[:1000]])
+        db.session.commit()
+
+        start = time.perf_counter()
+        indexes = finder.rebuild()
+        build_ms = (time.perf_counter() - start) * 1000
+        print(f'index: {sum(map(len, indexes.values()))} names, built in {build_ms:.0f} ms\n')
+
+        queries = [rng.choice(charity_names) + ' Kenya' for _ in range(100)]
+        queries += [rng.choice(charity_names)[:-1] for _ in range(100)]
+        threshold, limit = app.config['DUPLICATE_THRESHOLD'], app.config['DUPLICATE_LIMIT']
+        found = [len(finder.find(query)) for query in queries]
+        report(f'lookup (median over 200 queries, {sum(found) / len(found):.1f} matches each)', [
+            ('DuplicateFinder.find', measure(lambda: finder.find(rng.choice(queries)), repeat=200)),
+            ('NameIndex.search', measure(
+                lambda: indexes['charity'].search(rng.choice(queries), threshold, limit), repeat=200)),
+        ])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,37 @@
+"""Serialization cost of the list_charities / list_beneficiaries payloads.
+
+Compares Flask's DefaultJSONProvider with FastJSONProvider on orjson and on
+its stdlib fallback. Payloads are built once; only encoding is timed.
+"""
+from datetime import datetime
+
+from flask.json.provider import DefaultJSONProvider
+
+from benchmarks.common import app, measure, report, seed
+from json_provider import FastJSONProvider, StdlibJSONProvider
+from models import Beneficiary, Charity, Donation, UnapprovedCharity
+
+
+def main():
+    with app.app_context():
+        counts = seed(charities=2000)
+        payloads = {
+            'charities': [c.to_dict() for c in Charity.query.all()],
+            'beneficiaries': [b.to_dict() for b in Beneficiary.query.all()],
+            'donations': [d.to_dict() for d in Donation.query.all()],
+            'unapproved': [UnapprovedCharity(name='x', description='y', date_submitted=datetime.utcnow()).to_dict()] * 2000,
+        }
+        providers = [
+            ('flask default', DefaultJSONProvider(app)),
+            ('fast (stdlib)', StdlibJSONProvider(app)),
+            ('fast (orjson)', FastJSONProvider(app)),
+        ]
+        print(f'dataset: {counts}\n')
+        for name, payload in payloads.items():
+            report(f'{name} ({len(payload)} rows)', [
+                (label, measure(lambda: provider.response(payload))) for label, provider in providers
+            ])
+
+
+if __name__ == '__main__':
+    main()
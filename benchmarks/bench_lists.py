@@ -0,0 +1,75 @@
+"""Latency and memory of the list endpoints' read path at 100k rows.
+
+Compares loading ORM instances and calling ``to_dict()`` on each with the
+plain-row readers in ``models`` (``charity_dicts``, ``beneficiary_dicts``)
+that the endpoints use. Each path is timed, then repeated under tracemalloc
+to report the peak Python heap. The last rows time the whole request
+through the test client.
+"""
+import tracemalloc
+
+from sqlalchemy.orm import joinedload, load_only
+
+from benchmarks.common import app, measure, seed
+from models import db, Beneficiary, Charity, beneficiary_dicts, charity_dicts, donation_totals_subquery
+
+
+def orm_charities():
+    totals = donation_totals_subquery()
+    query = (
+        db.session.query(Charity, db.func.coalesce(totals.c.total, 0))
+        .outerjoin(totals, totals.c.charity_id == Charity.id)
+        .filter(Charity.deleted_at.is_(None))
+    )
+    return [charity.to_dict(total_donations=total) for charity, total in query]
+
+
+def orm_beneficiaries():
+    query = Beneficiary.query.options(
+        load_only(Beneficiary.id, Beneficiary.name, Beneficiary.image_url, Beneficiary.charity_id),
+        joinedload(Beneficiary.charity).load_only(Charity.id, Charity.name),
+    )
+    return [beneficiary.to_dict(Beneficiary.SUMMARY_FIELDS) for beneficiary in query]
+
+
+def peak_mib(fn):
+    db.session.expunge_all()
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak / 1024 / 1024
+
+
+def timed(fn):
+    def run():
+        fn()
+        # An ORM read keeps its instances in the session until the request ends
+        db.session.expunge_all()
+    return measure(run, repeat=3)
+
+
+def main():
+    with app.app_context():
+        counts = seed(charities=100_000, beneficiaries_per_charity=1, donations_per_charity=1, text_size=200)
+        print(f'dataset: {counts}\n')
+        cases = [
+            ('charities   ORM + to_dict', orm_charities),
+            ('charities   plain rows', lambda: charity_dicts(Charity.FIELDS)),
+            ('beneficiaries ORM + to_dict', orm_beneficiaries),
+            ('beneficiaries plain rows', lambda: beneficiary_dicts(Beneficiary.SUMMARY_FIELDS)),
+        ]
+        width = max(len(name) for name, _ in cases)
+        for name, fn in cases:
+            print(f'  {name:<{width}}  {timed(fn):10.2f} ms  peak heap {peak_mib(fn):7.1f} MiB')
+
+    client = app.test_client()
+    print()
+    paths = ('/charities', '/charities?fields=id,name,description,website,image_url,total_donations', '/beneficiaries')
+    for path in paths:
+        ms = measure(lambda: client.get(path).close(), repeat=3)
+        print(f'  GET {path}  {ms:.2f} ms')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+"""Shared setup for the scripts in this directory.
+
+Run benchmarks from the repository root, e.g. ``python -m benchmarks.bench_json``.
+Each script uses a throwaway SQLite database unless DATABASE_URI is already set.
+"""
+import os
+import random
+import statistics
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+os.environ.setdefault('DATABASE_URI', 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'bench.db'))
+os.environ.setdefault('JWT_SECRET_KEY', 'bench')
+
+from app import app  # noqa: E402
+from models import db, Charity, Beneficiary, Donation  # noqa: E402
+
+
+def seed(charities=1000, beneficiaries_per_charity=3, donations_per_charity=10, text_size=800):
+    """Bulk-load a dataset and return it as a dict of row counts."""
+    rng = random.Random(42)
+    text = 'Lorem ipsum dolor sit amet. ' * (text_size // 28)
+    now = datetime.utcnow()
+    db.drop_all()
+    db.create_all()
+    db.session.execute(db.insert(Charity), [
+        {'id': i, 'name': f'Charity {i}', 'description': text, 'website': f'http://charity{i}.org',
+         'image_url': f'http://example.com/{i}.jpg'}
+        for i in range(1, charities + 1)
+    ])
+    beneficiaries = [
+        {'name': f'Beneficiary {i}-{j}', 'story': text, 'image_url': f'http://example.com/b{i}-{j}.jpg',
+         'charity_id': i}
+        for i in range(1, charities + 1) for j in range(beneficiaries_per_charity)
+    ]
+    if beneficiaries:
+        db.session.execute(db.insert(Beneficiary), beneficiaries)
+    db.session.execute(db.insert(Donation), [
+        {'amount': round(rng.uniform(1, 500), 2), 'anonymous': rng.random() < 0.2,
+         'donation_date': now - timedelta(minutes=rng.randint(0, 60 * 24 * 365)), 'charity_id': i}
+        for i in range(1, charities + 1) for _ in range(donations_per_charity)
+    ])
+    db.session.commit()
+    return {
+        'charities': charities,
+        'beneficiaries': charities * beneficiaries_per_charity,
+        'donations': charities * donations_per_charity,
+    }
+
+
+def admin_client():
+    """Test client sending an admin access token, for the admin-only routes."""
+    from flask_jwt_extended import create_access_token
+
+    with app.app_context():
+        claims = {'role': 'admin', 'uid': 1, 'username': 'bench'}
+        token = create_access_token(identity='admin:1', additional_claims=claims)
+    client = app.test_client()
+    client.environ_base['HTTP_AUTHORIZATION'] = f'Bearer {token}'
+    return client
+
+
+def measure(fn, repeat=5):
+    """Median wall time of ``fn()`` in milliseconds."""
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+
+def report(title, rows):
+    print(title)
+    width = max(len(name) for name, _ in rows)
+    for name, ms in rows:
+        print(f'  {name:<{width}}  {ms:10.2f} ms')
@@ -0,0 +1,93 @@
+"""gzip/brotli response compression with an ETag-keyed cache of compressed bodies.
+
+Responses smaller than ``COMPRESS_MIN_SIZE`` bytes, or with a mimetype outside
+``COMPRESS_MIMETYPES``, are sent as-is. Successful GET responses get a content
+ETag; the compressed body for each (ETag, encoding) pair is kept in a small LRU,
+so a hot response is compressed once and then served from memory, and clients
+that send ``If-None-Match`` get a ``304``.
+
+brotli is used when the ``brotli`` package is installed and the client accepts it.
+"""
+import gzip
+import hashlib
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - optional dependency
+    brotli = None
+
+from cache import LRUCache
+
+DEFAULTS = {
+    'COMPRESS_MIN_SIZE': 500,
+    'COMPRESS_LEVEL': 6,
+    'COMPRESS_BR_LEVEL': 4,
+    'COMPRESS_CACHE_SIZE': 256,
+    'COMPRESS_MIMETYPES': ('application/json', 'text/html', 'text/plain', 'text/csv'),
+}
+
+
+class Compression:
+    def __init__(self, app=None):
+        self.cache = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        for key, value in DEFAULTS.items():
+            app.config.setdefault(key, value)
+        self.cache = LRUCache(app.config['COMPRESS_CACHE_SIZE'])
+        app.extensions['compression'] = self
+        app.after_request(self.after_request)
+
+    @staticmethod
+    def choose_encoding(request):
+        accepted = request.accept_encodings
+        if brotli is not None and accepted['br']:
+            return 'br'
+        if accepted['gzip']:
+            return 'gzip'
+        return None
+
+    @staticmethod
+    def compress(body, encoding, config):
+        if encoding == 'br':
+            return brotli.compress(body, quality=config['COMPRESS_BR_LEVEL'])
+        return gzip.compress(body, compresslevel=config['COMPRESS_LEVEL'], mtime=0)
+
+    def after_request(self, response):
+        from flask import current_app, request
+
+        config = current_app.config
+        if (response.direct_passthrough or response.is_streamed
+                or response.status_code < 200 or response.status_code >= 300
+                or 'Content-Encoding' in response.headers
+                or response.mimetype not in config['COMPRESS_MIMETYPES']):
+            return response
+
+        body = response.get_data()
+        cacheable = request.method in ('GET', 'HEAD') and response.status_code == 200
+        encoding = self.choose_encoding(request) if len(body) >= config['COMPRESS_MIN_SIZE'] else None
+        response.vary.add('Accept-Encoding')
+
+        if cacheable:
+            etag = response.get_etag()[0] or hashlib.sha1(body).hexdigest()
+            if encoding:
+                etag = f'{etag}-{encoding}'
+            response.set_etag(etag)
+            if request.if_none_match.contains(etag):
+                return response.make_conditional(request)
+
+        if encoding is None:
+            return response
+
+        key = (etag, encoding) if cacheable else None
+        compressed = self.cache.get(key) if key else None
+        if compressed is None:
+            compressed = self.compress(body, encoding, config)
+            if key:
+                self.cache.set(key, compressed)
+
+        response.set_data(compressed)
+        response.headers['Content-Encoding'] = encoding
+        return response
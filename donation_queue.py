@@ -0,0 +1,283 @@
+"""Write-behind queue for ``POST /donations``.
+
+With ``DONATION_WRITE_BEHIND`` enabled, an accepted donation is appended (and
+fsynced) to a per-process journal file and acknowledged with a pending id.
+A background thread inserts journalled donations into ``donations`` in one
+transaction per batch, once ``DONATION_FLUSH_SIZE`` entries are waiting or
+every ``DONATION_FLUSH_INTERVAL`` seconds, then compacts the journal.
+
+Each row stores its pending id in ``donations.journal_id`` (unique), so
+replaying a journal is idempotent: entries that were committed before a crash
+are skipped. On start-up a process replays the journals of dead processes in
+``DONATION_JOURNAL_DIR``; live processes hold an exclusive lock on their own.
+
+An entry the database refuses (a constraint or data error) is dropped from
+the batch on its own, so it cannot hold up the rest, and recorded in
+``rejected.jsonl`` in the same directory; ``GET /donations/pending/<id>``
+reports it as rejected instead of unknown. Each process indexes that file by
+pending id, reading only the lines appended since its last lookup.
+"""
+import atexit
+import fcntl
+import glob
+import json
+import logging
+import os
+import threading
+import uuid
+from datetime import datetime
+
+from sqlalchemy.exc import DBAPIError, InterfaceError, OperationalError
+
+from models import db, Donation
+
+logger = logging.getLogger(__name__)
+
+JOURNAL_FIELDS = ('journal_id', 'amount', 'charity_id', 'user_id', 'anonymous', 'donation_date')
+REJECTED_FILE = 'rejected.jsonl'
+
+
+def refused(error):
+    """Whether a DBAPIError means the database rejected the data, not that it was unavailable."""
+    return not (error.connection_invalidated or isinstance(error, (OperationalError, InterfaceError)))
+
+
+class DonationJournal:
+    """Append-only JSON-lines file, locked by the process that owns it."""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._file = open(path, 'a+', encoding='utf-8')
+        fcntl.flock(self._file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+
+    @staticmethod
+    def read(path):
+        entries = []
+        with open(path, encoding='utf-8') as f:
+            for line in f:
+                try:
+                    entries.append(json.loads(line))
+                except ValueError:
+                    # A torn final line means the append was never acknowledged
+                    logger.warning('Skipping unreadable journal line in %s', path)
+        return entries
+
+    def append(self, entry):
+        line = json.dumps(entry, separators=(',', ':')) + '\n'
+        with self._lock:
+            self._file.write(line)
+            self._file.flush()
+            os.fsync(self._file.fileno())
+
+    def compact(self, flushed_ids):
+        """Drop flushed entries, keeping anything appended since the flush started."""
+        with self._lock:
+            self._file.seek(0)
+            keep = [line for line in self._file
+                    if line.strip() and json.loads(line)['journal_id'] not in flushed_ids]
+            self._file.seek(0)
+            self._file.truncate()
+            self._file.writelines(keep)
+            self._file.flush()
+            os.fsync(self._file.fileno())
+
+    def close(self):
+        self._file.close()
+
+
+class WriteBehindQueue:
+    def __init__(self, app=None):
+        self.app = None
+        self.enabled = False
+        # Called with the charity ids of each committed batch
+        self.listeners = []
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('DONATION_WRITE_BEHIND', False)
+        app.config.setdefault('DONATION_JOURNAL_DIR', 'instance/donation-journal')
+        app.config.setdefault('DONATION_FLUSH_SIZE', 100)
+        app.config.setdefault('DONATION_FLUSH_INTERVAL', 0.5)
+        app.extensions['donation_queue'] = self
+        self.app = app
+        self.enabled = app.config['DONATION_WRITE_BEHIND']
+        if self.enabled:
+            self.start()
+
+    def start(self):
+        config = self.app.config
+        self.flush_size = config['DONATION_FLUSH_SIZE']
+        self.flush_interval = config['DONATION_FLUSH_INTERVAL']
+        self.directory = config['DONATION_JOURNAL_DIR']
+        os.makedirs(self.directory, exist_ok=True)
+        # journal_id -> dead-letter record, and how far into REJECTED_FILE it has been read
+        self._rejections = {}
+        self._rejections_read = 0
+        self._rejections_lock = threading.Lock()
+        self.pending = []
+        self._cond = threading.Condition()
+        self._flush_lock = threading.Lock()
+        self._stopped = False
+        self.journal = DonationJournal(os.path.join(self.directory, f'donations-{os.getpid()}.jsonl'))
+        # Anything left in our own file (pid reuse) is pending too
+        self.pending.extend(DonationJournal.read(self.journal.path))
+        self.recover()
+        self._thread = threading.Thread(target=self._run, name='donation-flusher', daemon=True)
+        self._thread.start()
+        atexit.register(self.stop)
+
+    def recover(self):
+        """Replay and remove journals left behind by processes that have exited."""
+        for path in sorted(glob.glob(os.path.join(self.directory, 'donations-*.jsonl'))):
+            if path == self.journal.path:
+                continue
+            with open(path, 'a+', encoding='utf-8') as f:
+                try:
+                    fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    continue  # owned by a live worker
+                entries = DonationJournal.read(path)
+                self._write(entries)
+                os.remove(path)
+                logger.info('Replayed %d journalled donations from %s', len(entries), path)
+
+    def submit(self, amount, charity_id, user_id=None, anonymous=False):
+        """Journal a donation and return its pending id once it is durable."""
+        entry = {
+            'journal_id': uuid.uuid4().hex,
+            'amount': amount,
+            'charity_id': charity_id,
+            'user_id': user_id,
+            'anonymous': anonymous,
+            'donation_date': datetime.utcnow().isoformat(),
+        }
+        self.journal.append(entry)
+        with self._cond:
+            self.pending.append(entry)
+            if len(self.pending) >= self.flush_size:
+                self._cond.notify()
+        return entry['journal_id']
+
+    def is_pending(self, journal_id):
+        with self._cond:
+            return any(entry['journal_id'] == journal_id for entry in self.pending)
+
+    def rejection(self, journal_id):
+        """The dead-letter record of a donation the database refused, or None."""
+        path = os.path.join(self.directory, REJECTED_FILE)
+        if not os.path.exists(path):
+            return None
+        with self._rejections_lock:
+            with open(path, 'rb') as f:
+                if os.fstat(f.fileno()).st_size < self._rejections_read:
+                    # Replaced or truncated by an operator; index it afresh
+                    self._rejections, self._rejections_read = {}, 0
+                f.seek(self._rejections_read)
+                for line in f:
+                    if not line.endswith(b'\n'):
+                        break  # still being written; read it next time
+                    self._rejections_read += len(line)
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        logger.warning('Skipping unreadable line in %s', path)
+                        continue
+                    self._rejections[record['journal_id']] = record
+            return self._rejections.get(journal_id)
+
+    def _reject(self, row, error):
+        record = {
+            'journal_id': row['journal_id'],
+            'error': str(getattr(error, 'orig', error))[:500],
+            'rejected_at': datetime.utcnow().isoformat(),
+            'entry': {**row, 'donation_date': row['donation_date'].isoformat()},
+        }
+        line = json.dumps(record, separators=(',', ':')) + '\n'
+        # Shared by every worker writing to this directory
+        with open(os.path.join(self.directory, REJECTED_FILE), 'a', encoding='utf-8') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            f.write(line)
+            f.flush()
+            os.fsync(f.fileno())
+        logger.error('Rejected journalled donation %s: %s', row['journal_id'], record['error'])
+
+    def _run(self):
+        while True:
+            with self._cond:
+                if not self._stopped and len(self.pending) < self.flush_size:
+                    self._cond.wait(self.flush_interval)
+                stopped = self._stopped
+            try:
+                self.flush()
+            except Exception:
+                logger.exception('Donation flush failed; will retry')
+            if stopped:
+                return
+
+    def flush(self):
+        with self._flush_lock:
+            with self._cond:
+                batch = self.pending[:]
+            if not batch:
+                return 0
+            self._write(batch)
+            flushed = {entry['journal_id'] for entry in batch}
+            self.journal.compact(flushed)
+            with self._cond:
+                self.pending = [entry for entry in self.pending if entry['journal_id'] not in flushed]
+            return len(batch)
+
+    def _write(self, entries):
+        """Insert entries not yet in ``donations`` as one group commit."""
+        if not entries:
+            return
+        with self.app.app_context():
+            ids = [entry['journal_id'] for entry in entries]
+            existing = set(db.session.scalars(db.select(Donation.journal_id).where(Donation.journal_id.in_(ids))))
+            rows = [self._row(entry) for entry in entries if entry['journal_id'] not in existing]
+            if not rows:
+                return
+            try:
+                db.session.execute(db.insert(Donation), rows)
+                db.session.commit()
+                self._notify(rows)
+            except DBAPIError as e:
+                if not refused(e):
+                    raise  # the database is unreachable or busy; retry the batch later
+                # One bad row (unknown charity, malformed amount) must not block the whole batch
+                db.session.rollback()
+                for row in rows:
+                    try:
+                        db.session.execute(db.insert(Donation), [row])
+                        db.session.commit()
+                        self._notify([row])
+                    except DBAPIError as e:
+                        if not refused(e):
+                            raise
+                        db.session.rollback()
+                        self._reject(row, e)
+            finally:
+                db.session.remove()
+
+    def _notify(self, rows):
+        charity_ids = {row['charity_id'] for row in rows}
+        for listener in self.listeners:
+            listener(*charity_ids)
+
+    @staticmethod
+    def _row(entry):
+        # .get(): journals written before user_id/anonymous were recorded lack them
+        row = {field: entry.get(field) for field in JOURNAL_FIELDS}
+        row['anonymous'] = bool(row['anonymous'])
+        row['donation_date'] = datetime.fromisoformat(entry['donation_date'])
+        return row
+
+    def stop(self):
+        """Flush whatever is pending and stop the background thread."""
+        with self._cond:
+            self._stopped = True
+            self._cond.notify()
+        self._thread.join()
+        self.journal.close()
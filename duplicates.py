@@ -0,0 +1,287 @@
+"""Near-duplicate detection for charity names.
+
+The ``unique=True`` constraint on ``name`` only catches exact repeats; "Save
+the Girls" and "Save The Girls Kenya" both get in. Names are compared with
+trigram similarity as defined by PostgreSQL's ``pg_trgm``: each word is
+lowercased and padded as ``"  word "``, and two names score
+``|shared trigrams| / |all trigrams|`` (1.0 for the same words, 0.0 for
+nothing in common).
+
+Two backends give the same scores:
+
+- ``pg_trgm`` (the default on PostgreSQL): the ``%`` operator backed by the
+  GIN trigram indexes on ``charities.name`` and ``unapproved_charities.name``.
+- ``index`` (everything else): an in-process inverted index from trigram to
+  names. It is kept current by mapper events for writes made in this
+  process, and rebuilt every ``DUPLICATE_INDEX_REFRESH`` seconds to pick up
+  writes from other processes. Builds run on a background thread (seconds
+  for 100k names) and the finished index is swapped in, with the writes made
+  meanwhile replayed onto it; requests keep using the previous index, and
+  the first lookups after start-up report no matches until the first build
+  finishes. Matches are re-read from the database before they are returned,
+  so a stale index can miss a duplicate but never reports a row that no
+  longer exists.
+
+Only names scoring at least ``DUPLICATE_THRESHOLD`` are reported, at most
+``DUPLICATE_LIMIT`` of them, best first.
+"""
+import logging
+import math
+import re
+import threading
+import time
+from collections import Counter, defaultdict
+from itertools import chain
+
+from sqlalchemy import event
+
+from models import db, Charity, UnapprovedCharity
+
+logger = logging.getLogger(__name__)
+
+_WORDS = re.compile(r'[^\W_]+')
+
+SOURCES = {'charity': Charity, 'unapproved_charity': UnapprovedCharity}
+
+
+def trigrams(name):
+    """The pg_trgm trigram set of ``name``."""
+    grams = set()
+    for word in _WORDS.findall(name.lower()):
+        padded = f'  {word} '
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return frozenset(grams)
+
+
+def similarity(a, b):
+    """pg_trgm ``similarity()`` of two trigram sets."""
+    if not a or not b:
+        return 0.0
+    shared = len(a & b)
+    return shared / (len(a) + len(b) - shared)
+
+
+class NameIndex:
+    """Inverted trigram index over ``id -> name``.
+
+    A name scoring ``t`` against a query of ``q`` trigrams shares at least
+    ``ceil(t * q)`` of them, so it must appear in one of the ``q - ceil(t * q) + 1``
+    shortest posting lists (prefix filtering). ``search`` counts those lists,
+    plus any other short ones, and scores exactly only the names whose count
+    can still reach the threshold; the long lists of common trigrams such as
+    "the" or "ion" are usually never read.
+    """
+
+    def __init__(self):
+        self.entries = {}
+        self.postings = defaultdict(set)
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def add(self, id, name):
+        grams = trigrams(name)
+        with self._lock:
+            self._discard(id)
+            self.entries[id] = (name, grams)
+            for gram in grams:
+                self.postings[gram].add(id)
+
+    def remove(self, id):
+        with self._lock:
+            self._discard(id)
+
+    def _discard(self, id):
+        entry = self.entries.pop(id, None)
+        if entry is None:
+            return
+        for gram in entry[1]:
+            ids = self.postings[gram]
+            ids.discard(id)
+            if not ids:
+                del self.postings[gram]
+
+    def search(self, name, threshold, limit):
+        """``[(score, id, name)]`` for the best ``limit`` names scoring at least ``threshold``."""
+        query = trigrams(name)
+        size = len(query)
+        if not size:
+            return []
+        needed = max(1, math.ceil(threshold * size))
+        matches = []
+        with self._lock:
+            lists = sorted((self.postings.get(gram, ()) for gram in query), key=len)
+            counted = size - needed + 1
+            short = max(64, len(self.entries) // 100)
+            while counted < size and len(lists[counted]) <= short:
+                counted += 1
+            # Shared trigrams a name must have among the counted lists
+            floor = needed - (size - counted)
+            counts = Counter(chain.from_iterable(lists[:counted]))
+            for id, count in counts.items():
+                if count < floor:
+                    continue
+                candidate_name, grams = self.entries[id]
+                shared = count if counted == size else len(query & grams)
+                score = shared / (size + len(grams) - shared)
+                if score >= threshold:
+                    matches.append((score, id, candidate_name))
+        matches.sort(key=lambda match: (-match[0], match[1]))
+        return matches[:limit]
+
+
+class DuplicateFinder:
+    def __init__(self, app=None):
+        self.app = None
+        self.indexes = None
+        self._built_at = 0.0
+        self._lock = threading.Lock()
+        self._builder = None
+        # Writes seen while a build runs, replayed onto its result before the swap
+        self._changes = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('DUPLICATE_BACKEND', None)  # pg_trgm on PostgreSQL, otherwise index
+        app.config.setdefault('DUPLICATE_THRESHOLD', 0.5)
+        app.config.setdefault('DUPLICATE_LIMIT', 5)
+        app.config.setdefault('DUPLICATE_INDEX_REFRESH', 300)
+        app.extensions['duplicates'] = self
+        self.app = app
+        for source, model in SOURCES.items():
+            event.listen(model, 'after_insert', self._on_write(source))
+            event.listen(model, 'after_update', self._on_write(source))
+            event.listen(model, 'after_delete', self._on_delete(source))
+
+    def backend(self):
+        configured = self.app.config['DUPLICATE_BACKEND']
+        if configured:
+            return configured
+        return 'pg_trgm' if db.session.get_bind().dialect.name == 'postgresql' else 'index'
+
+    def find(self, name, threshold=None, limit=None):
+        """Existing and pending charities whose names resemble ``name``, best first.
+
+        Each match is ``{'type', 'id', 'name', 'score'}`` with ``type`` either
+        ``charity`` or ``unapproved_charity``.
+        """
+        config = self.app.config
+        threshold = config['DUPLICATE_THRESHOLD'] if threshold is None else threshold
+        limit = config['DUPLICATE_LIMIT'] if limit is None else limit
+        if self.backend() == 'pg_trgm':
+            matches = self._find_pg_trgm(name, threshold, limit)
+        else:
+            matches = self._find_indexed(name, threshold, limit)
+        matches.sort(key=lambda match: (-match['score'], match['type'], match['id']))
+        return matches[:limit]
+
+    @staticmethod
+    def _live(model):
+        return [model.deleted_at.is_(None)] if model is Charity else []
+
+    def _find_pg_trgm(self, name, threshold, limit):
+        # Local to the transaction, so it only affects this request's % comparisons
+        db.session.execute(db.text("SELECT set_config('pg_trgm.similarity_threshold', :t, true)"),
+                           {'t': str(threshold)})
+        matches = []
+        for source, model in SOURCES.items():
+            score = db.func.similarity(model.name, name)
+            rows = db.session.execute(
+                db.select(model.id, model.name, score.label('score'))
+                .where(model.name.op('%')(name), *self._live(model))
+                .order_by(score.desc(), model.id)
+                .limit(limit)
+            )
+            matches.extend({'type': source, 'id': row.id, 'name': row.name, 'score': round(row.score, 3)}
+                           for row in rows)
+        return matches
+
+    def _find_indexed(self, name, threshold, limit):
+        query = trigrams(name)
+        matches = []
+        for source, index in self._current_indexes().items():
+            # Over-fetch a little so rows removed elsewhere do not shrink the answer
+            ids = [id for _, id, _ in index.search(name, threshold, limit * 2)]
+            if not ids:
+                continue
+            model = SOURCES[source]
+            # Score the names as they are now, not as the index remembers them
+            rows = db.session.execute(db.select(model.id, model.name).where(model.id.in_(ids), *self._live(model)))
+            for row in rows:
+                score = similarity(query, trigrams(row.name))
+                if score >= threshold:
+                    matches.append({'type': source, 'id': row.id, 'name': row.name, 'score': round(score, 3)})
+        return matches
+
+    def _current_indexes(self):
+        if self.indexes is None or time.monotonic() - self._built_at >= self.app.config['DUPLICATE_INDEX_REFRESH']:
+            self._start_build()
+        return self.indexes or {}
+
+    def _start_build(self):
+        with self._lock:
+            if self._builder is None:
+                self._changes = []
+                self._builder = threading.Thread(target=self._build, name='duplicate-index', daemon=True)
+                self._builder.start()
+            return self._builder
+
+    def rebuild(self):
+        """Rebuild the indexes now and wait for the swap; returns them."""
+        self._start_build().join()
+        return self.indexes
+
+    def _build(self):
+        try:
+            with self.app.app_context():
+                indexes = self.build_indexes()
+            with self._lock:
+                for source, id, name in self._changes:
+                    self._apply(indexes, source, id, name)
+                self.indexes = indexes
+                self._built_at = time.monotonic()
+        except Exception:
+            logger.exception('Building the duplicate name index failed')
+            # Keep serving the old index; try again after the next refresh interval
+            self._built_at = time.monotonic()
+        finally:
+            with self._lock:
+                self._changes = None
+                self._builder = None
+
+    def build_indexes(self):
+        indexes = {}
+        for source, model in SOURCES.items():
+            index = indexes[source] = NameIndex()
+            for id, name in db.session.execute(db.select(model.id, model.name).where(*self._live(model))):
+                index.add(id, name)
+        return indexes
+
+    @staticmethod
+    def _apply(indexes, source, id, name):
+        if name is None:
+            indexes[source].remove(id)
+        else:
+            indexes[source].add(id, name)
+
+    def _record(self, source, id, name):
+        """Apply a write (``name`` None for a removal) to the live index and any build in progress."""
+        with self._lock:
+            if self._changes is not None:
+                self._changes.append((source, id, name))
+            indexes = self.indexes
+        if indexes is not None:
+            self._apply(indexes, source, id, name)
+
+    def _on_write(self, source):
+        def listener(mapper, connection, target):
+            live = getattr(target, 'deleted_at', None) is None
+            self._record(source, target.id, target.name if live else None)
+        return listener
+
+    def _on_delete(self, source):
+        def listener(mapper, connection, target):
+            self._record(source, target.id, None)
+        return listener
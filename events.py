@@ -0,0 +1,236 @@
+"""Live charity totals pushed to browsers over Server-Sent Events.
+
+Donation writes call ``LiveTotals.mark_dirty(charity_id)``. Every
+``SSE_COALESCE_INTERVAL`` seconds the dirty ids are collected, their totals
+are read in one grouped query, and a single ``{charity_id: total}`` message is
+published to the broker, so a burst of donations results in one update.
+
+The broker fans messages out to every worker; each worker then copies them
+into the bounded queues of its connected SSE clients. ``LocalBroker`` is the
+in-process broker used by default, which only suits a single worker.
+``SQLiteBroker`` (``SSE_BROKER_PATH``) shares messages between the workers of
+one host through a SQLite file. A multi-host deployment plugs in a broker
+with the same ``publish``/``subscribe`` methods (Redis pub/sub, PostgreSQL
+LISTEN/NOTIFY).
+
+Each open stream holds a worker thread, so run gunicorn with threaded or
+gevent workers when streams are enabled.
+"""
+import json
+import logging
+import queue
+import sqlite3
+import threading
+import time
+
+from models import donation_totals
+
+logger = logging.getLogger(__name__)
+
+
+class LocalBroker:
+    """In-process broker: every subscriber sees every published message."""
+
+    def __init__(self):
+        self._subscribers = []
+        self._lock = threading.Lock()
+
+    def subscribe(self, callback):
+        with self._lock:
+            self._subscribers.append(callback)
+
+    def publish(self, message):
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for callback in subscribers:
+            callback(message)
+
+
+class SQLiteBroker:
+    """Messages in a SQLite file shared by all workers on the host.
+
+    ``publish`` appends a row; a thread in each process polls every
+    ``poll_interval`` seconds for rows it has not seen and hands them to the
+    local subscribers, its own messages included. Rows older than
+    ``retention`` seconds are deleted on publish.
+    """
+
+    def __init__(self, path, poll_interval=0.2, retention=60):
+        self.path = path
+        self.poll_interval = poll_interval
+        self.retention = retention
+        self._subscribers = []
+        self._lock = threading.Lock()
+        self._poll_lock = threading.Lock()
+        self._local = threading.local()
+        self._thread = None
+        conn = self._connect()
+        conn.execute('CREATE TABLE IF NOT EXISTS messages '
+                     '(id INTEGER PRIMARY KEY AUTOINCREMENT, body TEXT NOT NULL, created REAL NOT NULL)')
+        # Only messages published from now on
+        self._last_id = conn.execute('SELECT coalesce(max(id), 0) FROM messages').fetchone()[0]
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            self._local.conn = conn
+        return conn
+
+    def subscribe(self, callback):
+        with self._lock:
+            self._subscribers.append(callback)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='sse-broker', daemon=True)
+                self._thread.start()
+
+    def publish(self, message):
+        # Wall clock, since monotonic clocks are not comparable across processes
+        now = time.time()
+        conn = self._connect()
+        conn.execute('INSERT INTO messages (body, created) VALUES (?, ?)',
+                     (json.dumps(message, separators=(',', ':')), now))
+        conn.execute('DELETE FROM messages WHERE created < ?', (now - self.retention,))
+
+    def poll(self):
+        """Deliver the messages published since the last poll; returns how many."""
+        with self._poll_lock:
+            rows = self._connect().execute(
+                'SELECT id, body FROM messages WHERE id > ? ORDER BY id', (self._last_id,)).fetchall()
+            if rows:
+                self._last_id = rows[-1][0]
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for _, body in rows:
+            message = json.loads(body)
+            for callback in subscribers:
+                callback(message)
+        return len(rows)
+
+    def _run(self):
+        while True:
+            time.sleep(self.poll_interval)
+            try:
+                self.poll()
+            except Exception:
+                logger.exception('Polling the SSE broker failed')
+
+
+class LiveTotals:
+    def __init__(self, app=None, broker=None):
+        self.broker = broker
+        self.clients = set()
+        self._dirty = set()
+        self._lock = threading.Lock()
+        self._thread = None
+        if app is not None:
+            self.init_app(app, broker)
+
+    def init_app(self, app, broker=None):
+        app.config.setdefault('SSE_COALESCE_INTERVAL', 1.0)
+        app.config.setdefault('SSE_HEARTBEAT_INTERVAL', 15.0)
+        app.config.setdefault('SSE_CLIENT_QUEUE_SIZE', 16)
+        app.config.setdefault('SSE_BROKER_PATH', None)
+        app.config.setdefault('SSE_BROKER_POLL_INTERVAL', 0.2)
+        self.app = app
+        self.interval = app.config['SSE_COALESCE_INTERVAL']
+        broker = broker or self.broker
+        if broker is None:
+            path = app.config['SSE_BROKER_PATH']
+            broker = SQLiteBroker(path, app.config['SSE_BROKER_POLL_INTERVAL']) if path else LocalBroker()
+        self.broker = broker
+        self.broker.subscribe(self._deliver)
+        app.extensions['live_totals'] = self
+
+    def mark_dirty(self, *charity_ids):
+        with self._lock:
+            self._dirty.update(charity_id for charity_id in charity_ids if charity_id is not None)
+        self._ensure_thread()
+
+    def _ensure_thread(self):
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name='live-totals', daemon=True)
+                    self._thread.start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                self.flush()
+            except Exception:
+                self.app.logger.exception('Publishing live totals failed')
+
+    def flush(self):
+        """Publish one message with the current totals of every dirty charity."""
+        with self._lock:
+            dirty, self._dirty = self._dirty, set()
+        if not dirty:
+            return None
+        with self.app.app_context():
+            totals = donation_totals(dirty)
+        message = {str(charity_id): totals.get(charity_id, 0) for charity_id in sorted(dirty)}
+        self.broker.publish(message)
+        return message
+
+    def _deliver(self, message):
+        for client in list(self.clients):
+            client.put(message)
+
+    def connect(self, charity_id=None):
+        client = StreamClient(charity_id, self.app.config['SSE_CLIENT_QUEUE_SIZE'])
+        self.clients.add(client)
+        return client
+
+    def disconnect(self, client):
+        self.clients.discard(client)
+
+    def stream(self, client, snapshot):
+        """Yield SSE frames for ``client``, starting with ``snapshot``."""
+        heartbeat = self.app.config['SSE_HEARTBEAT_INTERVAL']
+        try:
+            yield format_event(snapshot)
+            while True:
+                message = client.get(timeout=heartbeat)
+                if message is None:
+                    yield ': keep-alive\n\n'
+                else:
+                    yield format_event(message)
+        finally:
+            self.disconnect(client)
+
+
+class StreamClient:
+    """One open SSE connection, optionally filtered to a single charity."""
+
+    def __init__(self, charity_id, maxsize):
+        self.key = str(charity_id) if charity_id is not None else None
+        self.queue = queue.Queue(maxsize)
+
+    def put(self, message):
+        if self.key is not None:
+            if self.key not in message:
+                return
+            message = {self.key: message[self.key]}
+        while True:
+            try:
+                self.queue.put_nowait(message)
+                return
+            except queue.Full:
+                # A slow reader only needs the latest totals
+                try:
+                    self.queue.get_nowait()
+                except queue.Empty:
+                    pass
+
+    def get(self, timeout):
+        try:
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+
+def format_event(message):
+    return f'event: totals\ndata: {json.dumps(message, separators=(",", ":"))}\n\n'
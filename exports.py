@@ -0,0 +1,82 @@
+"""Streaming donation exports.
+
+Rows are read through a server-side cursor (``stream_results`` with
+``yield_per``) and written out in chunks by a generator, so an export of any
+size runs in constant memory. ``user_id`` is blanked for anonymous donations.
+"""
+import csv
+import io
+import json
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional dependency
+    orjson = None
+
+from models import db, Donation, DonationArchive
+
+EXPORT_COLUMNS = ('id', 'amount', 'anonymous', 'donation_date', 'user_id', 'charity_id')
+CONTENT_TYPES = {'csv': 'text/csv', 'ndjson': 'application/x-ndjson'}
+
+
+def donation_rows(start=None, end=None, charity_id=None, batch_size=1000):
+    """Yield export rows as tuples in EXPORT_COLUMNS order, oldest first.
+
+    Archived donations come first (they all predate the live ones), then the
+    live table, each ordered by id.
+    """
+    for model in (DonationArchive, Donation):
+        query = db.select(*(getattr(model, column) for column in EXPORT_COLUMNS))
+        if start is not None:
+            query = query.where(model.donation_date >= start)
+        if end is not None:
+            query = query.where(model.donation_date < end)
+        if charity_id is not None:
+            query = query.where(model.charity_id == charity_id)
+        query = query.order_by(model.id).execution_options(stream_results=True, yield_per=batch_size)
+        for id, amount, anonymous, donation_date, user_id, row_charity_id in db.session.execute(query):
+            yield (
+                id,
+                amount,
+                bool(anonymous),
+                donation_date.isoformat() if donation_date else None,
+                None if anonymous else user_id,
+                row_charity_id,
+            )
+
+
+def _chunks(rows, size):
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def as_csv(rows, chunk_size=1000):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_COLUMNS)
+    yield buffer.getvalue()
+    for chunk in _chunks(rows, chunk_size):
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows(chunk)
+        yield buffer.getvalue()
+
+
+def as_ndjson(rows, chunk_size=1000):
+    for chunk in _chunks(rows, chunk_size):
+        if orjson is not None:
+            yield b''.join(orjson.dumps(dict(zip(EXPORT_COLUMNS, row)), option=orjson.OPT_APPEND_NEWLINE)
+                           for row in chunk)
+        else:
+            yield ''.join(
+                json.dumps(dict(zip(EXPORT_COLUMNS, row)), separators=(',', ':')) + '\n' for row in chunk
+            )
+
+
+FORMATTERS = {'csv': as_csv, 'ndjson': as_ndjson}
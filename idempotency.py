@@ -0,0 +1,142 @@
+"""``Idempotency-Key`` support for POST endpoints.
+
+The first request with a given key reserves a row in ``idempotency_keys``
+before the view runs, and the row is updated with the response once the view
+has returned. A repeat with the same key replays that response; a repeat with
+a different body gets a ``422``, and one that arrives while the first is still
+running gets a ``409``. Keys are scoped to the caller's token identity, so
+two donors who happen to send the same key do not share a response. Replays are served from an in-process LRU when
+possible, so the database is only consulted on a local miss.
+
+A reservation still unanswered after ``IDEMPOTENCY_LEASE`` seconds is taken
+to belong to a worker that died mid-request, and the next retry takes it
+over instead of getting ``409`` until the key expires. The lease must
+therefore outlast the slowest protected request.
+
+Keys expire after ``IDEMPOTENCY_TTL`` seconds; expired rows are purged
+opportunistically, at most once per ``IDEMPOTENCY_PURGE_INTERVAL``.
+"""
+import hashlib
+import time
+from datetime import datetime, timedelta
+from functools import wraps
+
+from flask import current_app, jsonify, request
+from flask_jwt_extended import get_jwt_identity, verify_jwt_in_request
+from sqlalchemy.exc import IntegrityError
+
+from cache import LRUCache
+from models import db, IdempotencyKey
+
+HEADER = 'Idempotency-Key'
+
+
+class Idempotency:
+    def __init__(self, app=None):
+        self.cache = None
+        self._last_purge = 0.0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('IDEMPOTENCY_TTL', 24 * 3600)
+        app.config.setdefault('IDEMPOTENCY_LEASE', 60)
+        app.config.setdefault('IDEMPOTENCY_CACHE_SIZE', 10000)
+        app.config.setdefault('IDEMPOTENCY_PURGE_INTERVAL', 300)
+        self.cache = LRUCache(app.config['IDEMPOTENCY_CACHE_SIZE'], ttl=app.config['IDEMPOTENCY_TTL'])
+        app.extensions['idempotency'] = self
+
+    @staticmethod
+    def _replay(stored, request_hash):
+        status_code, body, stored_hash = stored
+        if stored_hash != request_hash:
+            return jsonify({'msg': f'{HEADER} was already used with a different request'}), 422
+        response = current_app.response_class(body, status=status_code, mimetype='application/json')
+        response.headers['Idempotent-Replayed'] = 'true'
+        return response
+
+    def _reserve(self, key, request_hash):
+        """Insert the placeholder row; return the existing row if the key is taken."""
+        ttl = current_app.config['IDEMPOTENCY_TTL']
+        db.session.add(IdempotencyKey(key=key, request_hash=request_hash))
+        try:
+            db.session.commit()
+            return None
+        except IntegrityError:
+            db.session.rollback()
+        existing = IdempotencyKey.query.filter_by(key=key).first()
+        now = datetime.utcnow()
+        if existing is not None and existing.created_at < now - timedelta(seconds=ttl):
+            db.session.delete(existing)
+            db.session.commit()
+            return self._reserve(key, request_hash)
+        lease = timedelta(seconds=current_app.config['IDEMPOTENCY_LEASE'])
+        if existing is not None and existing.status_code is None and existing.created_at < now - lease:
+            # Abandoned by its worker; renewing created_at in one UPDATE lets only one retry win it
+            taken = IdempotencyKey.query.filter(
+                IdempotencyKey.id == existing.id,
+                IdempotencyKey.status_code.is_(None),
+                IdempotencyKey.created_at == existing.created_at,
+            ).update({'created_at': now, 'request_hash': request_hash}, synchronize_session=False)
+            db.session.commit()
+            if taken:
+                return None
+            return IdempotencyKey.query.filter_by(key=key).first() or self._reserve(key, request_hash)
+        return existing
+
+    def purge_expired(self):
+        cutoff = datetime.utcnow() - timedelta(seconds=current_app.config['IDEMPOTENCY_TTL'])
+        deleted = IdempotencyKey.query.filter(IdempotencyKey.created_at < cutoff).delete()
+        db.session.commit()
+        return deleted
+
+    def _maybe_purge(self):
+        now = time.monotonic()
+        if now - self._last_purge >= current_app.config['IDEMPOTENCY_PURGE_INTERVAL']:
+            self._last_purge = now
+            self.purge_expired()
+
+    def protect(self, view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            header = request.headers.get(HEADER)
+            if not header:
+                return view(*args, **kwargs)
+            if len(header) > 255:
+                return jsonify({'msg': f'{HEADER} must be at most 255 characters'}), 400
+
+            # Views that take the donor from the token must not replay another caller's response
+            verify_jwt_in_request(optional=True)
+            key = f"{request.endpoint}:{get_jwt_identity() or ''}:{header}"
+            request_hash = hashlib.sha256(request.get_data()).hexdigest()
+            stored = self.cache.get(key)
+            if stored is not None:
+                return self._replay(stored, request_hash)
+
+            existing = self._reserve(key, request_hash)
+            if existing is not None:
+                if existing.status_code is None:
+                    return jsonify({'msg': 'A request with this key is still being processed'}), 409
+                stored = (existing.status_code, existing.response_body, existing.request_hash)
+                self.cache.set(key, stored)
+                return self._replay(stored, request_hash)
+
+            try:
+                response = current_app.make_response(view(*args, **kwargs))
+            except Exception:
+                db.session.rollback()
+                IdempotencyKey.query.filter_by(key=key).delete()
+                db.session.commit()
+                raise
+            if response.status_code >= 500:
+                # Let the client retry server errors with the same key
+                IdempotencyKey.query.filter_by(key=key).delete()
+            else:
+                body = response.get_data(as_text=True)
+                IdempotencyKey.query.filter_by(key=key).update(
+                    {'status_code': response.status_code, 'response_body': body})
+                self.cache.set(key, (response.status_code, body, request_hash))
+            db.session.commit()
+            self._maybe_purge()
+            return response
+        return wrapper
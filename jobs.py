@@ -0,0 +1,202 @@
+"""Background jobs for admin operations that are too slow for a web request.
+
+A job is a row in ``jobs``. A route enqueues it and answers ``202`` with the
+job id, and ``GET /jobs/<id>`` reports its status and progress. Handlers are
+registered with ``@jobs.task('kind')`` and are called as
+``handler(job, **params)``. The return value, which must be JSON-serialisable,
+is stored as the job result.
+
+Run the workers with ``flask jobs worker --concurrency 4``. Use
+``flask jobs run`` to drain the queue once, for example from cron. Workers
+claim jobs with a compare-and-set on ``status``, plus ``FOR UPDATE SKIP
+LOCKED`` on PostgreSQL, so any number of worker processes can share the
+table.
+
+A job counts as abandoned, and is re-queued, when it is still ``running`` and
+its heartbeat is older than ``JOBS_STALE_SECONDS``. Heartbeats come from
+``job.progress()``, so long handlers should report progress regularly. After
+``JOBS_MAX_ATTEMPTS`` runs the job is marked failed instead.
+"""
+import logging
+import os
+import socket
+import threading
+import time
+from datetime import datetime, timedelta
+
+import click
+from flask.cli import AppGroup
+
+from models import db, Job
+
+logger = logging.getLogger(__name__)
+
+
+class JobContext:
+    """Handed to a handler so it can report progress on its own job."""
+
+    def __init__(self, job_id):
+        self.id = job_id
+
+    def progress(self, done, total=None):
+        """Record progress and refresh the heartbeat.
+
+        This commits the current transaction, so call it between units of work.
+        """
+        values = {'progress': done, 'heartbeat_at': datetime.utcnow()}
+        if total is not None:
+            values['total'] = total
+        db.session.execute(db.update(Job).where(Job.id == self.id).values(**values))
+        db.session.commit()
+
+
+class JobRunner:
+    def __init__(self, app=None):
+        self.app = None
+        self.tasks = {}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('JOBS_POLL_INTERVAL', 1.0)
+        app.config.setdefault('JOBS_CONCURRENCY', 2)
+        app.config.setdefault('JOBS_STALE_SECONDS', 300)
+        app.config.setdefault('JOBS_MAX_ATTEMPTS', 3)
+        app.extensions['jobs'] = self
+        self.app = app
+        app.cli.add_command(self._cli())
+
+    def task(self, kind):
+        def register(handler):
+            self.tasks[kind] = handler
+            return handler
+        return register
+
+    def enqueue(self, kind, **params):
+        if kind not in self.tasks:
+            raise LookupError(f'Unknown job kind {kind!r}')
+        job = Job(kind=kind, params=params)
+        db.session.add(job)
+        db.session.commit()
+        return job
+
+    def requeue_stale(self):
+        """Hand jobs whose worker died back to the queue, or fail them after too many attempts."""
+        config = self.app.config
+        cutoff = datetime.utcnow() - timedelta(seconds=config['JOBS_STALE_SECONDS'])
+        stale = (Job.status == 'running', Job.heartbeat_at < cutoff)
+        db.session.execute(
+            db.update(Job).where(*stale, Job.attempts >= config['JOBS_MAX_ATTEMPTS'])
+            .values(status='failed', error='Worker lost', finished_at=datetime.utcnow())
+        )
+        db.session.execute(db.update(Job).where(*stale).values(status='queued', worker=None))
+        db.session.commit()
+
+    def claim(self, worker):
+        """Mark the oldest queued job as running on ``worker`` and return its id, or None."""
+        candidates = db.session.scalars(
+            db.select(Job.id).where(Job.status == 'queued')
+            .order_by(Job.created_at, Job.id).limit(10)
+            .with_for_update(skip_locked=True)
+        ).all()
+        now = datetime.utcnow()
+        for job_id in candidates:
+            claimed = db.session.execute(
+                db.update(Job).where(Job.id == job_id, Job.status == 'queued')
+                .values(status='running', worker=worker, started_at=now, heartbeat_at=now,
+                        attempts=Job.attempts + 1)
+            )
+            if claimed.rowcount == 1:
+                db.session.commit()
+                return job_id
+        db.session.commit()
+        return None
+
+    def execute(self, job_id):
+        job = db.session.get(Job, job_id)
+        kind, params = job.kind, dict(job.params or {})
+        try:
+            handler = self.tasks.get(kind)
+            if handler is None:
+                raise LookupError(f'No handler for job kind {kind!r}')
+            result = handler(JobContext(job_id), **params)
+        except Exception as e:
+            db.session.rollback()
+            logger.exception('Job %s (%s) failed', job_id, kind)
+            self._finish(job_id, status='failed', error=str(e))
+        else:
+            self._finish(job_id, status='succeeded', result=result)
+
+    @staticmethod
+    def _finish(job_id, **values):
+        db.session.execute(
+            db.update(Job).where(Job.id == job_id).values(finished_at=datetime.utcnow(), **values)
+        )
+        db.session.commit()
+
+    def run_pending(self, worker='inline'):
+        """Run queued jobs in this thread until none are left; returns how many ran."""
+        count = 0
+        self.requeue_stale()
+        while (job_id := self.claim(worker)) is not None:
+            self.execute(job_id)
+            count += 1
+        return count
+
+    def work(self, concurrency=None, poll_interval=None, stop=None):
+        """Run a pool of worker threads until ``stop`` is set (or forever)."""
+        config = self.app.config
+        concurrency = concurrency or config['JOBS_CONCURRENCY']
+        poll_interval = poll_interval or config['JOBS_POLL_INTERVAL']
+        stop = stop or threading.Event()
+        prefix = f'{socket.gethostname()}:{os.getpid()}'
+        threads = [
+            threading.Thread(target=self._work, args=(f'{prefix}:{n}', poll_interval, stop),
+                             name=f'job-worker-{n}', daemon=True)
+            for n in range(concurrency)
+        ]
+        for thread in threads:
+            thread.start()
+        try:
+            while any(thread.is_alive() for thread in threads):
+                for thread in threads:
+                    thread.join(timeout=1)
+        except KeyboardInterrupt:
+            stop.set()
+            for thread in threads:
+                thread.join()
+
+    def _work(self, worker, poll_interval, stop):
+        last_sweep = 0
+        while not stop.is_set():
+            with self.app.app_context():
+                try:
+                    if time.monotonic() - last_sweep > poll_interval * 30:
+                        self.requeue_stale()
+                        last_sweep = time.monotonic()
+                    job_id = self.claim(worker)
+                    if job_id is not None:
+                        self.execute(job_id)
+                        continue
+                except Exception:
+                    logger.exception('Job worker %s hit an error', worker)
+                finally:
+                    db.session.remove()
+            stop.wait(poll_interval)
+
+    def _cli(self):
+        cli = AppGroup('jobs', help='Run background jobs.')
+
+        @cli.command('worker')
+        @click.option('--concurrency', type=int, default=None, help='Worker threads (JOBS_CONCURRENCY).')
+        @click.option('--poll-interval', type=float, default=None, help='Seconds between polls when idle.')
+        def worker(concurrency, poll_interval):
+            """Process jobs until interrupted."""
+            self.work(concurrency, poll_interval)
+
+        @cli.command('run')
+        def run():
+            """Run every queued job once and exit."""
+            click.echo(f'Ran {self.run_pending()} jobs')
+
+        return cli
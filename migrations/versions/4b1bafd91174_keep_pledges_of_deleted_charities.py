@@ -0,0 +1,44 @@
+"""keep pledges of deleted charities
+
+Revision ID: 4b1bafd91174
+Revises: b38c1a89b8dc
+Create Date: 2026-10-19 20:11:58.437513
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '4b1bafd91174'
+down_revision = 'b38c1a89b8dc'
+branch_labels = None
+depends_on = None
+
+
+FK_NAME = 'recurring_pledges_charity_id_fkey'
+# The original constraint is unnamed; SQLite reflects it without a name, which
+# this convention fills in so the batch copy can drop it
+NAMING = {'fk': 'fk_%(table_name)s_%(column_0_name)s_%(referred_table_name)s'}
+
+
+def upgrade():
+    foreign_keys = sa.inspect(op.get_bind()).get_foreign_keys('recurring_pledges')
+    original = next(fk['name'] for fk in foreign_keys if fk['constrained_columns'] == ['charity_id'])
+    original = original or 'fk_recurring_pledges_charity_id_charities'
+    with op.batch_alter_table('recurring_pledges', schema=None, naming_convention=NAMING) as batch_op:
+        batch_op.alter_column('charity_id',
+               existing_type=sa.INTEGER(),
+               nullable=True)
+        batch_op.drop_constraint(original, type_='foreignkey')
+        batch_op.create_foreign_key(FK_NAME, 'charities', ['charity_id'], ['id'], ondelete='SET NULL')
+
+
+def downgrade():
+    op.execute('DELETE FROM recurring_pledges WHERE charity_id IS NULL')
+    with op.batch_alter_table('recurring_pledges', schema=None) as batch_op:
+        batch_op.drop_constraint(FK_NAME, type_='foreignkey')
+        batch_op.create_foreign_key(FK_NAME, 'charities', ['charity_id'], ['id'], ondelete='CASCADE')
+        batch_op.alter_column('charity_id',
+               existing_type=sa.INTEGER(),
+               nullable=False)
@@ -0,0 +1,38 @@
+"""charity name trigram indexes
+
+Revision ID: a664f7a9502b
+Revises: 757b0db1952a
+Create Date: 2026-10-19 19:41:06.628538
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a664f7a9502b'
+down_revision = '757b0db1952a'
+branch_labels = None
+depends_on = None
+
+
+TRIGRAM_INDEXES = {
+    'ix_charities_name_trgm': 'charities',
+    'ix_unapproved_charities_name_trgm': 'unapproved_charities',
+}
+
+
+def upgrade():
+    # Other databases use the in-process index in duplicates.py
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    for name, table in TRIGRAM_INDEXES.items():
+        op.create_index(name, table, ['name'], postgresql_using='gin', postgresql_ops={'name': 'gin_trgm_ops'})
+
+
+def downgrade():
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    for name, table in TRIGRAM_INDEXES.items():
+        op.drop_index(name, table_name=table)
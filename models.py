@@ -1,7 +1,8 @@
 from flask_sqlalchemy import SQLAlchemy
 from datetime import datetime
+from replicas import RoutingSession
 
-db = SQLAlchemy()
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 
 class User(db.Model):
     __tablename__ = 'users'
@@ -30,22 +31,28 @@ class Charity(db.Model):
     description = db.Column(db.Text, nullable=False)
     website = db.Column(db.String(200))
     image_url = db.Column(db.String(500))
+    # Set when deletion starts; the row is removed once its dependents are detached
+    deleted_at = db.Column(db.DateTime, nullable=True)
     donations = db.relationship('Donation', backref='charity', lazy=True, passive_deletes=True)
     beneficiaries = db.relationship('Beneficiary', backref='charity', lazy=True, passive_deletes=True)
 
     def __repr__(self):
         return f"<Charity {self.name}>"
 
-    def to_dict(self):
-        total_donations = sum(donation.amount for donation in self.donations)
-        return {
-            'id': self.id,
-            'name': self.name,
-            'description': self.description,
-            'website': self.website,
-            'image_url': self.image_url,
-            'total_donations': total_donations
-        }
+    FIELDS = ('id', 'name', 'description', 'website', 'image_url', 'total_donations')
+    SUMMARY_FIELDS = ('id', 'name', 'image_url', 'total_donations')
+
+    def to_dict(self, fields=FIELDS, total_donations=None):
+        # Only touch the requested attributes so deferred columns stay unloaded
+        data = {}
+        for field in fields:
+            if field == 'total_donations':
+                if total_donations is None:
+                    total_donations = donation_totals([self.id]).get(self.id, 0)
+                data[field] = total_donations
+            else:
+                data[field] = getattr(self, field)
+        return data
     
 class UnapprovedCharity(db.Model):
     __tablename__ = 'unapproved_charities'
@@ -59,15 +66,10 @@ class UnapprovedCharity(db.Model):
     def __repr__(self):
         return f"<UnapprovedCharity {self.name}>"
 
+    FIELDS = ('id', 'name', 'description', 'website', 'image_url', 'date_submitted')
+
     def to_dict(self):
-        return {
-            'id': self.id,
-            'name': self.name,
-            'description': self.description,
-            'website': self.website,
-            'image_url': self.image_url,
-            'date_submitted': self.date_submitted
-        }
+        return {field: getattr(self, field) for field in self.FIELDS}
 
 class Donation(db.Model):
     __tablename__ = 'donations'
@@ -77,19 +79,78 @@ class Donation(db.Model):
     donation_date = db.Column(db.DateTime, default=datetime.utcnow)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=True)
     charity_id = db.Column(db.Integer, db.ForeignKey('charities.id', ondelete='SET NULL'), nullable=True)
+    # Pending id of donations accepted through the write-behind journal
+    journal_id = db.Column(db.String(32), unique=True, index=True, nullable=True)
+    # Set on donations materialised from a recurring pledge
+    pledge_id = db.Column(db.Integer, db.ForeignKey('recurring_pledges.id', ondelete='SET NULL'), nullable=True)
+    scheduled_for = db.Column(db.DateTime, nullable=True)
+
+    __table_args__ = (
+        # One donation per pledge run, however often the scheduler retries
+        db.UniqueConstraint('pledge_id', 'scheduled_for', name='uq_donations_pledge_id_scheduled_for'),
+        # Recent donations per charity (charity overview)
+        db.Index('ix_donations_charity_id_donation_date', 'charity_id', 'donation_date'),
+        # Donor history: keyset pages and the lifetime total are index-only scans on PostgreSQL
+        db.Index(
+            'ix_donations_user_id_donation_date_id', 'user_id', 'donation_date', 'id',
+            postgresql_include=['amount', 'charity_id', 'anonymous'],
+        ),
+    )
 
     def __repr__(self):
         return f"<Donation {self.amount} by User {self.user_id}>"
 
+    # All covered by ix_donations_user_id_donation_date_id
+    FIELDS = ('id', 'amount', 'anonymous', 'donation_date', 'user_id', 'charity_id')
+
     def to_dict(self):
-        return {
-            'id': self.id,
-            'amount': self.amount,
-            'anonymous': self.anonymous,
-            'donation_date': self.donation_date,
-            'user_id': self.user_id,
-            'charity_id': self.charity_id
-        }
+        return {field: getattr(self, field) for field in self.FIELDS}
+
+class DonationArchive(db.Model):
+    """Donations from closed months, moved out of ``donations`` by ``archive.archive_donations``.
+
+    Range-partitioned by month on PostgreSQL (one partition per archived month).
+    The primary key includes donation_date because a partitioned table's keys
+    must contain the partition column.
+    """
+    __tablename__ = 'donations_archive'
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    donation_date = db.Column(db.DateTime, primary_key=True)
+    amount = db.Column(db.Float, nullable=False)
+    anonymous = db.Column(db.Boolean, default=False)
+    user_id = db.Column(db.Integer, nullable=True)
+    charity_id = db.Column(db.Integer, nullable=True)
+    pledge_id = db.Column(db.Integer, nullable=True)
+    scheduled_for = db.Column(db.DateTime, nullable=True)
+
+    __table_args__ = (
+        db.Index('ix_donations_archive_user_id_donation_date_id', 'user_id', 'donation_date', 'id'),
+        db.Index('ix_donations_archive_charity_id', 'charity_id'),
+        {'postgresql_partition_by': 'RANGE (donation_date)'},
+    )
+
+    def __repr__(self):
+        return f"<DonationArchive {self.amount} by User {self.user_id}>"
+
+    FIELDS = Donation.FIELDS
+    to_dict = Donation.to_dict
+
+class ArchivedTotal(db.Model):
+    """Per-charity, per-month sums of the archived donations."""
+    __tablename__ = 'archived_totals'
+    id = db.Column(db.Integer, primary_key=True)
+    charity_id = db.Column(db.Integer, nullable=True, index=True)
+    # First day of the month
+    period = db.Column(db.Date, nullable=False)
+    total = db.Column(db.Float, nullable=False, default=0)
+    donation_count = db.Column(db.Integer, nullable=False, default=0)
+
+    __table_args__ = (
+        db.UniqueConstraint('charity_id', 'period', name='uq_archived_totals_charity_id_period'),
+    )
+
+    def __repr__(self):
+        return f"<ArchivedTotal {self.period} Charity {self.charity_id}: {self.total}>"
 
 class Beneficiary(db.Model):
     __tablename__ = 'beneficiaries'
@@ -102,22 +163,230 @@ class Beneficiary(db.Model):
     def __repr__(self):
         return f"<Beneficiary {self.name}>"
 
+    FIELDS = ('id', 'name', 'story', 'image_url', 'charity')
+    SUMMARY_FIELDS = ('id', 'name', 'image_url', 'charity')
+
+    def to_dict(self, fields=FIELDS):
+        data = {}
+        for field in fields:
+            if field == 'charity':
+                data[field] = {
+                    'id': self.charity.id,
+                    'name': self.charity.name
+                } if self.charity and self.charity.deleted_at is None else None
+            else:
+                data[field] = getattr(self, field)
+        return data
+
+class RecurringPledge(db.Model):
+    __tablename__ = 'recurring_pledges'
+    INTERVALS = ('daily', 'weekly', 'monthly')
+
+    id = db.Column(db.Integer, primary_key=True)
+    amount = db.Column(db.Float, nullable=False)
+    interval = db.Column(db.String(10), nullable=False)
+    anonymous = db.Column(db.Boolean, default=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=True)
+    # Detached (and the pledge left inactive) when the charity is deleted, so its donations keep their pledge_id
+    charity_id = db.Column(db.Integer, db.ForeignKey('charities.id', ondelete='SET NULL'), nullable=True)
+    # First run; monthly pledges keep its day of the month
+    start_date = db.Column(db.DateTime, nullable=False)
+    next_run = db.Column(db.DateTime, nullable=False)
+    active = db.Column(db.Boolean, nullable=False, default=True)
+    # Why the scheduler deactivated the pledge, if it did
+    failure = db.Column(db.String(200), nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        # The scheduler's due scan only ever reads active pledges
+        db.Index('ix_recurring_pledges_due', 'next_run',
+                 postgresql_where=db.text('active'), sqlite_where=db.text('active')),
+    )
+
+    def __repr__(self):
+        return f"<RecurringPledge {self.amount} {self.interval} to Charity {self.charity_id}>"
+
     def to_dict(self):
         return {
             'id': self.id,
-            'name': self.name,
-            'story': self.story,
-            'image_url': self.image_url,
-            'charity': {
-                'id': self.charity.id,
-                'name': self.charity.name
-            } if self.charity else None
+            'amount': self.amount,
+            'interval': self.interval,
+            'anonymous': self.anonymous,
+            'user_id': self.user_id,
+            'charity_id': self.charity_id,
+            'start_date': self.start_date,
+            'next_run': self.next_run,
+            'active': self.active,
+            'failure': self.failure
         }
 
+class IdempotencyKey(db.Model):
+    __tablename__ = 'idempotency_keys'
+    id = db.Column(db.Integer, primary_key=True)
+    # "<endpoint>:<caller's token identity, empty for guests>:<Idempotency-Key header>"
+    key = db.Column(db.String(400), unique=True, index=True, nullable=False)
+    request_hash = db.Column(db.String(64), nullable=False)
+    # NULL while the first request is still being processed
+    status_code = db.Column(db.Integer, nullable=True)
+    response_body = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+
+    def __repr__(self):
+        return f"<IdempotencyKey {self.key}>"
+
+class Job(db.Model):
+    __tablename__ = 'jobs'
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(50), nullable=False)
+    params = db.Column(db.JSON, nullable=False, default=dict)
+    # queued -> running -> succeeded | failed
+    status = db.Column(db.String(20), nullable=False, default='queued')
+    progress = db.Column(db.Integer, nullable=False, default=0)
+    total = db.Column(db.Integer, nullable=True)
+    result = db.Column(db.JSON, nullable=True)
+    error = db.Column(db.Text, nullable=True)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    worker = db.Column(db.String(100), nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime, nullable=True)
+    # Refreshed on every progress report; a stale running job lost its worker
+    heartbeat_at = db.Column(db.DateTime, nullable=True)
+    finished_at = db.Column(db.DateTime, nullable=True)
+
+    __table_args__ = (
+        # Workers claim the oldest queued job
+        db.Index('ix_jobs_status_created_at', 'status', 'created_at'),
+    )
+
+    def __repr__(self):
+        return f"<Job {self.id} {self.kind} {self.status}>"
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'kind': self.kind,
+            'params': self.params,
+            'status': self.status,
+            'progress': self.progress,
+            'total': self.total,
+            'result': self.result,
+            'error': self.error,
+            'attempts': self.attempts,
+            'created_at': self.created_at,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at
+        }
+
+class AuditEntry(db.Model):
+    __tablename__ = 'audit_log'
+    id = db.Column(db.Integer, primary_key=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+    # e.g. charity.approve, charity.delete, admin.register
+    action = db.Column(db.String(50), nullable=False, index=True)
+    # JWT identity of the caller, when the request carried one
+    actor = db.Column(db.String(120), nullable=True)
+    remote_addr = db.Column(db.String(45), nullable=True)
+    target_type = db.Column(db.String(50), nullable=True)
+    target_id = db.Column(db.String(50), nullable=True)
+    details = db.Column(db.JSON, nullable=True)
+
+    def __repr__(self):
+        return f"<AuditEntry {self.action} {self.target_type} {self.target_id}>"
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'created_at': self.created_at,
+            'action': self.action,
+            'actor': self.actor,
+            'remote_addr': self.remote_addr,
+            'target_type': self.target_type,
+            'target_id': self.target_id,
+            'details': self.details
+        }
+
+def donation_totals(charity_ids=None):
+    """Map charity id -> total donated (live plus archived), computed in one grouped query."""
+    totals = donation_totals_subquery(charity_ids)
+    return {charity_id: total for charity_id, total in db.session.execute(db.select(totals))}
+
+def donation_totals_subquery(charity_ids=None):
+    """Per-charity donation sums, for joining onto charity queries.
+
+    Live donations are summed directly; archived months come from the
+    precomputed ``archived_totals`` rows.
+    """
+    live = db.select(Donation.charity_id, db.func.sum(Donation.amount).label('total')).group_by(Donation.charity_id)
+    archived = (
+        db.select(ArchivedTotal.charity_id, db.func.sum(ArchivedTotal.total).label('total'))
+        .group_by(ArchivedTotal.charity_id)
+    )
+    if charity_ids is not None:
+        live = live.where(Donation.charity_id.in_(charity_ids))
+        archived = archived.where(ArchivedTotal.charity_id.in_(charity_ids))
+    both = db.union_all(live, archived).subquery()
+    return (
+        db.select(both.c.charity_id, db.func.sum(both.c.total).label('total'))
+        .group_by(both.c.charity_id)
+        .subquery()
+    )
+
+def charity_dicts(fields=Charity.FIELDS, ids=None):
+    """``(id, Charity.to_dict(fields))`` pairs read as plain rows in one query.
+
+    List endpoints only serialise what they load, so this skips building
+    Charity instances, identity-map entries and attribute state per row.
+    """
+    query = db.select(Charity.id).where(Charity.deleted_at.is_(None))
+    for field in fields:
+        if field == 'total_donations':
+            totals = donation_totals_subquery(ids)
+            query = (
+                query.outerjoin(totals, totals.c.charity_id == Charity.id)
+                .add_columns(db.func.coalesce(totals.c.total, 0))
+            )
+        else:
+            query = query.add_columns(getattr(Charity, field))
+    if ids is not None:
+        query = query.where(Charity.id.in_(ids))
+    return [(row[0], dict(zip(fields, row[1:]))) for row in db.session.execute(query)]
+
+def beneficiary_dicts(fields=Beneficiary.FIELDS, ids=None):
+    """``(id, Beneficiary.to_dict(fields))`` pairs read as plain rows in one query."""
+    columns = [field for field in fields if field != 'charity']
+    query = db.select(Beneficiary.id, *(getattr(Beneficiary, field) for field in columns))
+    if 'charity' in fields:
+        query = (
+            # A charity being deleted is hidden, as on its own endpoints
+            query.outerjoin(Charity, db.and_(Charity.id == Beneficiary.charity_id, Charity.deleted_at.is_(None)))
+            .add_columns(Charity.id, Charity.name)
+        )
+    if ids is not None:
+        query = query.where(Beneficiary.id.in_(ids))
+    rows = db.session.execute(query)
+    if 'charity' not in fields:
+        return [(row[0], dict(zip(columns, row[1:]))) for row in rows]
+    end = len(columns) + 1
+    items = []
+    for row in rows:
+        data = dict(zip(columns, row[1:end]))
+        data['charity'] = {'id': row[end], 'name': row[end + 1]} if row[end] is not None else None
+        items.append((row[0], data))
+    return items
+
+def unapproved_charity_dicts():
+    """``UnapprovedCharity.to_dict()`` for every submission, read as plain rows."""
+    fields = UnapprovedCharity.FIELDS
+    query = db.select(*(getattr(UnapprovedCharity, field) for field in fields))
+    return [dict(zip(fields, row)) for row in db.session.execute(query)]
+
 class TokenBlacklist(db.Model):
     __tablename__ = 'token_blacklist'
     id = db.Column(db.Integer, primary_key=True)
+    # The revoked token's jti
     token = db.Column(db.String(500), unique=True, nullable=False)
+    # When the token would have expired anyway; the row can be purged after that
+    expires_at = db.Column(db.DateTime, nullable=True, index=True)
     
     def __repr__(self):
         return f"<TokenBlacklist {self.token}>"
@@ -0,0 +1,189 @@
+"""Scheduler that turns recurring pledges into donations.
+
+Due pledges are found with the partial index on ``recurring_pledges.next_run``
+and processed ``PLEDGE_BATCH_SIZE`` at a time, one transaction per batch: every
+missed run of each pledge is inserted into ``donations`` and ``next_run`` is
+moved past ``now``. Each pledge gets its own savepoint, so runs that already
+exist are skipped and a pledge that cannot be charged at all (say, its donor
+was deleted) is deactivated with ``failure`` set instead of blocking the
+batch. A pledge that missed runs while the scheduler was down is
+caught up on the next pass, at most ``PLEDGE_MAX_CATCHUP`` runs per pledge per
+batch.
+
+Several workers can run the scheduler at once. On PostgreSQL the due rows are
+locked with ``FOR UPDATE SKIP LOCKED`` so workers take disjoint batches. On
+every backend ``next_run`` is advanced with a compare-and-set, and
+``(donations.pledge_id, donations.scheduled_for)`` is unique, so a run is
+never charged twice.
+
+Run it in-process with ``PLEDGE_SCHEDULER_ENABLED`` or from cron with
+``flask run-pledges``.
+"""
+import calendar
+import logging
+import threading
+import time
+from datetime import datetime, timedelta
+
+import click
+from sqlalchemy.exc import IntegrityError
+
+from models import db, Donation, RecurringPledge
+
+logger = logging.getLogger(__name__)
+
+STEPS = {'daily': timedelta(days=1), 'weekly': timedelta(weeks=1)}
+
+
+def next_occurrence(interval, current, start):
+    """The run after ``current`` for a pledge that first ran at ``start``."""
+    if interval != 'monthly':
+        return current + STEPS[interval]
+    # Count months from the start date so a pledge made on the 31st
+    # runs on the last day of short months without drifting
+    months = (current.year - start.year) * 12 + current.month - start.month + 1
+    year, month = divmod(start.month - 1 + months, 12)
+    year, month = start.year + year, month + 1
+    day = min(start.day, calendar.monthrange(year, month)[1])
+    return start.replace(year=year, month=month, day=day)
+
+
+class PledgeScheduler:
+    def __init__(self, app=None):
+        self.app = None
+        self._thread = None
+        # Called with the charity ids of each committed batch
+        self.listeners = []
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('PLEDGE_SCHEDULER_ENABLED', False)
+        app.config.setdefault('PLEDGE_POLL_INTERVAL', 60.0)
+        app.config.setdefault('PLEDGE_BATCH_SIZE', 100)
+        app.config.setdefault('PLEDGE_MAX_CATCHUP', 60)
+        app.extensions['pledges'] = self
+        self.app = app
+
+        @app.cli.command('run-pledges')
+        def run_pledges():
+            """Create donations for every due recurring pledge."""
+            click.echo(f'Created {self.run_due()} donations')
+
+        if app.config['PLEDGE_SCHEDULER_ENABLED']:
+            self.start()
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='pledge-scheduler', daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            try:
+                self.run_due()
+            except Exception:
+                logger.exception('Running due pledges failed; will retry')
+            time.sleep(self.app.config['PLEDGE_POLL_INTERVAL'])
+
+    def run_due(self, now=None):
+        """Materialise every run due at ``now``; returns the number of donations created."""
+        now = now or datetime.utcnow()
+        created = 0
+        while True:
+            selected, claimed, count = self._run_batch(now)
+            created += count
+            # A batch where every pledge was taken by another worker means we are racing it
+            if selected < self.app.config['PLEDGE_BATCH_SIZE'] or not claimed:
+                return created
+
+    def _run_batch(self, now):
+        """Process one batch in one transaction; returns (selected, claimed, donations)."""
+        config = self.app.config
+        with self.app.app_context():
+            try:
+                pledges = db.session.execute(
+                    db.select(
+                        RecurringPledge.id, RecurringPledge.amount, RecurringPledge.interval,
+                        RecurringPledge.anonymous, RecurringPledge.user_id, RecurringPledge.charity_id,
+                        RecurringPledge.start_date, RecurringPledge.next_run,
+                    )
+                    .where(RecurringPledge.active, RecurringPledge.next_run <= now)
+                    .order_by(RecurringPledge.next_run)
+                    .limit(config['PLEDGE_BATCH_SIZE'])
+                    .with_for_update(skip_locked=True)
+                ).all()
+                rows = []
+                claimed = 0
+                for pledge in pledges:
+                    runs = []
+                    run = pledge.next_run
+                    while run <= now and len(runs) < config['PLEDGE_MAX_CATCHUP']:
+                        runs.append(run)
+                        run = next_occurrence(pledge.interval, run, pledge.start_date)
+                    created = self._charge(pledge, runs, run, now)
+                    if created is None:
+                        continue  # another worker already advanced it
+                    claimed += 1
+                    rows.extend(created)
+                db.session.commit()
+            finally:
+                db.session.remove()
+        if rows:
+            self._notify(rows)
+        return len(pledges), claimed, len(rows)
+
+    def _charge(self, pledge, runs, next_run, now):
+        """Insert one pledge's ``runs`` and move it to ``next_run``, under a savepoint.
+
+        Returns the inserted rows, or None if another worker claimed the
+        pledge first. Runs that already exist are skipped; a pledge whose
+        donations cannot be inserted at all is deactivated with its
+        ``failure`` set, so it does not hold up the rest of the batch.
+        """
+        def insert(scheduled_runs):
+            claim = db.session.execute(
+                db.update(RecurringPledge)
+                .where(RecurringPledge.id == pledge.id, RecurringPledge.next_run == pledge.next_run)
+                .values(next_run=next_run)
+            )
+            if claim.rowcount != 1:
+                return None
+            rows = [{
+                'amount': pledge.amount,
+                'anonymous': bool(pledge.anonymous),
+                'user_id': pledge.user_id,
+                'charity_id': pledge.charity_id,
+                'donation_date': now,
+                'pledge_id': pledge.id,
+                'scheduled_for': scheduled,
+            } for scheduled in scheduled_runs]
+            if rows:
+                db.session.execute(db.insert(Donation), rows)
+            return rows
+
+        try:
+            with db.session.begin_nested():
+                return insert(runs)
+        except IntegrityError:
+            pass
+        # Some runs were charged already, by another worker or an earlier, interrupted pass
+        existing = set(db.session.scalars(
+            db.select(Donation.scheduled_for)
+            .where(Donation.pledge_id == pledge.id, Donation.scheduled_for.in_(runs))
+        ))
+        try:
+            with db.session.begin_nested():
+                return insert([scheduled for scheduled in runs if scheduled not in existing])
+        except IntegrityError as e:
+            logger.warning('Deactivating pledge %s: its donations cannot be inserted', pledge.id, exc_info=True)
+            db.session.execute(
+                db.update(RecurringPledge)
+                .where(RecurringPledge.id == pledge.id)
+                .values(active=False, failure=str(e.orig)[:200])
+            )
+            return []
+
+    def _notify(self, rows):
+        charity_ids = {row['charity_id'] for row in rows}
+        for listener in self.listeners:
+            listener(*charity_ids)
@@ -0,0 +1,182 @@
+"""Opt-in per-request profiling for production.
+
+A request is profiled when either:
+
+- a random draw falls under ``PROFILE_SAMPLE_RATE``, a fraction such as
+  0.01 (0, the default, turns sampling off); or
+- the request carries ``X-Profile: <PROFILE_TOKEN>``. The token is a secret
+  that only admins hold, and without a configured token the header is ignored.
+
+``PROFILE_MODE`` selects the profiler:
+
+- ``sample`` (default): a thread records the request thread's stack every
+  ``PROFILE_SAMPLE_INTERVAL`` seconds and writes ``<name>.collapsed``, one
+  ``frame;frame;frame count`` line per distinct stack. The file can be fed
+  straight to flamegraph.pl or speedscope.
+- ``cprofile``: deterministic cProfile, written as ``<name>.pstats`` for
+  ``python -m pstats`` or snakeviz. It is more precise but slows the request
+  down noticeably.
+
+Each profile gets a ``<name>.json`` file with the endpoint, method, path,
+status and duration. Files go to ``PROFILE_DIR``. Once the directory grows
+past ``PROFILE_MAX_BYTES``, the oldest profiles are deleted.
+"""
+import cProfile
+import hmac
+import json
+import os
+import random
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from datetime import datetime
+
+from flask import g, request
+
+HEADER = 'X-Profile'
+
+
+class StackSampler:
+    """Samples one thread's Python stack on a background thread."""
+
+    def __init__(self, thread_id, interval):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='profile-sampler', daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})')
+                frame = frame.f_back
+            if stack:
+                self.stacks[';'.join(reversed(stack))] += 1
+
+    def collapsed(self):
+        return ''.join(f'{stack} {count}\n' for stack, count in self.stacks.most_common())
+
+
+class RequestProfiler:
+    def __init__(self, app=None):
+        self.app = None
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('PROFILE_SAMPLE_RATE', 0.0)
+        app.config.setdefault('PROFILE_TOKEN', None)
+        app.config.setdefault('PROFILE_MODE', 'sample')
+        app.config.setdefault('PROFILE_SAMPLE_INTERVAL', 0.005)
+        app.config.setdefault('PROFILE_DIR', os.path.join(app.instance_path, 'profiles'))
+        app.config.setdefault('PROFILE_MAX_BYTES', 100 * 1024 * 1024)
+        app.extensions['profiler'] = self
+        self.app = app
+        app.before_request(self.before_request)
+        app.after_request(self.after_request)
+        app.teardown_request(self.teardown_request)
+
+    def wanted(self):
+        config = self.app.config
+        token = config['PROFILE_TOKEN']
+        supplied = request.headers.get(HEADER)
+        if token and supplied and hmac.compare_digest(supplied, token):
+            return True
+        rate = config['PROFILE_SAMPLE_RATE']
+        return rate > 0 and random.random() < rate
+
+    def before_request(self):
+        if not self.wanted():
+            return
+        if self.app.config['PROFILE_MODE'] == 'cprofile':
+            profiler = cProfile.Profile()
+            profiler.enable()
+        else:
+            profiler = StackSampler(threading.get_ident(), self.app.config['PROFILE_SAMPLE_INTERVAL'])
+            profiler.start()
+        g.profile = (profiler, time.perf_counter())
+
+    def after_request(self, response):
+        self._finish(response.status_code)
+        return response
+
+    def teardown_request(self, exc):
+        # Still running only if the view raised before after_request
+        if g.get('profile') is not None:
+            self._finish(500)
+
+    def _finish(self, status_code):
+        profile = g.pop('profile', None)
+        if profile is None:
+            return
+        profiler, started = profile
+        if isinstance(profiler, cProfile.Profile):
+            profiler.disable()
+        else:
+            profiler.stop()
+        duration_ms = (time.perf_counter() - started) * 1000
+        try:
+            self.write(profiler, {
+                'endpoint': request.endpoint,
+                'method': request.method,
+                'path': request.path,
+                'status': status_code,
+                'duration_ms': round(duration_ms, 3),
+                'started_at': datetime.utcnow().isoformat(),
+                'mode': self.app.config['PROFILE_MODE'],
+            })
+        except OSError:
+            self.app.logger.exception('Writing request profile failed')
+
+    def write(self, profiler, metadata):
+        directory = self.app.config['PROFILE_DIR']
+        os.makedirs(directory, exist_ok=True)
+        name = '{}-{}-{:.0f}ms-{}'.format(
+            datetime.utcnow().strftime('%Y%m%dT%H%M%S'),
+            (metadata['endpoint'] or 'unknown').replace('.', '_'),
+            metadata['duration_ms'],
+            uuid.uuid4().hex[:8],
+        )
+        base = os.path.join(directory, name)
+        if isinstance(profiler, cProfile.Profile):
+            profiler.dump_stats(base + '.pstats')
+        else:
+            with open(base + '.collapsed', 'w', encoding='utf-8') as f:
+                f.write(profiler.collapsed())
+        with open(base + '.json', 'w', encoding='utf-8') as f:
+            json.dump(metadata, f)
+        self.enforce_cap()
+        return base
+
+    def enforce_cap(self):
+        """Delete the oldest profile files until the directory fits in PROFILE_MAX_BYTES."""
+        directory = self.app.config['PROFILE_DIR']
+        with self._lock:
+            files = []
+            for entry in os.scandir(directory):
+                if entry.is_file():
+                    stat = entry.stat()
+                    files.append((stat.st_mtime, entry.name, stat.st_size, entry.path))
+            used = sum(size for _, _, size, _ in files)
+            for _, _, size, path in sorted(files):
+                if used <= self.app.config['PROFILE_MAX_BYTES']:
+                    break
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass  # another worker removed it first
+                used -= size
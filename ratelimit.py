@@ -0,0 +1,157 @@
+"""Token-bucket rate limiting for the bcrypt-bound auth endpoints.
+
+Each protected request takes one token from a bucket keyed by client IP and,
+when the JSON body has an ``email``, one keyed by that account. The check
+runs before the view, so a rejected request never reaches a database lookup
+or bcrypt. Rejections get a ``429`` with ``Retry-After``.
+
+``MemoryBackend`` keeps buckets per process. ``SQLiteBackend`` keeps them in
+a SQLite file that every worker on the host shares, so limits hold across
+workers. Both forget buckets that have refilled completely, so clients that
+rotate IPs or emails cannot grow them without bound. Decisions are counted in
+``ratelimit_decisions_total``.
+"""
+import sqlite3
+import threading
+import time
+from functools import wraps
+
+from flask import current_app, jsonify, request
+
+from metrics import REGISTRY
+
+DECISIONS = REGISTRY.counter(
+    'ratelimit_decisions_total', 'Rate limiter decisions', ('endpoint', 'key_type', 'decision'))
+
+
+def _refill(tokens, updated, capacity, rate, now):
+    return min(capacity, tokens + (now - updated) * rate)
+
+
+class MemoryBackend:
+    """Per-process buckets. ``max_keys`` bounds memory under key churn."""
+
+    def __init__(self, max_keys=100000):
+        self.max_keys = max_keys
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def take(self, key, capacity, rate, now=None):
+        """Take a token; returns (allowed, seconds until one is available)."""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            tokens, updated = self._buckets.get(key, (capacity, now))
+            tokens = _refill(tokens, updated, capacity, rate, now)
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+            if key not in self._buckets and len(self._buckets) >= self.max_keys:
+                self._prune(capacity, rate, now)
+            self._buckets[key] = (tokens, now)
+        return allowed, 0 if allowed else (1 - tokens) / rate
+
+    def _prune(self, capacity, rate, now):
+        # Full buckets carry no state worth keeping
+        self._buckets = {
+            key: state for key, state in self._buckets.items()
+            if _refill(state[0], state[1], capacity, rate, now) < capacity
+        }
+
+
+class SQLiteBackend:
+    """Buckets in a SQLite file shared by all workers on the host.
+
+    Each row records when its bucket will be full again (``full_at``); rows
+    past that time carry no state and are deleted at most once every
+    ``prune_interval`` seconds per process.
+    """
+
+    def __init__(self, path, prune_interval=60):
+        self.path = path
+        self.prune_interval = prune_interval
+        self._last_prune = 0.0
+        self._local = threading.local()
+        conn = self._connect()
+        conn.execute('CREATE TABLE IF NOT EXISTS buckets '
+                     '(key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL)')
+        # Files created before buckets were pruned lack the column
+        if 'full_at' not in {row[1] for row in conn.execute('PRAGMA table_info(buckets)')}:
+            conn.execute('ALTER TABLE buckets ADD COLUMN full_at REAL NOT NULL DEFAULT 0')
+        conn.execute('CREATE INDEX IF NOT EXISTS ix_buckets_full_at ON buckets (full_at)')
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            self._local.conn = conn
+        return conn
+
+    def take(self, key, capacity, rate, now=None):
+        # Wall clock, since monotonic clocks are not comparable across processes
+        now = time.time() if now is None else now
+        conn = self._connect()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            row = conn.execute('SELECT tokens, updated FROM buckets WHERE key = ?', (key,)).fetchone()
+            tokens = _refill(row[0], row[1], capacity, rate, now) if row else capacity
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+            conn.execute('INSERT OR REPLACE INTO buckets (key, tokens, updated, full_at) VALUES (?, ?, ?, ?)',
+                         (key, tokens, now, now + (capacity - tokens) / rate))
+            if now - self._last_prune >= self.prune_interval:
+                self._last_prune = now
+                conn.execute('DELETE FROM buckets WHERE full_at < ?', (now,))
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        return allowed, 0 if allowed else (1 - tokens) / rate
+
+
+class RateLimiter:
+    def __init__(self, app=None, backend=None):
+        self.backend = backend
+        if app is not None:
+            self.init_app(app, backend)
+
+    def init_app(self, app, backend=None):
+        app.config.setdefault('RATELIMIT_ENABLED', True)
+        app.config.setdefault('RATELIMIT_STORAGE_PATH', None)
+        # Burst size and sustained requests per minute
+        app.config.setdefault('RATELIMIT_IP_BURST', 20)
+        app.config.setdefault('RATELIMIT_IP_PER_MINUTE', 20)
+        app.config.setdefault('RATELIMIT_ACCOUNT_BURST', 5)
+        app.config.setdefault('RATELIMIT_ACCOUNT_PER_MINUTE', 5)
+        if backend is None:
+            path = app.config['RATELIMIT_STORAGE_PATH']
+            backend = SQLiteBackend(path) if path else MemoryBackend()
+        self.backend = backend
+        app.extensions['ratelimit'] = self
+
+    def _check(self, endpoint, key_type, key, burst, per_minute):
+        allowed, retry_after = self.backend.take(f'{endpoint}:{key_type}:{key}', burst, per_minute / 60)
+        DECISIONS.inc(endpoint=endpoint, key_type=key_type, decision='allowed' if allowed else 'rejected')
+        return allowed, retry_after
+
+    def limit(self, view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            config = current_app.config
+            if not config['RATELIMIT_ENABLED']:
+                return view(*args, **kwargs)
+            checks = [('ip', request.remote_addr, 'RATELIMIT_IP')]
+            data = request.get_json(silent=True)
+            email = data.get('email') if isinstance(data, dict) else None
+            if isinstance(email, str) and email:
+                checks.append(('account', email.strip().lower(), 'RATELIMIT_ACCOUNT'))
+            for key_type, key, prefix in checks:
+                allowed, retry_after = self._check(
+                    request.endpoint, key_type, key, config[f'{prefix}_BURST'], config[f'{prefix}_PER_MINUTE'])
+                if not allowed:
+                    response = jsonify({'msg': 'Too many attempts, try again later'})
+                    response.headers['Retry-After'] = str(max(1, round(retry_after)))
+                    return response, 429
+            return view(*args, **kwargs)
+        return wrapper
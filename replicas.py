@@ -0,0 +1,133 @@
+"""Read-replica routing for GET requests.
+
+Replica URIs in ``SQLALCHEMY_REPLICA_URIS`` are registered as Flask-SQLAlchemy
+binds named ``replica_0``, ``replica_1``, ... Each GET/HEAD request is assigned
+the next healthy replica (round-robin) and ``RoutingSession`` sends its reads
+there; everything else, and anything flushed, goes to the primary.
+
+A replica whose connection drops, or that cannot be connected to, is ejected
+for ``REPLICA_EJECT_SECONDS`` and put back once a ``SELECT 1`` probe
+succeeds. Other errors, such as a bad query or a lock timeout, say nothing
+about the replica's health and leave it in rotation.
+
+After a successful write a client reads from the primary for
+``REPLICA_STICKY_SECONDS`` so it sees its own writes. The deadline is kept in
+a cookie, which works across workers, and per client address for callers
+that do not keep cookies.
+"""
+import threading
+import time
+
+from flask import g, has_request_context, request
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event, exc, text
+
+STICKY_COOKIE = 'read_primary_until'
+READ_METHODS = ('GET', 'HEAD')
+
+
+class RoutingSession(Session):
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and not self._flushing and has_request_context():
+            replica = g.get('db_replica')
+            if replica is not None:
+                return self._db.engines[replica]
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+def replica_binds(uris):
+    return {f'replica_{i}': uri for i, uri in enumerate(uris)}
+
+
+class ReplicaRouter:
+    def __init__(self, app=None, db=None):
+        self.names = []
+        self.ejected = {}
+        self.recent_writers = {}
+        self._next = 0
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app, db)
+
+    def init_app(self, app, db):
+        """Call after ``db.init_app``; the replica binds must already be configured."""
+        app.config.setdefault('REPLICA_STICKY_SECONDS', 5)
+        app.config.setdefault('REPLICA_EJECT_SECONDS', 30)
+        self.db = db
+        self.sticky_seconds = app.config['REPLICA_STICKY_SECONDS']
+        self.eject_seconds = app.config['REPLICA_EJECT_SECONDS']
+        self.names = sorted(name for name in app.config.get('SQLALCHEMY_BINDS', {})
+                            if name.startswith('replica_'))
+        app.extensions['replicas'] = self
+        if not self.names:
+            return
+        with app.app_context():
+            for name in self.names:
+                event.listen(db.engines[name], 'handle_error', self._on_error(name))
+        app.before_request(self.before_request)
+        app.after_request(self.after_request)
+
+    def _on_error(self, name):
+        def handle_error(context):
+            # No connection means the connect attempt itself failed
+            if context.is_disconnect or context.connection is None:
+                self.eject(name)
+        return handle_error
+
+    def eject(self, name):
+        with self._lock:
+            self.ejected[name] = time.monotonic() + self.eject_seconds
+
+    def _healthy(self, name):
+        until = self.ejected.get(name)
+        if until is None:
+            return True
+        if time.monotonic() < until:
+            return False
+        try:
+            with self.db.engines[name].connect() as conn:
+                conn.execute(text('SELECT 1'))
+        except exc.DBAPIError:
+            self.eject(name)
+            return False
+        with self._lock:
+            self.ejected.pop(name, None)
+        return True
+
+    def choose(self):
+        """Next healthy replica name in round-robin order, or None for the primary."""
+        for _ in range(len(self.names)):
+            with self._lock:
+                name = self.names[self._next % len(self.names)]
+                self._next += 1
+            if self._healthy(name):
+                return name
+        return None
+
+    @staticmethod
+    def client_key():
+        return request.headers.get('X-Client-Id') or request.remote_addr
+
+    def reads_own_writes(self):
+        now = time.time()
+        try:
+            if float(request.cookies.get(STICKY_COOKIE, 0)) > now:
+                return True
+        except ValueError:
+            pass
+        return self.recent_writers.get(self.client_key(), 0) > now
+
+    def before_request(self):
+        if request.method in READ_METHODS and not self.reads_own_writes():
+            g.db_replica = self.choose()
+
+    def after_request(self, response):
+        if request.method not in READ_METHODS + ('OPTIONS',) and response.status_code < 400:
+            until = time.time() + self.sticky_seconds
+            with self._lock:
+                self.recent_writers[self.client_key()] = until
+                if len(self.recent_writers) > 10000:
+                    now = time.time()
+                    self.recent_writers = {key: t for key, t in self.recent_writers.items() if t > now}
+            response.set_cookie(STICKY_COOKIE, str(until), max_age=self.sticky_seconds, httponly=True)
+        return response
@@ -0,0 +1,192 @@
+"""Slow-query log with EXPLAIN capture.
+
+Engine ``before_cursor_execute``/``after_cursor_execute`` hooks time every
+statement. A statement that takes longer than ``SLOW_QUERY_MS`` is logged to
+the ``slowlog`` logger together with the Flask endpoint that issued it and
+the shape of its parameters (types only, never values).
+
+Statements are grouped by fingerprint: literals become ``?`` and IN lists
+collapse to ``(...)``. The ``SLOW_QUERY_TOP_K`` slowest fingerprints are kept
+with their count, total, max and one EXPLAIN plan. EXPLAIN runs with the
+statement's real parameters, and PostgreSQL prints them in its condition and
+filter lines, so string literals and the numbers on those lines are replaced
+by ``?`` before the plan is stored. The plan is captured once
+per fingerprint by a background thread, on its own connection, so the
+request that ran the query does not wait for it. Explain requests that
+arrive while the queue is full are dropped.
+
+``GET /admin/slow-queries`` shows the collected fingerprints. The numbers are
+per process.
+"""
+import logging
+import queue
+import re
+import threading
+import time
+from datetime import datetime
+
+from flask import has_request_context, request
+from sqlalchemy import event
+
+logger = logging.getLogger('slowlog')
+
+_LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_PLACEHOLDER = r'(?:\?|%s|%\(\w+\)s|:\w+)'
+_IN_LISTS = re.compile(rf'\(\s*{_PLACEHOLDER}(?:\s*,\s*{_PLACEHOLDER})+\s*\)')
+_SPACE = re.compile(r'\s+')
+_STRINGS = re.compile(r"'(?:[^']|'')*'")
+_NUMBERS = re.compile(r'\b\d+(?:\.\d+)?\b')
+# "Index Cond: (id = 42)", "Filter: (amount > 10.5)", "Join Filter: ..."; costs stay readable
+_CONDITIONS = re.compile(r'(?:Cond|Filter):.*')
+EXPLAIN_PREFIXES = {'postgresql': 'EXPLAIN ', 'sqlite': 'EXPLAIN QUERY PLAN ', 'mysql': 'EXPLAIN '}
+
+
+def fingerprint(statement):
+    statement = _LITERALS.sub('?', statement)
+    statement = _IN_LISTS.sub('(...)', statement)
+    return _SPACE.sub(' ', statement).strip()
+
+
+def redact_plan(plan):
+    """EXPLAIN output with the bound values replaced by ``?``."""
+    plan = _STRINGS.sub('?', plan)
+    return _CONDITIONS.sub(lambda match: _NUMBERS.sub('?', match.group()), plan)
+
+
+def parameter_shape(parameters, executemany=False):
+    """Parameter types without the values, e.g. ``{'id_1': 'int'}``."""
+    if executemany:
+        return {'rows': len(parameters), 'row': parameter_shape(parameters[0]) if parameters else None}
+    if isinstance(parameters, dict):
+        return {key: type(value).__name__ for key, value in parameters.items()}
+    if isinstance(parameters, (list, tuple)):
+        return [type(value).__name__ for value in parameters]
+    return None
+
+
+class SlowQueryLog:
+    def __init__(self, app=None, db=None):
+        self.entries = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._queue = None
+        self._thread = None
+        if app is not None:
+            self.init_app(app, db)
+
+    def init_app(self, app, db):
+        """Call after ``db.init_app``; hooks are added to every configured engine."""
+        app.config.setdefault('SLOW_QUERY_MS', 200)
+        app.config.setdefault('SLOW_QUERY_TOP_K', 50)
+        app.config.setdefault('SLOW_QUERY_EXPLAIN', True)
+        app.config.setdefault('SLOW_QUERY_EXPLAIN_QUEUE', 100)
+        app.extensions['slowlog'] = self
+        self.app = app
+        self._queue = queue.Queue(app.config['SLOW_QUERY_EXPLAIN_QUEUE'])
+        if app.config['SLOW_QUERY_MS'] is None:
+            return
+        with app.app_context():
+            for engine in db.engines.values():
+                event.listen(engine, 'before_cursor_execute', self.before_cursor_execute)
+                event.listen(engine, 'after_cursor_execute', self.after_cursor_execute)
+
+    def before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('query_start', []).append(time.perf_counter())
+
+    def after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        started = conn.info['query_start'].pop()
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        if elapsed_ms < self.app.config['SLOW_QUERY_MS'] or getattr(self._local, 'explaining', False):
+            return
+        endpoint = request.endpoint if has_request_context() else None
+        shape = parameter_shape(parameters, executemany)
+        key = fingerprint(statement)
+        logger.warning('Slow query (%.1f ms) from %s: %s', elapsed_ms, endpoint, key, extra={
+            'duration_ms': round(elapsed_ms, 3), 'endpoint': endpoint, 'fingerprint': key, 'parameters': shape,
+        })
+        if self.record(key, elapsed_ms, endpoint, shape) and not executemany:
+            self.submit_explain(conn.engine, key, statement, parameters)
+
+    def record(self, key, elapsed_ms, endpoint, shape):
+        """Add one slow execution; returns True when the fingerprint still needs a plan."""
+        with self._lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                if len(self.entries) >= self.app.config['SLOW_QUERY_TOP_K']:
+                    fastest = min(self.entries, key=lambda k: self.entries[k]['max_ms'])
+                    if self.entries[fastest]['max_ms'] >= elapsed_ms:
+                        return False
+                    del self.entries[fastest]
+                entry = self.entries[key] = {
+                    'fingerprint': key, 'count': 0, 'total_ms': 0.0, 'max_ms': 0.0,
+                    'endpoints': [], 'parameters': shape, 'plan': None, 'explain_queued': False,
+                }
+            entry['count'] += 1
+            entry['total_ms'] += elapsed_ms
+            entry['max_ms'] = max(entry['max_ms'], elapsed_ms)
+            entry['last_seen'] = datetime.utcnow()
+            if endpoint and endpoint not in entry['endpoints']:
+                entry['endpoints'].append(endpoint)
+            if entry['explain_queued'] or not self.app.config['SLOW_QUERY_EXPLAIN']:
+                return False
+            entry['explain_queued'] = True
+            return True
+
+    def submit_explain(self, engine, key, statement, parameters):
+        if engine.dialect.name not in EXPLAIN_PREFIXES or not statement.lstrip().upper().startswith(('SELECT', 'WITH')):
+            return
+        try:
+            self._queue.put_nowait((engine, key, statement, parameters))
+        except queue.Full:
+            with self._lock:
+                if key in self.entries:
+                    self.entries[key]['explain_queued'] = False
+            return
+        self._ensure_thread()
+
+    def _ensure_thread(self):
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name='slowlog-explain', daemon=True)
+                    self._thread.start()
+
+    def _run(self):
+        while True:
+            self.explain(*self._queue.get())
+
+    def explain_pending(self):
+        """Capture plans for everything queued, in this thread."""
+        while True:
+            try:
+                job = self._queue.get_nowait()
+            except queue.Empty:
+                return
+            self.explain(*job)
+
+    def explain(self, engine, key, statement, parameters):
+        self._local.explaining = True
+        try:
+            with engine.connect() as conn:
+                rows = conn.exec_driver_sql(EXPLAIN_PREFIXES[engine.dialect.name] + statement, parameters)
+                plan = '\n'.join(' '.join(str(column) for column in row) for row in rows)
+        except Exception as e:
+            # Not str(e): SQLAlchemy errors append the statement's parameters
+            plan = f'EXPLAIN failed: {getattr(e, "orig", e)}'
+        finally:
+            self._local.explaining = False
+        with self._lock:
+            if key in self.entries:
+                self.entries[key]['plan'] = redact_plan(plan)
+
+    def top(self):
+        """Collected fingerprints, slowest first."""
+        with self._lock:
+            entries = sorted(self.entries.values(), key=lambda entry: entry['max_ms'], reverse=True)
+            result = []
+            for entry in entries:
+                item = dict(entry, total_ms=round(entry['total_ms'], 3), max_ms=round(entry['max_ms'], 3),
+                            endpoints=list(entry['endpoints']))
+                del item['explain_queued']
+                result.append(item)
+            return result
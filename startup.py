@@ -0,0 +1,142 @@
+"""Boot-time instrumentation and lazily loaded extensions.
+
+Flask-Migrate (and Alembic behind it) is only needed by the ``flask db``
+commands and flasgger only by the API docs, so neither is imported while a
+worker boots. ``LazyMigrateGroup`` stands in for the ``db`` command group and
+``LazySwagger`` builds the docs app on the first request for a docs URL.
+
+Set ``PROFILE_STARTUP=1`` to log extension init times when the app is
+imported, or run ``python startup.py`` for a per-module import report.
+"""
+import os
+import re
+import subprocess
+import sys
+import time
+from contextlib import contextmanager
+
+import click
+
+# Extension name -> init time in milliseconds, filled in by ``timed``.
+STARTUP_TIMINGS = {}
+
+SWAGGER_PREFIXES = ('/apidocs', '/apispec', '/flasgger_static')
+
+
+@contextmanager
+def timed(name):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        STARTUP_TIMINGS[name] = round((time.perf_counter() - start) * 1000, 2)
+
+
+def log_startup_timings(app):
+    for name, ms in sorted(STARTUP_TIMINGS.items(), key=lambda item: -item[1]):
+        app.logger.warning('startup: %-20s %8.2f ms', name, ms)
+
+
+class LazyMigrateGroup(click.Group):
+    """Placeholder for ``flask db`` that sets up Flask-Migrate on first use."""
+
+    def __init__(self, app, db, **kwargs):
+        super().__init__(name='db', help='Perform database migrations.', **kwargs)
+        self.app = app
+        self.db = db
+        self._group = None
+
+    def _load(self):
+        if self._group is None:
+            with timed('flask_migrate'):
+                from flask_migrate import Migrate
+                Migrate(self.app, self.db)
+            # Migrate.init_app replaces this placeholder with the real group.
+            self._group = self.app.cli.commands['db']
+        return self._group
+
+    def make_context(self, info_name, args, parent=None, **extra):
+        # Hand parsing and invocation over to the real Flask-Migrate group.
+        return self._load().make_context(info_name, args, parent=parent, **extra)
+
+
+class LazySwagger:
+    """WSGI middleware that serves the Swagger UI from a lazily built app.
+
+    The docs app mirrors the main app's routes so flasgger can read their
+    docstrings, but it is only created (and flasgger only imported) when a
+    docs URL is requested for the first time.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self.wsgi_app = app.wsgi_app
+        self._docs_app = None
+
+    def _build(self):
+        from flask import Flask
+        with timed('flasgger'):
+            from flasgger import Swagger
+            docs = Flask(self.app.import_name)
+            docs.config.update(self.app.config)
+            for rule in self.app.url_map.iter_rules():
+                if rule.endpoint == 'static':
+                    continue
+                docs.add_url_rule(
+                    rule.rule,
+                    endpoint=rule.endpoint,
+                    view_func=self.app.view_functions[rule.endpoint],
+                    methods=rule.methods,
+                )
+            Swagger(docs)
+        return docs
+
+    def __call__(self, environ, start_response):
+        if environ.get('PATH_INFO', '').startswith(SWAGGER_PREFIXES):
+            if self._docs_app is None:
+                self._docs_app = self._build()
+            return self._docs_app.wsgi_app(environ, start_response)
+        return self.wsgi_app(environ, start_response)
+
+
+_IMPORTTIME_LINE = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \|(\s+)(\S+)$')
+
+
+def profile_imports(module='app', top=20):
+    """Import ``module`` in a fresh interpreter and return its costliest imports.
+
+    Returns ``(self_us, cumulative_us, depth, name)`` tuples for the ``top``
+    modules by cumulative time, as reported by ``python -X importtime``.
+    """
+    proc = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        capture_output=True, text=True, env=dict(os.environ, PROFILE_STARTUP=''),
+    )
+    rows = []
+    for line in proc.stderr.splitlines():
+        match = _IMPORTTIME_LINE.match(line)
+        if match:
+            self_us, cumulative_us, indent, name = match.groups()
+            rows.append((int(self_us), int(cumulative_us), (len(indent) - 1) // 2, name))
+    if proc.returncode != 0:
+        raise RuntimeError(proc.stderr.strip().splitlines()[-1])
+    rows.sort(key=lambda row: -row[1])
+    return rows[:top]
+
+
+def measure_boot(module='app', runs=5):
+    """Median wall time in milliseconds to import ``module`` in a fresh process."""
+    code = f'import time; t = time.perf_counter(); import {module}; print(time.perf_counter() - t)'
+    samples = []
+    for _ in range(runs):
+        out = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True)
+        samples.append(float(out.stdout.strip().splitlines()[-1]) * 1000)
+    samples.sort()
+    return samples[len(samples) // 2]
+
+
+if __name__ == '__main__':
+    print(f'boot (median of 5): {measure_boot():.1f} ms\n')
+    print(f'{"self ms":>9} {"cumul ms":>9}  module')
+    for self_us, cumulative_us, depth, name in profile_imports():
+        print(f'{self_us / 1000:9.1f} {cumulative_us / 1000:9.1f}  {"  " * depth}{name}')
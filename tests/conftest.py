@@ -0,0 +1,54 @@
+import os
+
+import pytest
+
+os.environ.setdefault('DATABASE_URI', 'sqlite://')
+os.environ.setdefault('JWT_SECRET_KEY', 'test-secret')
+# Tests publish live totals explicitly with LiveTotals.flush()
+os.environ.setdefault('SSE_COALESCE_INTERVAL', '3600')
+# ...and write audit events with AuditLog.flush()
+os.environ.setdefault('AUDIT_FLUSH_INTERVAL', '3600')
+
+from app import app as flask_app  # noqa: E402
+from models import db  # noqa: E402
+
+
+@pytest.fixture
+def app():
+    flask_app.config['TESTING'] = True
+    with flask_app.app_context():
+        db.create_all()
+        yield flask_app
+        db.session.remove()
+        db.drop_all()
+    flask_app.extensions['audit'].pending.clear()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def admin_client(app):
+    """Test client that sends an admin access token."""
+    from flask_jwt_extended import create_access_token
+
+    token = create_access_token(identity='admin:1', additional_claims={'role': 'admin', 'uid': 1, 'username': 'root'})
+    client = app.test_client()
+    client.environ_base['HTTP_AUTHORIZATION'] = f'Bearer {token}'
+    return client
+
+
+@pytest.fixture
+def user_client(app):
+    """Test client that sends the access token of a donor, user 1."""
+    from flask_jwt_extended import create_access_token
+    from models import User
+
+    db.session.add(User(id=1, username='donor', email='donor@example.com', password='-'))
+    db.session.commit()
+    token = create_access_token(identity='user:1', additional_claims={'role': 'user', 'uid': 1, 'username': 'donor'})
+    client = app.test_client()
+    client.environ_base['HTTP_AUTHORIZATION'] = f'Bearer {token}'
+    return client
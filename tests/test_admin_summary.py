@@ -0,0 +1,40 @@
+from datetime import datetime, timedelta
+
+from sqlalchemy import event
+
+from models import db, Charity, Donation, UnapprovedCharity, User
+
+
+def test_summary_is_one_query_and_cached(app, admin_client):
+    now = datetime.utcnow()
+    db.session.add(Charity(id=1, name='Charity', description='-'))
+    db.session.add(User(username='jane', email='jane@example.com', password='x'))
+    db.session.add_all([
+        Donation(amount=10.0, charity_id=1, donation_date=now - timedelta(hours=1)),
+        Donation(amount=20.0, charity_id=1, donation_date=now - timedelta(days=3)),
+        Donation(amount=40.0, charity_id=1, donation_date=now - timedelta(days=30)),
+    ])
+    db.session.add_all([
+        UnapprovedCharity(name='New', description='-', date_submitted=datetime(2024, 7, 2)),
+        UnapprovedCharity(name='Old', description='-', date_submitted=datetime(2024, 7, 1)),
+    ])
+    db.session.commit()
+    import app as app_module
+    app_module.admin_summary_cache.clear()
+
+    statements = []
+    listener = lambda conn, cursor, statement, *args: statements.append(statement)  # noqa: E731
+    event.listen(db.engine, 'before_cursor_execute', listener)
+    first = admin_client.get('/admin/summary').get_json()
+    second = admin_client.get('/admin/summary').get_json()
+    event.remove(db.engine, 'before_cursor_execute', listener)
+
+    # Besides the blocklist check every authenticated request makes
+    assert len([s for s in statements if 'token_blacklist' not in s]) == 1
+    assert first == second
+    assert {key: first[key] for key in ('users', 'admins', 'charities', 'beneficiaries', 'donations')} == {
+        'users': 1, 'admins': 0, 'charities': 1, 'beneficiaries': 0, 'donations': 3,
+    }
+    assert (first['total_volume'], first['volume_7d'], first['volume_24h']) == (70.0, 30.0, 10.0)
+    assert first['pending_applications'] == 2
+    assert first['oldest_pending_submitted'] == '2024-07-01T00:00:00'
@@ -0,0 +1,69 @@
+from datetime import date, datetime
+
+import pytest
+
+import app as app_module
+from archive import archive_cutoff, archive_donations
+from models import db, ArchivedTotal, Charity, Donation, DonationArchive, User, donation_totals
+
+
+@pytest.fixture
+def donations(app):
+    db.session.add_all([Charity(name='A', description='-'), Charity(name='B', description='-'),
+                        User(username='u', email='u@example.com', password='-')])
+    db.session.add_all([
+        Donation(amount=10.0, charity_id=1, user_id=1, donation_date=datetime(2024, 3, 5)),
+        Donation(amount=20.0, charity_id=1, user_id=1, donation_date=datetime(2024, 3, 20)),
+        Donation(amount=5.0, charity_id=2, donation_date=datetime(2024, 4, 2)),
+        Donation(amount=1.0, charity_id=None, donation_date=datetime(2024, 4, 3)),
+        Donation(amount=7.0, charity_id=1, user_id=1, donation_date=datetime(2024, 6, 1)),
+    ])
+    db.session.commit()
+
+
+def test_cutoff_keeps_whole_hot_months():
+    assert archive_cutoff(datetime(2024, 6, 15), 3) == datetime(2024, 4, 1)
+    assert archive_cutoff(datetime(2024, 1, 31), 2) == datetime(2023, 12, 1)
+    with pytest.raises(ValueError):
+        archive_cutoff(datetime(2024, 6, 15), 1)
+
+
+def test_archiving_moves_rows_and_keeps_totals(donations):
+    before = donation_totals()
+
+    assert archive_donations(datetime(2024, 5, 1), batch_size=2) == 4
+    assert archive_donations(datetime(2024, 5, 1)) == 0
+
+    assert [d.amount for d in Donation.query.all()] == [7.0]
+    assert DonationArchive.query.count() == 4
+    assert donation_totals() == before == {1: 37.0, 2: 5.0, None: 1.0}
+    monthly = {(t.charity_id, t.period): (t.total, t.donation_count) for t in ArchivedTotal.query}
+    assert monthly == {
+        (1, date(2024, 3, 1)): (30.0, 2),
+        (2, date(2024, 4, 1)): (5.0, 1),
+        (None, date(2024, 4, 1)): (1.0, 1),
+    }
+
+
+def test_reads_combine_live_and_archived_rows(donations, admin_client):
+    client = admin_client
+    archive_donations(datetime(2024, 5, 1))
+
+    charities = {c['id']: c['total_donations'] for c in client.get('/charities').get_json()}
+    assert charities == {1: 37.0, 2: 5.0}
+    assert client.get('/charities/1').get_json()['total_donations'] == 37.0
+    assert client.get('/charities/1/overview').get_json()['totals'] == {'total_donations': 37.0, 'donation_count': 3}
+
+    first = client.get('/users/1/donations?limit=2').get_json()
+    assert (first['lifetime_total'], first['donation_count']) == (37.0, 3)
+    second = client.get(f"/users/1/donations?limit=2&cursor={first['next_cursor']}").get_json()
+    assert [d['amount'] for d in first['donations'] + second['donations']] == [7.0, 20.0, 10.0]
+    assert 'next_cursor' not in second
+
+    assert client.get('/donations/1').get_json()['amount'] == 10.0
+    export = client.get('/donations/export?format=ndjson').get_data(as_text=True).splitlines()
+    assert len(export) == 5
+
+    app_module.admin_summary_cache.clear()
+    summary = client.get('/admin/summary').get_json()
+    assert (summary['donations'], summary['total_volume']) == (5, 43.0)
@@ -0,0 +1,101 @@
+import json
+import logging
+import queue
+
+import pytest
+
+from audit import AUDIT_EVENTS, DROPPED_LOG_RECORDS, DroppingQueueHandler, JSONFormatter
+from models import db, AuditEntry, UnapprovedCharity
+
+
+@pytest.fixture
+def audit(app):
+    return app.extensions['audit']
+
+
+def test_admin_actions_are_batched_into_the_audit_table(client, admin_client, audit, monkeypatch):
+    monkeypatch.setattr(audit, '_ensure_thread', lambda: None)
+    db.session.add_all([UnapprovedCharity(name='Yes', description='-'), UnapprovedCharity(name='No', description='-')])
+    db.session.commit()
+
+    client.post('/admin/register', json={'username': 'root', 'email': 'root@example.com', 'password': 'pw'})
+    admin_client.patch('/unapproved-charities/1', json={'status': 'Approved'})
+    admin_client.patch('/unapproved-charities/2', json={'status': 'Rejected'})
+    assert AuditEntry.query.count() == 0  # nothing written on the request path
+
+    written = AUDIT_EVENTS.value(outcome='written')
+    assert audit.flush() == 3
+    assert AUDIT_EVENTS.value(outcome='written') == written + 3
+
+    entries = [(e.action, e.target_type, e.target_id, e.details) for e in AuditEntry.query.order_by(AuditEntry.id)]
+    assert entries == [
+        ('admin.register', 'admin', '1', {'username': 'root', 'email': 'root@example.com'}),
+        ('charity.approve', 'charity', '1', {'application_id': 1, 'name': 'Yes'}),
+        ('charity.reject', 'unapproved_charity', '2', {'name': 'No'}),
+    ]
+    assert AuditEntry.query.first().remote_addr == '127.0.0.1'
+    assert [e.actor for e in AuditEntry.query.order_by(AuditEntry.id)] == [None, 'admin:1', 'admin:1']
+
+
+def test_full_audit_queue_drops_and_counts(app, audit, monkeypatch):
+    monkeypatch.setattr(audit, '_ensure_thread', lambda: None)
+    monkeypatch.setitem(app.config, 'AUDIT_QUEUE_SIZE', 2)
+    dropped = AUDIT_EVENTS.value(outcome='dropped')
+    assert [audit.record('test.event', 'thing', i) for i in range(3)] == [True, True, False]
+    assert AUDIT_EVENTS.value(outcome='dropped') == dropped + 1
+    assert audit.flush() == 2
+
+
+def test_failed_flush_keeps_the_batch_for_the_next_one(app, audit, monkeypatch):
+    monkeypatch.setattr(audit, '_ensure_thread', lambda: None)
+    dropped = AUDIT_EVENTS.value(outcome='dropped')
+    audit.record('test.first')
+    audit.record('test.second')
+    # The database is unavailable for a moment
+    AuditEntry.__table__.drop(db.engine)
+    assert audit.flush() == 0
+    assert [row['action'] for row in audit.pending] == ['test.first', 'test.second']
+    AuditEntry.__table__.create(db.engine)
+    assert audit.flush() == 2
+    assert AUDIT_EVENTS.value(outcome='dropped') == dropped
+    assert [e.action for e in AuditEntry.query.order_by(AuditEntry.id)] == ['test.first', 'test.second']
+
+
+def test_only_rows_the_database_refuses_are_dropped(app, audit, monkeypatch):
+    monkeypatch.setattr(audit, '_ensure_thread', lambda: None)
+    dropped = AUDIT_EVENTS.value(outcome='dropped')
+    audit.record('test.first')
+    audit.record(None)  # violates NOT NULL
+    audit.record('test.third')
+    assert audit.flush() == 2
+    assert AUDIT_EVENTS.value(outcome='dropped') == dropped + 1
+    assert not audit.pending
+
+
+def test_access_log_is_one_json_line_per_request(client, app):
+    captured = []
+    handler = logging.Handler()
+    handler.emit = captured.append
+    access = logging.getLogger('access')
+    access.addHandler(handler)
+    try:
+        client.get('/charities?fields=id', headers={'User-Agent': 'pytest'})
+    finally:
+        access.removeHandler(handler)
+
+    [record] = captured
+    line = json.loads(JSONFormatter().format(record))
+    assert line['message'] == 'GET /charities 200'
+    assert {key: line[key] for key in ('method', 'path', 'query', 'endpoint', 'status', 'user_agent')} == {
+        'method': 'GET', 'path': '/charities', 'query': 'fields=id', 'endpoint': 'list_charities',
+        'status': 200, 'user_agent': 'pytest',
+    }
+    assert line['duration_ms'] >= 0
+
+
+def test_full_log_queue_drops_instead_of_blocking():
+    handler = DroppingQueueHandler(queue.Queue(1))
+    before = DROPPED_LOG_RECORDS.value(logger='test')
+    for _ in range(3):
+        handler.handle(logging.LogRecord('test', logging.INFO, __file__, 1, 'hello', None, None))
+    assert DROPPED_LOG_RECORDS.value(logger='test') == before + 2
@@ -0,0 +1,75 @@
+from datetime import datetime, timedelta
+
+import bcrypt
+import pytest
+from flask_jwt_extended import decode_token
+from sqlalchemy import event
+
+from models import db, TokenBlacklist, User
+from ratelimit import MemoryBackend
+
+
+@pytest.fixture(autouse=True)
+def fresh_limiter(app, monkeypatch):
+    monkeypatch.setattr(app.extensions['ratelimit'], 'backend', MemoryBackend())
+
+
+@pytest.fixture
+def user_tokens(app, client):
+    with app.app_context():
+        hashed = bcrypt.hashpw(b'secret', bcrypt.gensalt(4)).decode('utf-8')
+        db.session.add(User(username='jane', email='jane@example.com', password=hashed))
+        db.session.commit()
+    return client.post('/users/login', json={'email': 'jane@example.com', 'password': 'secret'}).get_json()
+
+
+def bearer(token):
+    return {'Authorization': f'Bearer {token}'}
+
+
+def test_login_returns_access_and_refresh_tokens(client, user_tokens):
+    assert user_tokens['role'] == 'user'
+    refreshed = client.post('/token/refresh', headers=bearer(user_tokens['refresh_token']))
+    assert refreshed.status_code == 200
+    # An access token cannot be used as a refresh token
+    assert client.post('/token/refresh', headers=bearer(user_tokens['access_token'])).status_code == 422
+
+
+def test_admin_routes_check_the_role_claim(client, user_tokens):
+    assert client.get('/unapproved-charities').status_code == 401
+    response = client.get('/unapproved-charities', headers=bearer(user_tokens['access_token']))
+    assert response.status_code == 403
+    assert response.get_json() == {'msg': 'Admins only'}
+
+
+def test_admin_check_does_not_query_accounts(app, admin_client):
+    statements = []
+    with app.app_context():
+        engine = db.engine
+    listener = lambda conn, cursor, statement, *args: statements.append(statement)  # noqa: E731
+    event.listen(engine, 'before_cursor_execute', listener)
+    try:
+        assert admin_client.get('/unapproved-charities').status_code == 200
+    finally:
+        event.remove(engine, 'before_cursor_execute', listener)
+    assert not any('users' in s or 'admins' in s for s in statements)
+
+
+def test_first_admin_bootstraps_then_admins_only(client, admin_client):
+    body = {'username': 'root', 'email': 'root@example.com', 'password': 'secret'}
+    assert client.post('/admin/register', json=body).status_code == 201
+    second = {'username': 'ops', 'email': 'ops@example.com', 'password': 'secret'}
+    assert client.post('/admin/register', json=second).status_code == 401
+    assert admin_client.post('/admin/register', json=second).status_code == 201
+
+
+def test_logout_revokes_the_token(client, user_tokens):
+    db.session.add(TokenBlacklist(token='old', expires_at=datetime.utcnow() - timedelta(minutes=1)))
+    db.session.commit()
+    headers = bearer(user_tokens['refresh_token'])
+    assert client.post('/admin/logout', headers=headers).status_code == 200
+    assert client.post('/token/refresh', headers=headers).status_code == 401
+    # Shared through the database, and expired revocations are purged
+    (revoked,) = TokenBlacklist.query.all()
+    assert revoked.token == decode_token(user_tokens['refresh_token'])['jti']
+    assert revoked.expires_at > datetime.utcnow()
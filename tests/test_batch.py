@@ -0,0 +1,43 @@
+from sqlalchemy import event
+
+from models import db, Charity, Beneficiary, Donation
+
+
+def _seed():
+    for i in range(1, 4):
+        db.session.add(Charity(id=i, name=f'Charity {i}', description='-'))
+        db.session.add(Beneficiary(id=i, name=f'Beneficiary {i}', charity_id=i))
+    db.session.add_all([Donation(amount=10.0, charity_id=2), Donation(amount=5.0, charity_id=2)])
+    db.session.commit()
+
+
+def test_charities_by_ids_in_one_query_preserving_order(client):
+    _seed()
+    statements = []
+    listener = lambda conn, cursor, statement, *args: statements.append(statement)  # noqa: E731
+    event.listen(db.engine, 'before_cursor_execute', listener)
+    response = client.get('/charities?ids=3,2,99,3')
+    event.remove(db.engine, 'before_cursor_execute', listener)
+
+    body = response.get_json()
+    assert [c['id'] for c in body['charities']] == [3, 2]
+    assert [c['total_donations'] for c in body['charities']] == [0, 15.0]
+    assert body['missing'] == [99]
+    assert len(statements) == 1
+    # The totals are aggregated over the requested charities only
+    assert statements[0].count('charity_id IN') == 2
+
+
+def test_beneficiaries_by_ids(client):
+    _seed()
+    body = client.get('/beneficiaries?ids=2,1,7').get_json()
+    assert [b['id'] for b in body['beneficiaries']] == [2, 1]
+    assert body['beneficiaries'][0]['charity'] == {'id': 2, 'name': 'Charity 2'}
+    assert body['missing'] == [7]
+
+
+def test_ids_are_validated_and_capped(app, client, monkeypatch):
+    monkeypatch.setitem(app.config, 'BATCH_MAX_IDS', 2)
+    assert client.get('/charities?ids=1,x').status_code == 400
+    assert client.get('/charities?ids=').status_code == 400
+    assert client.get('/charities?ids=1,2,3').status_code == 400
@@ -0,0 +1,39 @@
+import gzip
+
+from models import db, Charity
+
+
+def _seed(count=20):
+    for i in range(count):
+        db.session.add(Charity(name=f'Charity {i}', description='A long description. ' * 20))
+    db.session.commit()
+
+
+def test_small_responses_are_not_compressed(client):
+    response = client.get('/', headers={'Accept-Encoding': 'gzip'})
+    assert 'Content-Encoding' not in response.headers
+
+
+def test_large_json_is_gzipped_and_cached(app, client):
+    _seed()
+    compression = app.extensions['compression']
+    compression.cache.clear()
+    plain = client.get('/charities')
+    response = client.get('/charities', headers={'Accept-Encoding': 'gzip'})
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert 'Accept-Encoding' in response.headers['Vary']
+    assert gzip.decompress(response.data) == plain.data
+    assert len(compression.cache) == 1
+
+    again = client.get('/charities', headers={'Accept-Encoding': 'gzip'})
+    assert again.data == response.data
+    assert len(compression.cache) == 1
+
+
+def test_matching_etag_returns_not_modified(client):
+    _seed()
+    first = client.get('/charities', headers={'Accept-Encoding': 'gzip'})
+    etag = first.headers['ETag']
+    second = client.get('/charities', headers={'Accept-Encoding': 'gzip', 'If-None-Match': etag})
+    assert second.status_code == 304
+    assert second.data == b''
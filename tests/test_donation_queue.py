@@ -0,0 +1,100 @@
+import json
+import os
+import time
+
+import pytest
+
+import app as app_module
+from donation_queue import REJECTED_FILE, WriteBehindQueue
+from models import db, Charity, Donation
+
+
+@pytest.fixture
+def queue(app, tmp_path, monkeypatch):
+    monkeypatch.setitem(app.config, 'DONATION_JOURNAL_DIR', str(tmp_path))
+    monkeypatch.setitem(app.config, 'DONATION_FLUSH_SIZE', 3)
+    monkeypatch.setitem(app.config, 'DONATION_FLUSH_INTERVAL', 60)
+    db.session.add(Charity(name='Charity', description='-'))
+    db.session.commit()
+    queue = WriteBehindQueue()
+    queue.app = app
+    yield queue
+    queue.stop()
+
+
+def test_batch_is_flushed_when_size_threshold_is_reached(queue):
+    queue.start()
+    ids = [queue.submit(amount=10.0, charity_id=1) for _ in range(3)]
+    deadline = time.time() + 5
+    while queue.pending and time.time() < deadline:
+        time.sleep(0.01)
+    assert sorted(d.journal_id for d in Donation.query.all()) == sorted(ids)
+    assert open(queue.journal.path).read() == ''
+
+
+def test_recovery_replays_orphaned_journal_idempotently(queue, tmp_path):
+    db.session.add(Donation(amount=5.0, charity_id=1, journal_id='a' * 32))
+    db.session.commit()
+    entries = [
+        {'journal_id': 'a' * 32, 'amount': 5.0, 'charity_id': 1, 'donation_date': '2024-07-08T10:00:00'},
+        {'journal_id': 'b' * 32, 'amount': 7.5, 'charity_id': 1, 'donation_date': '2024-07-08T10:01:00'},
+    ]
+    orphan = tmp_path / 'donations-999999.jsonl'
+    orphan.write_text(''.join(json.dumps(entry) + '\n' for entry in entries))
+
+    queue.start()
+
+    assert sorted(d.amount for d in Donation.query.all()) == [5.0, 7.5]
+    assert not orphan.exists()
+
+
+def test_create_donation_returns_pending_id(queue, client, monkeypatch):
+    queue.start()
+    queue.enabled = True
+    monkeypatch.setattr(app_module, 'donation_queue', queue)
+
+    response = client.post('/donations', json={'charity_id': 1, 'amount': 25.0})
+    assert response.status_code == 202
+    pending_id = response.get_json()['pending_id']
+    assert client.get(f'/donations/pending/{pending_id}').status_code == 202
+
+    queue.flush()
+    saved = client.get(f'/donations/pending/{pending_id}')
+    assert saved.status_code == 200
+    assert saved.get_json()['amount'] == 25.0
+
+
+def test_refused_row_is_dead_lettered_and_reported(queue, client, monkeypatch):
+    queue.start()
+    queue.enabled = True
+    monkeypatch.setattr(app_module, 'donation_queue', queue)
+    good = queue.submit(amount=10.0, charity_id=1)
+    # amount is NOT NULL; the database refuses this row on every attempt
+    bad = queue.submit(amount=None, charity_id=1)
+
+    assert queue.flush() == 2
+    assert [d.journal_id for d in Donation.query.all()] == [good]
+    assert queue.pending == []
+    response = client.get(f'/donations/pending/{bad}')
+    assert response.status_code == 410
+    assert 'NOT NULL' in response.get_json()['reason']
+    assert client.get(f'/donations/pending/{"f" * 32}').status_code == 404
+
+    # Records appended by other workers are picked up without rereading the file
+    path = os.path.join(queue.directory, REJECTED_FILE)
+    read = queue._rejections_read
+    assert read == os.path.getsize(path)
+    with open(path, 'a', encoding='utf-8') as f:
+        f.write(json.dumps({'journal_id': 'e' * 32, 'error': 'x', 'rejected_at': '', 'entry': {}}) + '\n')
+    assert queue.rejection('e' * 32)['error'] == 'x'
+    assert queue.rejection(bad)['journal_id'] == bad
+
+
+def test_malformed_donations_are_refused_before_journalling(queue, client, monkeypatch):
+    queue.start()
+    queue.enabled = True
+    monkeypatch.setattr(app_module, 'donation_queue', queue)
+    assert client.post('/donations', json={'charity_id': 1, 'amount': 'ten'}).status_code == 400
+    assert client.post('/donations', json={'charity_id': '1', 'amount': 10}).status_code == 400
+    assert client.post('/donations', json={'charity_id': 2, 'amount': 10}).status_code == 404
+    assert queue.pending == []
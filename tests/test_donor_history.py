@@ -0,0 +1,75 @@
+from datetime import datetime, timedelta
+
+from sqlalchemy import event
+
+from models import db, Charity, Donation, User
+
+
+def _seed():
+    db.session.add(Charity(id=1, name='Charity', description='-'))
+    if db.session.get(User, 1) is None:
+        db.session.add(User(id=1, username='jane', email='jane@example.com', password='x'))
+    start = datetime(2024, 7, 1)
+    # Two donations share a timestamp so the id tie-breaker is exercised
+    dates = [start, start + timedelta(days=1), start + timedelta(days=1), start + timedelta(days=2),
+             start + timedelta(days=3)]
+    db.session.add_all([
+        Donation(id=i + 1, amount=10.0 * (i + 1), charity_id=1, user_id=1, donation_date=date)
+        for i, date in enumerate(dates)
+    ])
+    db.session.add(Donation(amount=999.0, charity_id=1))
+    db.session.commit()
+
+
+def test_keyset_pages_cover_every_donation_once(user_client):
+    _seed()
+    seen, cursor = [], None
+    while True:
+        url = '/users/1/donations?limit=2' + (f'&cursor={cursor}' if cursor else '')
+        page = user_client.get(url).get_json()
+        assert page['lifetime_total'] == 150.0
+        assert page['donation_count'] == 5
+        seen.extend(donation['id'] for donation in page['donations'])
+        cursor = page.get('next_cursor')
+        if not cursor:
+            break
+    assert seen == [5, 4, 3, 2, 1]
+
+
+def test_pages_read_only_indexed_columns(app, admin_client):
+    _seed()
+    statements = []
+    with app.app_context():
+        engine = db.engine
+    listener = lambda conn, cursor, statement, *args: statements.append(statement)  # noqa: E731
+    event.listen(engine, 'before_cursor_execute', listener)
+    try:
+        assert admin_client.get('/users/1/donations').status_code == 200
+    finally:
+        event.remove(engine, 'before_cursor_execute', listener)
+    pages = [s for s in statements if 'ORDER BY' in s]
+    assert pages and not any('journal_id' in s or 'pledge_id' in s or 'scheduled_for' in s for s in pages)
+
+
+def test_create_donation_records_the_donor(client, user_client):
+    _seed()
+    # The donor comes from the token; a user_id in the body is ignored
+    user_client.post('/donations', json={'charity_id': 1, 'amount': 5, 'user_id': 2, 'anonymous': True})
+    client.post('/donations', json={'charity_id': 1, 'amount': 6, 'user_id': 1})
+    donations = Donation.query.order_by(Donation.id.desc()).limit(2).all()
+    assert [(d.amount, d.user_id, d.anonymous) for d in donations] == [(6.0, None, False), (5.0, 1, True)]
+
+
+def test_history_is_private_to_the_donor(client, user_client, admin_client):
+    _seed()
+    db.session.add(User(id=2, username='sam', email='sam@example.com', password='x'))
+    db.session.commit()
+    assert client.get('/users/1/donations').status_code == 401
+    assert user_client.get('/users/2/donations').status_code == 403
+    assert admin_client.get('/users/1/donations').get_json()['donation_count'] == 5
+
+
+def test_bad_cursor_and_unknown_user(admin_client):
+    _seed()
+    assert admin_client.get('/users/1/donations?cursor=nope').status_code == 400
+    assert admin_client.get('/users/42/donations').status_code == 404
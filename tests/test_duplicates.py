@@ -0,0 +1,112 @@
+import random
+import string
+import threading
+from datetime import datetime
+
+import pytest
+
+from duplicates import NameIndex, similarity, trigrams
+from models import db, Charity, UnapprovedCharity
+
+
+@pytest.fixture
+def finder(app):
+    finder = app.extensions['duplicates']
+    # Built from the empty tables; the mapper events add each test's rows
+    finder.rebuild()
+    yield finder
+    finder.indexes = None
+
+
+def submit(client, name):
+    return client.post('/unapproved-charities', json={'name': name, 'description': 'x'})
+
+
+def test_trigrams_match_pg_trgm():
+    assert trigrams('Cat') == {'  c', ' ca', 'cat', 'at '}
+    assert trigrams('Save the Girls!') == trigrams('save THE   girls')
+    assert round(similarity(trigrams('Save the Girls'), trigrams('Save The Girls Kenya')), 3) == 0.714
+
+
+def test_index_search_ranks_and_filters():
+    index = NameIndex()
+    names = ['Save the Girls', 'Save The Girls Kenya', 'Save the Children', 'Red Cross']
+    for i, name in enumerate(names):
+        index.add(i, name)
+    assert [id for _, id, _ in index.search('save the girls', 0.5, 5)] == [0, 1]
+    index.remove(0)
+    assert [id for _, id, _ in index.search('save the girls', 0.5, 5)] == [1]
+    assert index.search('!!!', 0.5, 5) == []
+
+
+def test_index_search_matches_a_full_scan():
+    rng = random.Random(7)
+    words = [''.join(rng.choice(string.ascii_lowercase[:8]) for _ in range(rng.randint(3, 6))) for _ in range(40)]
+    names = [' '.join(rng.sample(words, rng.randint(1, 4))) for _ in range(500)]
+    index = NameIndex()
+    for i, name in enumerate(names):
+        index.add(i, name)
+    for query in rng.sample(names, 50):
+        for threshold in (0.3, 0.5, 0.8):
+            expected = sorted(
+                (-similarity(trigrams(query), trigrams(name)), i) for i, name in enumerate(names)
+                if similarity(trigrams(query), trigrams(name)) >= threshold
+            )
+            assert [id for _, id, _ in index.search(query, threshold, 10)] == [i for _, i in expected[:10]]
+
+
+def test_submission_reports_likely_duplicates(app, client, finder):
+    db.session.add_all([
+        Charity(id=1, name='Save the Girls', description='x'),
+        Charity(id=2, name='Save the Children', description='x'),
+        Charity(id=3, name='Save the Girls Uganda', description='x', deleted_at=datetime.utcnow()),
+    ])
+    db.session.commit()
+
+    first = submit(client, 'Save The Girls Kenya')
+    assert first.status_code == 201
+    assert first.get_json()['possible_duplicates'] == [
+        {'type': 'charity', 'id': 1, 'name': 'Save the Girls', 'score': 0.714},
+    ]
+    # Pending submissions count too, and the index picks up writes without a rebuild
+    second = submit(client, 'Save the Girls - Kenya')
+    assert [(match['type'], match['score']) for match in second.get_json()['possible_duplicates']] == [
+        ('unapproved_charity', 1.0), ('charity', 0.714),
+    ]
+    assert submit(client, 'Red Cross').get_json()['possible_duplicates'] == []
+
+
+def test_stale_index_entries_are_not_reported(app, client, finder):
+    db.session.add(UnapprovedCharity(id=1, name='Save the Girls', description='x'))
+    db.session.commit()
+    assert finder.find('Save the Girls')
+    # Removed behind the index's back, as another process would
+    db.session.execute(db.delete(UnapprovedCharity))
+    db.session.commit()
+    assert submit(client, 'Save the Girls').get_json()['possible_duplicates'] == []
+
+
+def test_index_is_built_in_the_background(app, finder, monkeypatch):
+    db.session.add(Charity(id=1, name='Save the Girls', description='x'))
+    db.session.commit()
+    finder.indexes = None
+    built, release = threading.Event(), threading.Event()
+    build_indexes = finder.build_indexes
+
+    def slow_build():
+        indexes = build_indexes()
+        built.set()
+        release.wait(5)
+        return indexes
+
+    monkeypatch.setattr(finder, 'build_indexes', slow_build)
+    # The request does not wait for the build
+    assert finder.find('Save the Girls') == []
+    assert built.wait(5)
+    builder = finder._builder
+    # Written after the build read the table, so it is replayed onto the new index
+    db.session.add(Charity(id=2, name='Save the Girls Kenya', description='x'))
+    db.session.commit()
+    release.set()
+    builder.join(5)
+    assert [match['id'] for match in finder.find('Save the Girls')] == [1, 2]
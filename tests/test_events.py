@@ -0,0 +1,81 @@
+import json
+import os
+import subprocess
+import sys
+
+from events import LiveTotals, SQLiteBroker
+from models import db, Charity
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PUBLISH = 'import sys; from events import SQLiteBroker; SQLiteBroker(sys.argv[1]).publish({"1": 60.0})'
+
+
+def _charities():
+    db.session.add_all([Charity(name='One', description='-'), Charity(name='Two', description='-')])
+    db.session.commit()
+
+
+def _events(response, count):
+    """Read ``count`` SSE data frames from a stream response."""
+    frames = []
+    for chunk in response.response:
+        text = chunk.decode()
+        if text.startswith('event: totals'):
+            frames.append(json.loads(text.split('data: ', 1)[1]))
+        if len(frames) == count:
+            break
+    return frames
+
+
+def test_burst_of_donations_is_coalesced_into_one_message(app, client):
+    _charities()
+    live_totals = app.extensions['live_totals']
+    published = []
+    live_totals.broker.subscribe(published.append)
+    for amount in (10, 20, 30):
+        client.post('/donations', json={'charity_id': 1, 'amount': amount})
+    client.post('/donations', json={'charity_id': 2, 'amount': 5})
+
+    assert live_totals.flush() == {'1': 60.0, '2': 5.0}
+    assert published == [{'1': 60.0, '2': 5.0}]
+    assert live_totals.flush() is None
+
+
+def test_single_charity_stream_gets_snapshot_then_its_updates(app, client):
+    _charities()
+    live_totals = app.extensions['live_totals']
+    response = client.get('/charities/1/stream')
+    assert response.mimetype == 'text/event-stream'
+
+    client.post('/donations', json={'charity_id': 2, 'amount': 5})
+    client.post('/donations', json={'charity_id': 1, 'amount': 15})
+    live_totals.flush()
+
+    assert _events(response, 2) == [{'1': 0}, {'1': 15.0}]
+    response.close()
+    assert not live_totals.clients
+
+
+def test_sqlite_broker_fans_out_across_processes(app, tmp_path, monkeypatch):
+    _charities()
+    monkeypatch.setitem(app.extensions, 'live_totals', app.extensions['live_totals'])
+    path = str(tmp_path / 'broker.db')
+    # A long poll interval so the test drives delivery with poll()
+    worker = LiveTotals(app, SQLiteBroker(path, poll_interval=3600))
+    client = worker.connect()
+
+    # Another worker process publishes...
+    subprocess.run([sys.executable, '-c', PUBLISH, path], check=True, cwd=ROOT)
+    assert worker.broker.poll() == 1
+    assert client.get(timeout=0) == {'1': 60.0}
+
+    # ...and this one's own messages come back through the file as well
+    worker.mark_dirty(2)
+    worker.flush()
+    assert worker.broker.poll() == 1
+    assert client.get(timeout=0) == {'2': 0}
+    assert worker.broker.poll() == 0
+
+
+def test_unknown_charity_stream_is_404(client):
+    assert client.get('/charities/99/stream').status_code == 404
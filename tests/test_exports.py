@@ -0,0 +1,38 @@
+import csv
+import io
+from datetime import datetime
+
+from models import db, Charity, Donation
+
+
+def _seed():
+    db.session.add_all([Charity(id=1, name='One', description='-'), Charity(id=2, name='Two', description='-')])
+    db.session.add_all([
+        Donation(amount=10.0, charity_id=1, user_id=7, donation_date=datetime(2024, 7, 1)),
+        Donation(amount=20.0, charity_id=1, user_id=8, anonymous=True, donation_date=datetime(2024, 7, 2)),
+        Donation(amount=30.0, charity_id=2, user_id=9, donation_date=datetime(2024, 8, 1)),
+    ])
+    db.session.commit()
+
+
+def test_csv_export_filters_and_redacts_anonymous_donors(admin_client):
+    _seed()
+    response = admin_client.get('/donations/export?from=2024-07-01&to=2024-08-01&charity_id=1')
+    assert response.mimetype == 'text/csv'
+    rows = list(csv.DictReader(io.StringIO(response.get_data(as_text=True))))
+    assert [(row['amount'], row['user_id']) for row in rows] == [('10.0', '7'), ('20.0', '')]
+
+
+def test_ndjson_export(admin_client):
+    _seed()
+    response = admin_client.get('/donations/export?format=ndjson')
+    lines = response.get_data(as_text=True).splitlines()
+    assert len(lines) == 3
+    assert response.mimetype == 'application/x-ndjson'
+    assert '"donation_date":"2024-08-01T00:00:00"' in lines[2]
+
+
+def test_export_rejects_bad_arguments(admin_client):
+    assert admin_client.get('/donations/export?format=xml').status_code == 400
+    assert admin_client.get('/donations/export?from=yesterday').status_code == 400
+    assert admin_client.get('/donations/export?charity_id=one').status_code == 400
@@ -0,0 +1,85 @@
+from datetime import datetime
+
+from sqlalchemy import event
+
+from models import (
+    db, Charity, Beneficiary, Donation, UnapprovedCharity, beneficiary_dicts, charity_dicts, unapproved_charity_dicts,
+)
+
+
+def _seed():
+    charity = Charity(name='Save the Girls', description='Long description', website='http://stg.org')
+    db.session.add(charity)
+    db.session.flush()
+    db.session.add_all([
+        Beneficiary(name='Mary', story='A long story', charity_id=charity.id),
+        Donation(amount=100.0, charity_id=charity.id),
+        Donation(amount=50.0, charity_id=charity.id),
+    ])
+    db.session.commit()
+
+
+def _capture_sql(app):
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    event.listen(db.engine, 'before_cursor_execute', before_cursor_execute)
+    return statements, lambda: event.remove(db.engine, 'before_cursor_execute', before_cursor_execute)
+
+
+def test_charity_list_defaults_to_summary_without_description(app, client):
+    _seed()
+    statements, stop = _capture_sql(app)
+    response = client.get('/charities')
+    stop()
+    assert response.get_json() == [{
+        'id': 1, 'name': 'Save the Girls', 'image_url': None, 'total_donations': 150.0,
+    }]
+    assert not any('description' in statement for statement in statements)
+
+
+def test_charity_list_fields_selection(client):
+    _seed()
+    response = client.get('/charities?fields=id,description')
+    assert response.get_json() == [{'id': 1, 'description': 'Long description'}]
+
+
+def test_unknown_field_is_rejected(client):
+    response = client.get('/charities?fields=id,password')
+    assert response.status_code == 400
+
+
+def test_beneficiary_list_summary_skips_story(app, client):
+    _seed()
+    statements, stop = _capture_sql(app)
+    response = client.get('/beneficiaries')
+    stop()
+    assert response.get_json()[0] == {
+        'id': 1, 'name': 'Mary', 'image_url': None, 'charity': {'id': 1, 'name': 'Save the Girls'},
+    }
+    assert len(statements) == 1
+    assert 'story' not in statements[0]
+
+
+def test_detail_routes_keep_full_text(client):
+    _seed()
+    assert client.get('/charities/1').get_json()['description'] == 'Long description'
+    assert client.get('/beneficiaries/1').get_json()['story'] == 'A long story'
+
+
+def test_row_dicts_match_to_dict(app):
+    _seed()
+    db.session.add_all([
+        Beneficiary(name='Orphan', story='No charity'),
+        Charity(id=2, name='Closing', description='-', deleted_at=datetime.utcnow()),
+        Beneficiary(name='Hidden', story='Charity being deleted', charity_id=2),
+        UnapprovedCharity(name='Pending', description='Waiting'),
+    ])
+    db.session.commit()
+    for fields in (Charity.FIELDS, Charity.SUMMARY_FIELDS, ('description',)):
+        assert charity_dicts(fields) == [(c.id, c.to_dict(fields)) for c in Charity.query.filter_by(deleted_at=None)]
+    for fields in (Beneficiary.FIELDS, Beneficiary.SUMMARY_FIELDS, ('id', 'story')):
+        assert beneficiary_dicts(fields) == [(b.id, b.to_dict(fields)) for b in Beneficiary.query]
+    assert unapproved_charity_dicts() == [u.to_dict() for u in UnapprovedCharity.query]
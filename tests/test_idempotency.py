@@ -0,0 +1,79 @@
+from datetime import datetime, timedelta
+
+from flask_jwt_extended import create_access_token
+
+from models import db, Charity, Donation, IdempotencyKey, User
+
+
+def _charity():
+    db.session.add(Charity(name='Charity', description='-'))
+    db.session.commit()
+
+
+def test_retry_with_same_key_replays_response(app, client):
+    _charity()
+    headers = {'Idempotency-Key': 'retry-1'}
+    first = client.post('/donations', json={'charity_id': 1, 'amount': 20}, headers=headers)
+    app.extensions['idempotency'].cache.clear()  # force the database path
+    second = client.post('/donations', json={'charity_id': 1, 'amount': 20}, headers=headers)
+    third = client.post('/donations', json={'charity_id': 1, 'amount': 20}, headers=headers)
+
+    assert first.status_code == second.status_code == third.status_code == 201
+    assert second.get_json() == first.get_json()
+    assert third.headers['Idempotent-Replayed'] == 'true'
+    assert Donation.query.count() == 1
+
+
+def test_key_reused_with_different_body_is_rejected(client):
+    _charity()
+    headers = {'Idempotency-Key': 'retry-2'}
+    client.post('/donations', json={'charity_id': 1, 'amount': 20}, headers=headers)
+    response = client.post('/donations', json={'charity_id': 1, 'amount': 99}, headers=headers)
+    assert response.status_code == 422
+    assert Donation.query.count() == 1
+
+
+def test_keys_are_scoped_to_the_caller(app, client, user_client):
+    _charity()
+    db.session.add(User(id=2, username='sam', email='sam@example.com', password='-'))
+    db.session.commit()
+    token = create_access_token(identity='user:2', additional_claims={'role': 'user', 'uid': 2, 'username': 'sam'})
+    headers = {'Idempotency-Key': 'shared'}
+    body = {'charity_id': 1, 'amount': 20}
+    assert user_client.post('/donations', json=body, headers=headers).status_code == 201
+    other = client.post('/donations', json=body, headers=dict(headers, Authorization=f'Bearer {token}'))
+    assert other.status_code == 201
+    assert 'Idempotent-Replayed' not in other.headers
+    assert sorted(d.user_id for d in Donation.query) == [1, 2]
+
+
+def test_in_flight_key_returns_conflict(client):
+    _charity()
+    db.session.add(IdempotencyKey(key='create_donation::retry-3', request_hash='x'))
+    db.session.commit()
+    response = client.post('/donations', json={'charity_id': 1, 'amount': 20},
+                           headers={'Idempotency-Key': 'retry-3'})
+    assert response.status_code == 409
+
+
+def test_abandoned_reservation_is_taken_over(client):
+    _charity()
+    db.session.add(IdempotencyKey(key='create_donation::retry-4', request_hash='x',
+                                  created_at=datetime.utcnow() - timedelta(minutes=5)))
+    db.session.commit()
+    headers = {'Idempotency-Key': 'retry-4'}
+    response = client.post('/donations', json={'charity_id': 1, 'amount': 20}, headers=headers)
+    assert response.status_code == 201
+    assert client.post('/donations', json={'charity_id': 1, 'amount': 20}, headers=headers).status_code == 201
+    assert Donation.query.count() == 1
+    assert IdempotencyKey.query.one().status_code == 201
+
+
+def test_expired_keys_are_purged(app):
+    idempotency = app.extensions['idempotency']
+    db.session.add(IdempotencyKey(key='old', request_hash='x', status_code=201,
+                                  created_at=datetime.utcnow() - timedelta(days=2)))
+    db.session.add(IdempotencyKey(key='new', request_hash='x', status_code=201))
+    db.session.commit()
+    assert idempotency.purge_expired() == 1
+    assert [row.key for row in IdempotencyKey.query.all()] == ['new']
@@ -0,0 +1,108 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from jobs import JobContext
+from models import db, Beneficiary, Charity, Donation, Job, RecurringPledge, UnapprovedCharity
+
+
+@pytest.fixture
+def jobs(app):
+    return app.extensions['jobs']
+
+
+def test_delete_charity_hides_it_then_detaches_in_batches(app, admin_client, jobs, monkeypatch):
+    monkeypatch.setitem(app.config, 'CHARITY_DELETE_BATCH_SIZE', 2)
+    db.session.add_all([Charity(name='Gone', description='-'), Charity(name='Kept', description='-')])
+    db.session.add_all([Donation(amount=5.0, charity_id=1, pledge_id=1 if i == 0 else None) for i in range(5)])
+    db.session.add_all([Donation(amount=1.0, charity_id=2), Beneficiary(name='B', charity_id=1)])
+    db.session.add(RecurringPledge(amount=1.0, interval='daily', charity_id=1,
+                                   start_date=datetime(2024, 1, 1), next_run=datetime(2024, 1, 1)))
+    db.session.commit()
+
+    response = admin_client.delete('/charities/1')
+    assert response.status_code == 202
+    job_id = response.get_json()['job_id']
+    assert response.headers['Location'] == f'/jobs/{job_id}'
+    # Hidden before the job has run
+    assert admin_client.get('/charities/1').status_code == 404
+    assert [c['id'] for c in admin_client.get('/charities').get_json()] == [2]
+    assert RecurringPledge.query.one().active is False
+    assert admin_client.post('/donations', json={'charity_id': 1, 'amount': 5}).status_code == 404
+    assert admin_client.get('/beneficiaries').get_json()[0]['charity'] is None
+
+    progress = []
+    report = JobContext.progress
+
+    def record(self, done, total=None):
+        progress.append((done, total))
+        report(self, done, total)
+
+    monkeypatch.setattr(JobContext, 'progress', record)
+    assert jobs.run_pending() == 1
+
+    assert progress == [(0, 7), (2, None), (4, None), (5, None), (6, None), (7, None)]
+    job = admin_client.get(f'/jobs/{job_id}').get_json()
+    assert job['status'] == 'succeeded'
+    assert job['result'] == {'deleted': True, 'detached': {
+        'donations': 5, 'archived_donations': 0, 'beneficiaries': 1, 'pledges': 1}}
+    assert db.session.get(Charity, 1) is None
+    assert Donation.query.filter_by(charity_id=None).count() == 5
+    assert Donation.query.filter_by(charity_id=2).count() == 1
+    pledge = RecurringPledge.query.one()
+    assert (pledge.charity_id, pledge.active) == (None, False)
+    assert Donation.query.filter_by(pledge_id=pledge.id).count() == 1
+    assert admin_client.delete('/charities/1').status_code == 404
+
+
+def test_approval_reports_progress(admin_client, jobs):
+    db.session.add_all([UnapprovedCharity(name=f'New {i}', description='-') for i in range(3)])
+    db.session.commit()
+
+    job_id = admin_client.post('/move-unapproved-charities').get_json()['job_id']
+    jobs.run_pending()
+
+    job = admin_client.get(f'/jobs/{job_id}').get_json()
+    assert (job['status'], job['progress'], job['total'], job['result']) == ('succeeded', 3, 3, {'approved': 3})
+    assert Charity.query.count() == 3
+    assert admin_client.get('/jobs?status=succeeded').get_json()[0]['id'] == job_id
+
+
+def test_failures_are_recorded_and_rolled_back(app, jobs, monkeypatch):
+    def explode(job):
+        db.session.add(Charity(name='Half done', description='-'))
+        db.session.flush()
+        raise RuntimeError('boom')
+
+    monkeypatch.setitem(jobs.tasks, 'explode', explode)
+    job = jobs.enqueue('explode')
+    jobs.run_pending()
+
+    db.session.expire_all()
+    assert (job.status, job.error) == ('failed', 'boom')
+    assert Charity.query.count() == 0
+    with pytest.raises(LookupError):
+        jobs.enqueue('no-such-kind')
+
+
+def test_stale_jobs_are_requeued_then_failed(app, jobs, monkeypatch):
+    monkeypatch.setitem(app.config, 'JOBS_MAX_ATTEMPTS', 2)
+    long_ago = datetime.utcnow() - timedelta(hours=1)
+    retry = Job(kind='approve_charities', status='running', attempts=1, heartbeat_at=long_ago)
+    give_up = Job(kind='approve_charities', status='running', attempts=2, heartbeat_at=long_ago)
+    db.session.add_all([retry, give_up])
+    db.session.commit()
+
+    jobs.requeue_stale()
+
+    db.session.expire_all()
+    assert retry.status == 'queued'
+    assert (give_up.status, give_up.error) == ('failed', 'Worker lost')
+
+
+def test_a_job_is_claimed_once(app, jobs):
+    job_id = jobs.enqueue('approve_charities').id
+    assert jobs.claim('worker-a') == job_id
+    assert jobs.claim('worker-b') is None
+    job = db.session.get(Job, job_id)
+    assert (job.status, job.worker, job.attempts) == ('running', 'worker-a', 1)
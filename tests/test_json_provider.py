@@ -0,0 +1,23 @@
+from datetime import datetime
+
+from json_provider import FastJSONProvider, StdlibJSONProvider
+from models import db, Charity, Donation
+
+
+def test_datetimes_are_iso_8601(client):
+    charity = Charity(name='Charity', description='Description')
+    db.session.add(charity)
+    db.session.flush()
+    donation = Donation(amount=10.0, charity_id=charity.id, donation_date=datetime(2024, 7, 8, 10, 15))
+    db.session.add(donation)
+    db.session.commit()
+
+    response = client.get(f'/donations/{donation.id}')
+    assert response.get_json()['donation_date'] == '2024-07-08T10:15:00'
+
+
+def test_orjson_and_stdlib_backends_agree(app):
+    payload = {'b': 1, 'a': [datetime(2024, 1, 2, 3, 4, 5, 6), None, 'Nairobi – Kenya']}
+    fast, stdlib = FastJSONProvider(app), StdlibJSONProvider(app)
+    assert fast.loads(fast.dumps(payload)) == stdlib.loads(stdlib.dumps(payload))
+    assert fast.response(payload).get_data() == stdlib.response(payload).get_data()
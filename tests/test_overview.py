@@ -0,0 +1,35 @@
+from datetime import datetime, timedelta
+
+from sqlalchemy import event
+
+from models import db, Charity, Beneficiary, Donation, User
+
+
+def test_overview_in_fixed_number_of_queries(client):
+    db.session.add(Charity(id=1, name='Charity', description='Full description'))
+    db.session.add(User(id=1, username='jane', email='jane@example.com', password='x'))
+    db.session.add_all([Beneficiary(name=f'B{i}', story='Story', charity_id=1) for i in range(3)])
+    now = datetime.utcnow()
+    db.session.add_all([
+        Donation(amount=float(i), charity_id=1, user_id=1, anonymous=(i == 4),
+                 donation_date=now - timedelta(days=i))
+        for i in range(1, 6)
+    ])
+    db.session.commit()
+
+    statements = []
+    listener = lambda conn, cursor, statement, *args: statements.append(statement)  # noqa: E731
+    event.listen(db.engine, 'before_cursor_execute', listener)
+    body = client.get('/charities/1/overview?limit=3').get_json()
+    event.remove(db.engine, 'before_cursor_execute', listener)
+
+    assert len(statements) == 3
+    assert body['charity']['description'] == 'Full description'
+    assert len(body['beneficiaries']) == 3
+    assert body['totals'] == {'total_donations': 15.0, 'donation_count': 5}
+    assert [d['amount'] for d in body['recent_donations']] == [1.0, 2.0, 3.0]
+    assert body['recent_donations'][0]['donor'] == {'id': 1, 'username': 'jane'}
+
+
+def test_overview_unknown_charity(client):
+    assert client.get('/charities/5/overview').status_code == 404
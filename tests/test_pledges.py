@@ -0,0 +1,120 @@
+from datetime import datetime
+
+import pytest
+
+from models import db, Charity, Donation, RecurringPledge
+from pledges import PledgeScheduler, next_occurrence
+
+
+@pytest.fixture
+def scheduler(app):
+    db.session.add(Charity(name='Charity', description='-'))
+    db.session.commit()
+    scheduler = PledgeScheduler()
+    scheduler.app = app
+    return scheduler
+
+
+def add_pledge(interval, start, **kwargs):
+    pledge = RecurringPledge(amount=10.0, interval=interval, charity_id=1,
+                             start_date=start, next_run=start, **kwargs)
+    db.session.add(pledge)
+    db.session.commit()
+    return pledge.id
+
+
+def test_monthly_runs_keep_the_start_day():
+    start = datetime(2024, 1, 31, 9)
+    runs = [start]
+    for _ in range(3):
+        runs.append(next_occurrence('monthly', runs[-1], start))
+    assert [run.date().isoformat() for run in runs] == ['2024-01-31', '2024-02-29', '2024-03-31', '2024-04-30']
+    assert next_occurrence('weekly', start, start) == datetime(2024, 2, 7, 9)
+
+
+def test_missed_runs_are_caught_up_once(app, scheduler):
+    pledge_id = add_pledge('daily', datetime(2024, 7, 1, 9))
+    add_pledge('daily', datetime(2024, 7, 1, 9), active=False)
+
+    assert scheduler.run_due(now=datetime(2024, 7, 4, 12)) == 4
+    assert scheduler.run_due(now=datetime(2024, 7, 4, 12)) == 0
+    assert scheduler.run_due(now=datetime(2024, 7, 5, 9)) == 1
+
+    runs = db.session.scalars(db.select(Donation.scheduled_for).order_by(Donation.scheduled_for)).all()
+    assert [run.day for run in runs] == [1, 2, 3, 4, 5]
+    assert db.session.get(RecurringPledge, pledge_id).next_run == datetime(2024, 7, 6, 9)
+
+
+def test_batches_and_catchup_limit(app, scheduler, monkeypatch):
+    monkeypatch.setitem(app.config, 'PLEDGE_BATCH_SIZE', 2)
+    monkeypatch.setitem(app.config, 'PLEDGE_MAX_CATCHUP', 3)
+    for _ in range(5):
+        add_pledge('weekly', datetime(2024, 6, 1))
+    # 5 pledges x 5 weekly runs each, taken 2 pledges and 3 runs at a time
+    assert scheduler.run_due(now=datetime(2024, 6, 29)) == 25
+    assert db.session.query(Donation).count() == 25
+
+
+def test_runs_already_charged_are_skipped_without_blocking_others(app, scheduler):
+    charged = add_pledge('daily', datetime(2024, 7, 1))
+    clean = add_pledge('daily', datetime(2024, 7, 2))
+    db.session.add(Donation(amount=10.0, charity_id=1, pledge_id=charged, scheduled_for=datetime(2024, 7, 1)))
+    db.session.commit()
+
+    # charged: 7/2 and 7/3 (7/1 exists already); clean: 7/2 and 7/3
+    assert scheduler.run_due(now=datetime(2024, 7, 3, 12)) == 4
+    runs = db.session.execute(db.select(Donation.pledge_id, Donation.scheduled_for)).all()
+    assert len(runs) == len(set(runs)) == 5
+    assert db.session.get(RecurringPledge, charged).next_run == datetime(2024, 7, 4)
+    assert db.session.get(RecurringPledge, clean).next_run == datetime(2024, 7, 4)
+
+
+@pytest.fixture
+def foreign_keys(app):
+    db.session.execute(db.text('PRAGMA foreign_keys=ON'))
+    yield
+    db.session.rollback()
+    db.session.execute(db.text('PRAGMA foreign_keys=OFF'))
+
+
+def test_pledge_that_cannot_be_charged_is_deactivated(app, scheduler, foreign_keys):
+    db.session.execute(db.text('PRAGMA foreign_keys=OFF'))
+    poisoned = add_pledge('daily', datetime(2024, 7, 1), user_id=999)
+    db.session.execute(db.text('PRAGMA foreign_keys=ON'))
+    clean = add_pledge('daily', datetime(2024, 7, 2))
+
+    assert scheduler.run_due(now=datetime(2024, 7, 3, 12)) == 2
+    db.session.expire_all()
+    pledge = db.session.get(RecurringPledge, poisoned)
+    assert pledge.active is False
+    assert 'FOREIGN KEY' in pledge.failure
+    assert db.session.get(RecurringPledge, clean).next_run == datetime(2024, 7, 4)
+    assert scheduler.run_due(now=datetime(2024, 7, 10)) == 7
+
+
+def test_pledge_endpoints(client, user_client, admin_client, scheduler):
+    body = {'charity_id': 1, 'amount': 25, 'interval': 'monthly', 'start_date': '2024-07-31T09:00:00'}
+    assert client.post('/pledges', json=body).status_code == 401
+    assert admin_client.post('/pledges', json=body).status_code == 403
+    # The donor comes from the token, whatever the body says
+    response = user_client.post('/pledges', json=dict(body, user_id=42))
+    assert response.status_code == 201
+    pledge = response.get_json()
+    assert pledge['next_run'] == '2024-07-31T09:00:00'
+    assert pledge['user_id'] == 1
+
+    assert user_client.post('/pledges', json={'charity_id': 1, 'amount': 25, 'interval': 'hourly'}).status_code == 400
+    for amount in (-5, '25', True):
+        assert user_client.post('/pledges', json=dict(body, amount=amount)).status_code == 400
+    assert user_client.post('/pledges', json=dict(body, amount=0)).status_code == 400
+    assert user_client.post('/pledges', json=dict(body, charity_id='1')).status_code == 400
+    assert user_client.post('/pledges', json=dict(body, charity_id=1.5)).status_code == 400
+    assert user_client.post('/pledges', json={'charity_id': 2, 'amount': 25, 'interval': 'daily'}).status_code == 404
+
+    other = add_pledge('daily', datetime(2024, 7, 1))
+    assert user_client.get(f'/pledges/{other}').status_code == 403
+    assert user_client.delete(f'/pledges/{other}').status_code == 403
+    assert admin_client.get(f'/pledges/{other}').status_code == 200
+
+    assert user_client.delete(f"/pledges/{pledge['id']}").status_code == 204
+    assert user_client.get(f"/pledges/{pledge['id']}").get_json()['active'] is False
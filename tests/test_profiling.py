@@ -0,0 +1,70 @@
+import json
+import os
+import pstats
+import threading
+import time
+
+import pytest
+
+from profiling import StackSampler
+
+
+@pytest.fixture
+def profiler(app, tmp_path, monkeypatch):
+    monkeypatch.setitem(app.config, 'PROFILE_DIR', str(tmp_path))
+    monkeypatch.setitem(app.config, 'PROFILE_TOKEN', 'let-me-profile')
+    monkeypatch.setitem(app.config, 'PROFILE_SAMPLE_RATE', 0.0)
+    return app.extensions['profiler']
+
+
+def profiles(directory, suffix):
+    return sorted(name for name in os.listdir(directory) if name.endswith(suffix))
+
+
+def test_only_requests_with_the_token_are_profiled(client, profiler, tmp_path, monkeypatch):
+    monkeypatch.setitem(profiler.app.config, 'PROFILE_MODE', 'cprofile')
+    client.get('/charities')
+    client.get('/charities', headers={'X-Profile': 'wrong'})
+    assert os.listdir(tmp_path) == []
+
+    client.get('/charities', headers={'X-Profile': 'let-me-profile'})
+
+    [meta] = profiles(tmp_path, '.json')
+    metadata = json.loads((tmp_path / meta).read_text())
+    assert (metadata['endpoint'], metadata['method'], metadata['status']) == ('list_charities', 'GET', 200)
+    assert metadata['duration_ms'] > 0
+    [stats] = profiles(tmp_path, '.pstats')
+    assert pstats.Stats(str(tmp_path / stats)).total_calls > 0
+
+
+def test_sample_rate_and_collapsed_stacks(client, profiler, tmp_path, monkeypatch):
+    monkeypatch.setitem(profiler.app.config, 'PROFILE_SAMPLE_RATE', 1.0)
+    monkeypatch.setitem(profiler.app.config, 'PROFILE_SAMPLE_INTERVAL', 0.0005)
+    client.get('/charities')
+    assert len(profiles(tmp_path, '.collapsed')) == 1
+    assert len(profiles(tmp_path, '.json')) == 1
+
+
+def test_sampler_collapses_identical_stacks():
+    done = threading.Event()
+    worker = threading.Thread(target=done.wait)
+    worker.start()
+    sampler = StackSampler(worker.ident, 0.001)
+    sampler.start()
+    time.sleep(0.05)
+    sampler.stop()
+    done.set()
+    worker.join()
+    stack, count = sampler.collapsed().splitlines()[0].rsplit(' ', 1)
+    assert stack.split(';')[-1].startswith('wait (threading.py')
+    assert int(count) > 1
+
+
+def test_disk_cap_removes_oldest_profiles(profiler, tmp_path, monkeypatch):
+    monkeypatch.setitem(profiler.app.config, 'PROFILE_MAX_BYTES', 250)
+    for i in range(5):
+        path = tmp_path / f'profile-{i}.collapsed'
+        path.write_text('x' * 100)
+        os.utime(path, (i, i))
+    profiler.enforce_cap()
+    assert profiles(tmp_path, '.collapsed') == ['profile-3.collapsed', 'profile-4.collapsed']
@@ -0,0 +1,72 @@
+import bcrypt
+import pytest
+
+from metrics import REGISTRY
+from models import db, User
+from ratelimit import DECISIONS, MemoryBackend, SQLiteBackend
+
+
+@pytest.fixture
+def limiter(app, monkeypatch):
+    limiter = app.extensions['ratelimit']
+    monkeypatch.setattr(limiter, 'backend', MemoryBackend())
+    monkeypatch.setitem(app.config, 'RATELIMIT_IP_BURST', 3)
+    monkeypatch.setitem(app.config, 'RATELIMIT_ACCOUNT_BURST', 2)
+    return limiter
+
+
+def test_account_bucket_rejects_before_bcrypt(app, client, limiter, monkeypatch):
+    with app.app_context():
+        db.session.add(User(username='jane', email='jane@example.com', password='not-a-real-hash'))
+        db.session.commit()
+    calls = []
+    monkeypatch.setattr(bcrypt, 'checkpw', lambda *args: calls.append(args) or False)
+    body = {'email': 'jane@example.com', 'password': 'wrong'}
+    statuses = [client.post('/users/login', json=body).status_code for _ in range(3)]
+    assert statuses == [401, 401, 429]
+    assert len(calls) == 2
+    # The account bucket is keyed on the normalised email, whatever the IP
+    rejected = client.post('/users/login', json={'email': ' Jane@Example.com', 'password': 'x'},
+                           environ_base={'REMOTE_ADDR': '10.0.0.9'})
+    assert rejected.status_code == 429
+    assert int(rejected.headers['Retry-After']) >= 1
+    assert len(calls) == 2
+
+
+def test_ip_bucket_covers_every_account(client, limiter):
+    statuses = [
+        client.post('/admin/login', json={'email': f'user{i}@example.com', 'password': 'x'}).status_code
+        for i in range(4)
+    ]
+    assert statuses == [401, 401, 401, 429]
+
+
+def test_decisions_are_exported(client, limiter):
+    before = DECISIONS.value(endpoint='admin_login', key_type='ip', decision='rejected')
+    for _ in range(4):
+        client.post('/admin/login', json={'password': 'x'})
+    assert DECISIONS.value(endpoint='admin_login', key_type='ip', decision='rejected') == before + 1
+    assert 'ratelimit_decisions_total{endpoint="admin_login",key_type="ip",decision="rejected"}' in \
+        client.get('/metrics').get_data(as_text=True)
+    assert REGISTRY.render().startswith('# HELP')
+
+
+def test_sqlite_backend_is_shared_between_instances(tmp_path):
+    path = str(tmp_path / 'buckets.db')
+    worker_a, worker_b = SQLiteBackend(path), SQLiteBackend(path)
+    assert worker_a.take('k', 2, 0.001, now=100.0)[0]
+    assert worker_b.take('k', 2, 0.001, now=100.0)[0]
+    assert not worker_a.take('k', 2, 0.001, now=100.0)[0]
+    assert worker_b.take('k', 2, 1.0, now=102.0)[0]
+
+
+def test_sqlite_backend_forgets_refilled_buckets(tmp_path):
+    backend = SQLiteBackend(str(tmp_path / 'buckets.db'), prune_interval=0)
+    for i in range(5):
+        backend.take(f'ip:{i}', 2, 1.0, now=100.0)
+    backend.take('busy', 2, 1.0, now=100.0)
+    backend.take('busy', 2, 1.0, now=101.5)
+    # Two seconds refill every bucket except the one still in use
+    backend.take('new', 2, 1.0, now=102.0)
+    keys = {row[0] for row in backend._connect().execute('SELECT key FROM buckets')}
+    assert keys == {'busy', 'new'}
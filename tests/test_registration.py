@@ -0,0 +1,91 @@
+import threading
+
+import bcrypt
+import pytest
+from sqlalchemy import create_engine, event
+
+from models import db, Admin, User
+
+
+@pytest.fixture(autouse=True)
+def fast_registration(app, monkeypatch):
+    monkeypatch.setitem(app.config, 'RATELIMIT_ENABLED', False)
+    real_gensalt = bcrypt.gensalt
+    monkeypatch.setattr(bcrypt, 'gensalt', lambda rounds=4, prefix=b'2b': real_gensalt(4, prefix))
+
+
+def test_registration_is_a_single_insert(app, client):
+    statements = []
+    with app.app_context():
+        engine = db.engine
+    listener = lambda conn, cursor, statement, *args: statements.append(statement)  # noqa: E731
+    event.listen(engine, 'before_cursor_execute', listener)
+    try:
+        response = client.post('/users/register', json={
+            'username': 'jane', 'email': 'jane@example.com', 'password': 'secret'})
+    finally:
+        event.remove(engine, 'before_cursor_execute', listener)
+    assert response.status_code == 201
+    assert response.get_json() == {'id': 1, 'username': 'jane', 'email': 'jane@example.com', 'is_admin': False}
+    assert len(statements) == 1
+    assert 'ON CONFLICT DO NOTHING' in statements[0]
+
+
+def test_conflicts_are_reported_per_field(client):
+    body = {'username': 'jane', 'email': 'jane@example.com', 'password': 'secret'}
+    assert client.post('/users/register', json=body).status_code == 201
+
+    response = client.post('/users/register', json=dict(body, email='other@example.com'))
+    assert response.status_code == 400
+    assert response.get_json()['errors'] == {'username': 'Username already taken'}
+
+    response = client.post('/users/register', json=dict(body, username='janet'))
+    assert response.get_json() == {'msg': 'Email already in use', 'errors': {'email': 'Email already in use'}}
+
+    response = client.post('/users/register', json=body)
+    assert set(response.get_json()['errors']) == {'username', 'email'}
+
+
+def test_admin_register_reports_taken_username(client, admin_client):
+    body = {'username': 'root', 'email': 'root@example.com', 'password': 'secret'}
+    assert client.post('/admin/register', json=body).status_code == 201
+    response = admin_client.post('/admin/register', json=dict(body, email='ops@example.com'))
+    assert response.status_code == 400
+    assert response.get_json()['errors'] == {'username': 'Username already taken'}
+    assert Admin.query.count() == 1
+
+
+@pytest.fixture
+def file_db(app, tmp_path, monkeypatch):
+    """Point the app at a file database so threads get their own connections."""
+    engine = create_engine(f'sqlite:///{tmp_path}/stress.db', connect_args={'timeout': 30})
+    monkeypatch.setitem(db._app_engines[app], None, engine)
+    db.create_all()
+    yield engine
+    db.session.remove()
+    engine.dispose()
+
+
+def test_concurrent_registrations_have_one_winner(app, file_db):
+    threads_per_account, accounts = 8, 4
+    barrier = threading.Barrier(threads_per_account * accounts)
+    statuses = {}
+
+    def register(account, attempt):
+        client = app.test_client()
+        barrier.wait()
+        response = client.post('/users/register', json={
+            'username': f'user{account}', 'email': f'user{account}@example.com', 'password': 'secret'})
+        statuses[account, attempt] = response.status_code
+
+    threads = [threading.Thread(target=register, args=(account, attempt))
+               for account in range(accounts) for attempt in range(threads_per_account)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    for account in range(accounts):
+        outcomes = sorted(statuses[account, attempt] for attempt in range(threads_per_account))
+        assert outcomes == [201] + [400] * (threads_per_account - 1)
+    assert User.query.count() == accounts
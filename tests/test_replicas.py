@@ -0,0 +1,77 @@
+import sqlite3
+
+import pytest
+from flask import Flask, jsonify
+from sqlalchemy.exc import OperationalError
+
+from models import db, Charity
+from replicas import ReplicaRouter, replica_binds
+
+
+@pytest.fixture
+def replica_app(tmp_path):
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{tmp_path / 'primary.db'}"
+    app.config['SQLALCHEMY_BINDS'] = replica_binds([f"sqlite:///{tmp_path / 'replica.db'}"])
+    db.init_app(app)
+    router = ReplicaRouter(app, db)
+
+    @app.route('/names', methods=['GET'])
+    def names():
+        return jsonify([charity.name for charity in Charity.query.order_by(Charity.id)])
+
+    @app.route('/names/<name>', methods=['POST'])
+    def add(name):
+        db.session.add(Charity(name=name, description='-'))
+        db.session.commit()
+        return '', 201
+
+    with app.app_context():
+        db.metadata.create_all(db.engines[None])
+        db.metadata.create_all(db.engines['replica_0'])
+        with db.engines['replica_0'].begin() as conn:
+            conn.execute(Charity.__table__.insert(), {'name': 'on replica', 'description': '-'})
+        with db.engines[None].begin() as conn:
+            conn.execute(Charity.__table__.insert(), {'name': 'on primary', 'description': '-'})
+        yield app, router
+        db.session.remove()
+    # init_app registered an (empty) metadata for the bind on the shared db object
+    db.metadatas.pop('replica_0', None)
+
+
+def test_reads_go_to_replica(replica_app):
+    app, _ = replica_app
+    assert app.test_client().get('/names').get_json() == ['on replica']
+
+
+def test_client_reads_its_own_writes_from_primary(replica_app):
+    app, _ = replica_app
+    writer = app.test_client()
+    assert writer.post('/names/new').status_code == 201
+    assert writer.get('/names').get_json() == ['on primary', 'new']
+
+
+def test_query_errors_do_not_eject_the_replica(replica_app):
+    app, router = replica_app
+    with app.app_context():
+        with pytest.raises(OperationalError):
+            with db.engines['replica_0'].connect() as conn:
+                conn.exec_driver_sql('SELECT * FROM missing_table')
+    assert router.choose() == 'replica_0'
+
+
+def test_unreachable_replica_is_ejected(replica_app, monkeypatch):
+    app, router = replica_app
+    router.eject_seconds = 60
+    with app.app_context():
+        engine = db.engines['replica_0']
+        engine.dispose()
+
+        def refuse(*args, **kwargs):
+            raise sqlite3.OperationalError('unable to open database file')
+
+        monkeypatch.setattr(engine.dialect, 'connect', refuse)
+        with pytest.raises(OperationalError):
+            engine.connect()
+    assert router.choose() is None
+    assert app.test_client().get('/names').get_json() == ['on primary']
@@ -0,0 +1,77 @@
+import logging
+
+import pytest
+
+from models import db, Charity, Donation
+from slowlog import fingerprint, parameter_shape, redact_plan
+
+
+@pytest.fixture
+def slowlog(app, monkeypatch):
+    slowlog = app.extensions['slowlog']
+    monkeypatch.setattr(slowlog, 'entries', {})
+    monkeypatch.setattr(slowlog, '_ensure_thread', lambda: None)
+    monkeypatch.setitem(app.config, 'SLOW_QUERY_MS', 0)
+    return slowlog
+
+
+def test_fingerprint_hides_literals_and_in_lists():
+    assert fingerprint("SELECT * FROM t WHERE id IN (?, ?, ?) AND name = 'x'  LIMIT 10") == \
+        'SELECT * FROM t WHERE id IN (...) AND name = ? LIMIT ?'
+    assert fingerprint('SELECT replica_0.id FROM anon_1 WHERE a IN (%(a_1)s, %(a_2)s)') == \
+        'SELECT replica_0.id FROM anon_1 WHERE a IN (...)'
+    assert parameter_shape({'id': 1, 'name': 'x'}) == {'id': 'int', 'name': 'str'}
+    assert parameter_shape([(1,), (2,)], executemany=True) == {'rows': 2, 'row': ['int']}
+
+
+def test_plans_do_not_keep_bound_values():
+    plan = (
+        "Index Scan using ix_users_email on users  (cost=0.29..8.31 rows=1 width=72)\n"
+        "  Index Cond: ((email)::text = 'jane@example.com'::text)\n"
+        "  Filter: ((id > 42) AND (name = 'O''Brien'))"
+    )
+    assert redact_plan(plan) == (
+        "Index Scan using ix_users_email on users  (cost=0.29..8.31 rows=1 width=72)\n"
+        "  Index Cond: ((email)::text = ?::text)\n"
+        "  Filter: ((id > ?) AND (name = ?))"
+    )
+
+
+def test_failed_explain_does_not_keep_parameters(app, slowlog):
+    slowlog.record('k', 1.0, None, None)
+    with app.app_context():
+        slowlog.explain(db.engine, 'k', 'SELECT * FROM missing WHERE email = ?', ('jane@example.com',))
+    assert 'jane@example.com' not in slowlog.entries['k']['plan']
+    assert slowlog.entries['k']['plan'].startswith('EXPLAIN failed')
+
+
+def test_slow_statements_are_logged_with_endpoint_and_plan(admin_client, slowlog, caplog):
+    client = admin_client
+    db.session.add(Charity(name='Charity', description='-'))
+    db.session.add_all([Donation(amount=1.0, charity_id=1) for _ in range(3)])
+    db.session.commit()
+    slowlog.entries.clear()
+
+    with caplog.at_level(logging.WARNING, logger='slowlog'):
+        client.get('/charities/1')
+    slowlog.explain_pending()
+
+    assert any(record.endpoint == 'get_charity' for record in caplog.records)
+    queries = client.get('/admin/slow-queries').get_json()['queries']
+    by_endpoint = [q for q in queries if q['endpoints'] == ['get_charity']]
+    assert by_endpoint
+    lookup = next(q for q in by_endpoint if 'FROM charities' in q['fingerprint'])
+    assert lookup['count'] == 1
+    assert lookup['plan'] and 'EXPLAIN failed' not in lookup['plan']
+    assert 'int' in lookup['parameters']
+
+
+def test_only_the_slowest_fingerprints_are_kept(app, slowlog, monkeypatch):
+    monkeypatch.setitem(app.config, 'SLOW_QUERY_TOP_K', 2)
+    slowlog.record('a', 5.0, None, None)
+    slowlog.record('b', 50.0, None, None)
+    slowlog.record('c', 1.0, None, None)
+    slowlog.record('d', 20.0, None, None)
+    slowlog.record('b', 10.0, None, None)
+    top = slowlog.top()
+    assert [(q['fingerprint'], q['count'], q['max_ms']) for q in top] == [('b', 2, 50.0), ('d', 1, 20.0)]
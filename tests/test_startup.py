@@ -0,0 +1,23 @@
+import sys
+
+import startup
+
+
+def test_heavy_extensions_are_not_imported_at_boot(app):
+    assert 'flask_migrate' not in sys.modules or 'flask_migrate' in startup.STARTUP_TIMINGS
+    assert 'flasgger' not in sys.modules or 'flasgger' in startup.STARTUP_TIMINGS
+    assert {'flask_sqlalchemy', 'flask_jwt_extended', 'flask_cors'} <= set(startup.STARTUP_TIMINGS)
+
+
+def test_swagger_is_built_on_first_docs_request(client):
+    spec = client.get('/apispec_1.json')
+    assert spec.status_code == 200
+    assert '/charities' in spec.get_json()['paths']
+    assert 'flasgger' in startup.STARTUP_TIMINGS
+
+
+def test_lazy_migrate_group_resolves_real_commands(app):
+    runner = app.test_cli_runner()
+    result = runner.invoke(args=['db', '--help'])
+    assert result.exit_code == 0
+    assert 'upgrade' in result.output